@@ -0,0 +1,169 @@
+import time
+import json
+import logging
+import argparse
+import tracemalloc
+import contextlib
+from statistics import quantiles, fmean
+from data_providers.i2c_bus import set_bus
+from emulation.smbus import FakeSMBus, EmulatedBME280, EmulatedHTU21D
+from emulation.w1 import FakeW1Tree
+from emulation.clock import no_sleep
+from emulation.collector import NullCollector
+
+# Provider throughput benchmark on emulated hardware (see emulation)
+# For every driver two modes are measured:
+# read - get_current_reading only (driver and bus)
+# pipeline - full scheduled poll: reading, processing, encoding and sending to a collector that drops messages
+#
+# python3 -m benchmarks.providers
+# python3 -m benchmarks.providers --polls 200 --no-delays --json bench.json ds18b20 htu21d
+
+W1_SENSORS = {"28-0000043a174f": 21.5, "28-0000041b3610": 19.0, "28-00000412a0c1": -3.25, "28-0000044b2f7e": 4.0,
+              "28-000004190d11": 22.75, "28-0000043e5d20": 23.5, "28-00000420a1b3": 18.25, "28-0000041f9c4d": 0.5}
+
+
+class Environment:
+
+    def __init__(self, delays=True):
+        self.collector = NullCollector()
+        self.bus = FakeSMBus({0x76: EmulatedBME280(noise=16, delays=delays),
+                              0x40: EmulatedHTU21D(delays=delays)})
+        set_bus(0, self.bus)
+        self.w1 = FakeW1Tree(W1_SENSORS, delays=delays)
+        self.w1_legacy = FakeW1Tree(W1_SENSORS, bulk=False, delays=delays)
+
+    # Drivers read 1-wire trees with conversion time
+    @contextlib.contextmanager
+    def attached(self):
+        with self.w1.attached(), self.w1_legacy.attached():
+            yield
+
+    def cleanup(self):
+        self.w1.cleanup()
+        self.w1_legacy.cleanup()
+
+    def options(self):
+        return {"broker": "direct", "pass_to": [self.collector], "loglevel": logging.WARNING}
+
+
+def make_bme280(env):
+    from data_providers.bme280 import BME280
+    return BME280("BME", "Emulated BME280, normal mode", None, **env.options())
+
+def make_bme280_forced(env):
+    from data_providers.bme280 import BME280
+    return BME280("BME", "Emulated BME280, forced mode", None, forced_mode=True, **env.options())
+
+def make_bme280_burst(env):
+    from data_providers.bme280 import BME280
+    return BME280("BME", "Emulated BME280, forced mode, burst of 5", None, forced_mode=True, burst=5, **env.options())
+
+def make_htu21d(env):
+    from data_providers.htu21d import HTU21D
+    return HTU21D("HTU", "Emulated HTU21D", None, **env.options())
+
+def make_ds18b20(env):
+    from data_providers.ds18b20 import Ds18b20
+    return Ds18b20("DS", "Emulated DS18B20 x8, bulk conversion", None, base_dir=env.w1.path, **env.options())
+
+def make_ds18b20_legacy(env):
+    from data_providers.ds18b20 import Ds18b20
+    return Ds18b20("DS", "Emulated DS18B20 x8, w1_slave", None, base_dir=env.w1_legacy.path, **env.options())
+
+def make_heartbeat(env):
+    from data_providers.heartbeat import Heartbeat
+    return Heartbeat("HB", "Heartbeat", None, **env.options())
+
+
+DRIVERS = {"bme280": make_bme280,
+           "bme280_forced": make_bme280_forced,
+           "bme280_burst": make_bme280_burst,
+           "htu21d": make_htu21d,
+           "ds18b20": make_ds18b20,
+           "ds18b20_legacy": make_ds18b20_legacy,
+           "heartbeat": make_heartbeat}
+
+
+def _latencies(poll, polls):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(polls):
+        t = time.perf_counter()
+        poll()
+        latencies.append((time.perf_counter() - t) * 1000.0)
+    return latencies, time.perf_counter() - started
+
+
+# Mean of peak traced memory above the level before poll, tracing is done in a separate run
+# as it slows allocations down
+def _allocations(poll, polls):
+    tracemalloc.start()
+    try:
+        allocated = []
+        for i in range(polls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            poll()
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return fmean(allocated)
+
+
+def measure(poll, polls, warmup=3):
+    for i in range(warmup):
+        poll()
+    latencies, elapsed = _latencies(poll, polls)
+    cuts = quantiles(latencies, n=20, method="inclusive") if len(latencies) > 1 else latencies * 19
+    return {"polls": polls,
+            "polls_per_s": polls / elapsed,
+            "latency_ms": {"mean": fmean(latencies), "p50": cuts[9], "p95": cuts[18], "max": max(latencies)},
+            "alloc_bytes_per_poll": _allocations(poll, max(1, polls // 4))}
+
+
+# delays=False - emulated devices convert instantly and drivers do not sleep waiting for them
+def run(drivers, polls, delays=True):
+    env = Environment(delays)
+    try:
+        with env.attached(), contextlib.nullcontext() if delays else no_sleep():
+            return _run_drivers(env, drivers, polls)
+    finally:
+        env.cleanup()
+
+
+def _run_drivers(env, drivers, polls):
+    results = {}
+    for name in drivers:
+        provider = DRIVERS[name](env)
+        results[name] = {"description": provider.get_description(),
+                         "read": measure(provider.get_current_reading, polls),
+                         "pipeline": measure(provider._poll_current_reading, polls),
+                         "bus_transfers": env.bus.transfers}
+        env.bus.transfers = 0
+    return results
+
+
+def print_results(results):
+    print("{:<16} {:<9} {:>9} {:>9} {:>9} {:>9} {:>11}".format("driver", "mode", "polls/s", "p50, ms", "p95, ms",
+                                                             "max, ms", "alloc, kB"))
+    for name, r in results.items():
+        for mode in ("read", "pipeline"):
+            m = r[mode]
+            print("{:<16} {:<9} {:>9.1f} {:>9.3f} {:>9.3f} {:>9.3f} {:>11.2f}".format(
+                name, mode, m["polls_per_s"], m["latency_ms"]["p50"], m["latency_ms"]["p95"],
+                m["latency_ms"]["max"], m["alloc_bytes_per_poll"] / 1024.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark providers on emulated hardware")
+    parser.add_argument("drivers", nargs="*", default=list(DRIVERS), help="drivers to benchmark: {}".format(", ".join(DRIVERS)))
+    parser.add_argument("--polls", type=int, default=50, help="number of measured polls per mode")
+    parser.add_argument("--no-delays", action="store_true", help="emulated devices convert instantly, drivers do not wait for conversions")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    args = parser.parse_args()
+    results = run(args.drivers, args.polls, not args.no_delays)
+    print_results(results)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
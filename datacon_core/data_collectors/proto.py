@@ -1,14 +1,15 @@
 import pika, redis, json, threading
 import logging
-from datetime import datetime
-
-LOG_LEVELS = {50: (logging.critical, "Critical"),
-              40: (logging.error, "Error"),
-              30: (logging.warning, "Warning"),
-              20: (logging.info, "Info"),
-              10: (logging.debug, "Debug")}
+import sys
+from log_utils import get_logger, log_message as write_log
+# Content types and compact format of provider messages
+from data_providers.encoders import CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK, detect_content_type, decode_msgpack
+from data_providers.schema import SCHEMA_UNKNOWN
 
 DEFAULT_EXCHANGE = "MainData"
+# Collector queues are required to have dead-letter exchange (declared by rmq_config), otherwise
+# messages rejected for good (see Collector._retry_later) are lost, it is set by policy:
+# rabbitmqctl set_policy collect-dlx "\.collectq$" '{"dead-letter-exchange":"MainData.dead"}' --apply-to queues
 
 # Thread prototype
 
@@ -25,18 +26,21 @@ class CollectorThread(threading.Thread):
 
 class Collector:
 
-    def log_message(self, message, level=40):
-        if level > self._loglevel:
-            message_out = "{:%Y-%m-%d %H:%M:%S.%f}: {} [{}]: {}".format(datetime.utcnow(),
-                                                                    self._name,
-                                                                    self.LOG_LEVELS[level][1],
-                                                                    message)
-            print(message_out)
-            self.LOG_LEVELS[level][0](message_out)
+    # Interned message of unknown schema is put back to the collector queue via retry queue
+    # after SCHEMA_RETRY_DELAY seconds, at most SCHEMA_RETRIES times
+    SCHEMA_RETRY_DELAY = 30
+    SCHEMA_RETRIES = 20
+
+    # message is formatted with args only if it is going to be written, e.g.
+    # self.log_message("Message received: {}", logging.DEBUG, body)
+    def log_message(self, message, level=40, *args):
+        write_log(self._logger, self._name, self._loglevel, message, level, args)
 
     # Should return true on successful upload
     # Otherwise, return false
-    def upload_data(self, data):
+    # SCHEMA_UNKNOWN if receiver does not know tag schema of interned message (retrying will not help)
+    # content_type is None if it is unknown (e.g. message came from Redis)
+    def upload_data(self, data, content_type=None):
         raise NotImplementedError
 
     def get_name(self):
@@ -47,20 +51,55 @@ class Collector:
 
     # Various pika-related callbacks
     def _receive_callback(self, ch, method, properties, body):
-        self.log_message("Message received: {}".format(body), logging.DEBUG) 
-        if self.upload_data(body):
+        self.log_message("Message received: {}", logging.DEBUG, body) 
+        result = self.upload_data(body, properties.content_type)
+        if result is SCHEMA_UNKNOWN:
+            self._request_announce(ch, body, properties.content_type)
+            self._retry_later(ch, method, properties, body)
+        elif result:
             ch.basic_ack(delivery_tag = method.delivery_tag)
         else:
             ch.basic_reject(delivery_tag = method.delivery_tag, requeue = True)
 
+    # Requeued message would block the queue (and the announce behind it), so the message waits in retry queue
+    # (messages expire there and are dead-lettered back to the collector queue) and is acknowledged here,
+    # after SCHEMA_RETRIES it is rejected, so it is lost unless collector queue has dead-letter exchange
+    def _retry_later(self, ch, method, properties, body):
+        headers = dict(properties.headers or {})
+        retries = headers.get("x-schema-retries", 0)
+        if retries >= self.SCHEMA_RETRIES:
+            self.log_message("Tag schema is still unknown after {} retries, message is rejected", logging.ERROR, retries)
+            ch.basic_reject(delivery_tag = method.delivery_tag, requeue = False)
+            return
+        headers["x-schema-retries"] = retries + 1
+        ch.basic_publish("", self._retry_queue_name, body,
+                         pika.BasicProperties(content_type=properties.content_type, headers=headers, delivery_mode=2,
+                                              expiration=str(int(self.SCHEMA_RETRY_DELAY * 1000))))
+        ch.basic_ack(delivery_tag = method.delivery_tag)
+
+    # Ask provider to announce its schema via its command queue (see data_providers/commands.py),
+    # provider should have its name among command_routing_keys
+    def _request_announce(self, ch, body, content_type):
+        try:
+            name = self._process_message(body, content_type)["name"]
+        except:
+            self.log_message("Could not get provider name of rejected message: {}", logging.ERROR, sys.exc_info()[0])
+            return
+        self.log_message("Asking {} to announce tag schema", logging.WARNING, name)
+        ch.basic_publish(DEFAULT_EXCHANGE, "{}.provide".format(name), json.dumps({"command": "announce"}),
+                         pika.BasicProperties(content_type=CONTENT_TYPE_JSON))
+
     def _on_declare_queue(self, queue):
         self.log_message("Queue OK", logging.DEBUG) 
+        self._channel.queue_declare(None, queue=self._retry_queue_name, durable=True, nowait=True,
+                                    arguments={"x-dead-letter-exchange": "",
+                                               "x-dead-letter-routing-key": self._queue_name})
         self._channel.basic_qos(prefetch_count=1)
         for k in self._routing_keys:
-            self.log_message("Binding {}".format(k), logging.DEBUG) 
+            self.log_message("Binding {}", logging.DEBUG, k) 
             self._channel.queue_bind(None, self._queue_name, DEFAULT_EXCHANGE, "{}.collect".format(k), nowait=True)
             self._channel.queue_bind(None, self._queue_name, DEFAULT_EXCHANGE, "{}.all".format(k), nowait=True)
-            self.log_message("Binding {} OK".format(k), logging.DEBUG) 
+            self.log_message("Binding {} OK", logging.DEBUG, k) 
         self.log_message("Connection and setting of AMQP OK", logging.INFO) 
         self._consumer_tag = self._channel.basic_consume(self._receive_callback)
 
@@ -76,7 +115,7 @@ class Collector:
         self._connection.channel(self._on_open_channel)
     
     def _on_error_connection(self, connection, error=""):
-        self.log_message("Connection error: {}".format(error), logging.ERROR)
+        self.log_message("Connection error: {}", logging.ERROR, error)
 
     def _make_connection(self):
         self.log_message("Connecting to AMQP broker", logging.INFO)
@@ -86,20 +125,25 @@ class Collector:
         self._connection.ioloop.start()
 
     # Redis callbacks
+    # Redis providers have no command queue, interned message of unknown schema is dropped
+    # until provider announces the schema by itself (see TagSchema announce_every)
     def _receive_redis_data(self, channel, data):
-        if not self.upload_data(data):
+        result = self.upload_data(data)
+        if result is SCHEMA_UNKNOWN:
+            self.log_message("Receiver does not know tag schema, message is dropped", logging.WARNING)
+        elif not result:
             self._redis.publish(channel, data)
             self.log_message("Error sending message", logging.WARNING)
 
     def _receive_redis_subscribe(self, channel):
-        self.log_message("Subscribed to redis channel {}".format(channel), logging.INFO)
+        self.log_message("Subscribed to redis channel {}", logging.INFO, channel)
 
     def _receive_redis_unsubscribe(self, channel):
-        self.log_message("Unsubscribed from redis channel {}".format(channel), logging.INFO)
+        self.log_message("Unsubscribed from redis channel {}", logging.INFO, channel)
 
     def _main_redis_callback(self, message):
         if message:
-            self.log_message("Message received: {}".format(message), logging.DEBUG)
+            self.log_message("Message received: {}", logging.DEBUG, message)
             if message["type"] in ["subscribe", "psubscribe"]:
                 self._receive_redis_subscribe(message["channel"])
             elif message["type"] in ["unsubscribe", "punsubscribe"]:
@@ -115,16 +159,11 @@ class Collector:
         self._name = name
         self._loglevel = loglevel
         self._description = description
-        self._logger = logging.getLogger(__name__)
-        self._logger.setLevel(loglevel)
-        self.LOG_LEVELS = {50: (self._logger.critical, "Critical"),
-                    40: (self._logger.error, "Error"),
-                    30: (self._logger.warning, "Warning"),
-                    20: (self._logger.info, "Info"),
-                    10: (self._logger.debug, "Debug")}
-        self._logger.info("{} is being initialized".format(self._name))
+        self._logger = get_logger(__name__, name)
+        self.log_message("{} is being initialized", logging.INFO, self._name)
         if broker == "amqp":
             self._queue_name = "{}.collectq".format(name) if queue_name_prefix is None else "{}.collectq".format(queue_name_prefix)
+            self._retry_queue_name = "{}.retry".format(self._queue_name)
             self._consumer_tag = ""
             self._routing_keys = ["*"] if routing_keys is None or len(routing_keys) == 0 else routing_keys
             self._ct = CollectorThread(self)
@@ -140,5 +179,10 @@ class Collector:
             self.log_message("Subscribing to Redis OK", logging.INFO) 
 
 
-    def _process_message(self, message):
+    # MessagePack messages are expanded to the regular form, ValueError if msgpack is not installed
+    def _process_message(self, message, content_type=None):
+        if content_type is None:
+            content_type = detect_content_type(message)
+        if content_type == CONTENT_TYPE_MSGPACK:
+            return decode_msgpack(message)
         return json.loads(message)
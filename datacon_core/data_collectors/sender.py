@@ -1,4 +1,4 @@
-from .proto import Collector
+from .proto import Collector, CONTENT_TYPE_JSON, SCHEMA_UNKNOWN, detect_content_type
 import json
 import requests
 import logging
@@ -19,19 +19,28 @@ class JSONSender(Collector):
         self._threads = []
         super().__init__(name, description, queue_name_prefix, routing_keys, broker, redis_channels, loglevel)     
 
-    def upload_data(self, data):
-        self.log_message("Trying to upload: {}".format(data), logging.DEBUG) 
-        data = {"message": str(data, 'utf-8')}
+    # JSON messages are sent as "message" form field, binary ones as request body with its content type
+    def upload_data(self, data, content_type=None):
+        self.log_message("Trying to upload: {}", logging.DEBUG, data) 
+        if content_type is None:
+            content_type = detect_content_type(data)
+        if content_type == CONTENT_TYPE_JSON:
+            kw = {"data": {"message": data if isinstance(data, str) else str(data, 'utf-8')}}
+        else:
+            kw = {"data": data, "headers": {"Content-Type": content_type}}
         try:
-            self.log_message("POST request to {}".format(self._address), logging.DEBUG) 
-            r = requests.post(self._address, verify=self._cert, data=data)
-            self.log_message(r.text)
+            self.log_message("POST request to {}", logging.DEBUG, self._address) 
+            r = requests.post(self._address, verify=self._cert, **kw)
+            self.log_message("Response body: {0.text}", logging.DEBUG, r)
             resp = r.status_code
-            self.log_message("Response is {}".format(resp), logging.DEBUG)
+            self.log_message("Response is {}", logging.DEBUG, resp)
             if resp == requests.codes.ok:
                 return True
+            elif resp == requests.codes.conflict:
+                self.log_message("Receiver does not know tag schema", logging.WARNING)
+                return SCHEMA_UNKNOWN
             else:
-                self.log_message("Abnormal response - {}".format(resp), logging.ERROR)
+                self.log_message("Abnormal response - {}", logging.ERROR, resp)
         except requests.ConnectionError:
             self.log_message("Connection error", logging.ERROR)
         except requests.Timeout:
@@ -39,5 +48,5 @@ class JSONSender(Collector):
         except requests.RequestException:
             self.log_message("Request error", logging.ERROR)
         except:
-            self.log_message("Unspecified error: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Unspecified error: {}", logging.ERROR, sys.exc_info()[0])
         return False
@@ -9,12 +9,11 @@ class SimplePrinter(Collector):
         self._process_as_json = process_as_json
         super().__init__(name, description, queue_name_prefix, routing_keys, broker, redis_channels, loglevel)
 
-    def upload_data(self, data):
-        data = str(data, 'utf-8')
+    def upload_data(self, data, content_type=None):
         if self._process_as_json:
-            print(json.dumps(self._process_message(data), sort_keys=True, indent=2))
+            print(json.dumps(self._process_message(data, content_type), sort_keys=True, indent=2))
         else:
-            print(data)
+            print(str(data, 'utf-8', 'replace'))
         return True
 
 
@@ -25,12 +24,10 @@ class SimpleFileWrite(Collector):
         self._process_as_json = process_as_json
         super().__init__(name, description, queue_name_prefix, routing_keys, broker, redis_channels, logging)
 
-    def upload_data(self, data):
-        data = str(data, 'utf-8')
+    def upload_data(self, data, content_type=None):
         with open(self._filename, "a+") as f:
             if self._process_as_json:
-                json_data = json.loads(data)
-                f.write(json.dumps(self._process_message(data), sort_keys=True) + "\n")
+                f.write(json.dumps(self._process_message(data, content_type), sort_keys=True) + "\n")
             else:
-                f.write(data + "\n")
+                f.write(str(data, 'utf-8', 'replace') + "\n")
         return True
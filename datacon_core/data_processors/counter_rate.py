@@ -0,0 +1,54 @@
+from .proto import Processor
+import time
+
+# Counter-to-rate derivation
+# Cumulative counters (e.g. traffic_in in Mb) are replaced with per-second rates ("traffic_in_rate" in Mb/s),
+# cumulative value itself is sent only once in totals_interval seconds
+#
+# counters - measured parameters of cumulative counters
+# Counter going down (reset, interface re-created or wrap) gives no rate for that interval,
+# new value is a baseline, as well as the first reading: total is sent, rate is not
+# (width of kernel counters is not known from userspace, so wrap is not told apart from reset)
+
+
+class CounterRate(Processor):
+
+    def __init__(self, counters, totals_interval=3600):
+        self._counters = set(counters)
+        self._totals_interval = totals_interval
+        # key -> (value, time)
+        self._previous = {}
+        # key -> time total was sent
+        self._totals_sent = {}
+
+    def _rate_reading(self, r, key, now):
+        rate = {k: v for k, v in r.items() if k not in ("reading", "error")}
+        rate["measured_parameter"] = "{}_rate".format(r["measured_parameter"])
+        rate["units"] = "{}/s".format(r["units"]) if r.get("units") else "1/s"
+        if "reading" not in r or r.get("error"):
+            rate["error"] = r.get("error", "No data")
+            return rate
+        value = r["reading"]
+        previous = self._previous.get(key)
+        self._previous[key] = (value, now)
+        if previous is None or now <= previous[1] or value < previous[0]:
+            return None
+        rate["reading"] = (value - previous[0]) / (now - previous[1])
+        return rate
+
+    def process(self, provider_name, reading):
+        now = time.monotonic()
+        result = []
+        for r in reading:
+            if r.get("measured_parameter") not in self._counters:
+                result.append(r)
+                continue
+            key = (provider_name, r.get("name"), r["measured_parameter"])
+            rate = self._rate_reading(r, key, now)
+            if rate is not None:
+                result.append(rate)
+            last_total = self._totals_sent.get(key)
+            if last_total is None or now - last_total >= self._totals_interval:
+                self._totals_sent[key] = now
+                result.append(r)
+        return result
@@ -0,0 +1,86 @@
+from .proto import Processor
+import time
+
+# Report-by-exception filter
+# Follows server input filtering (TagNumeric._filter_new_value and InputFiltering):
+# - reading with changed error is always sent
+# - numeric reading within deadband from the last sent one is dropped
+# - reading that comes earlier than minimum_delay seconds after the last sent one is dropped
+# - unchanged reading is dropped, unless ignore_duplicates of the tag is off
+# Additionally, reading is always sent when maximum_delay seconds passed since the last sent one (heartbeat),
+# so that server can tell a stale sensor from a stable one
+#
+# filters - dict of "name.measured_parameter" -> dict with "deadband", "minimum_delay", "maximum_delay",
+#           "ignore_duplicates" (None or missing means True, as on server)
+# default - settings for readings not mentioned in filters
+# heartbeat - maximum_delay for settings where it is not specified (None - never send unchanged readings)
+
+
+class EdgeFilter(Processor):
+
+    SETTINGS = ("deadband", "minimum_delay", "maximum_delay", "ignore_duplicates")
+    HEARTBEAT = 3600
+
+    def __init__(self, filters=None, default=None, heartbeat=HEARTBEAT):
+        self._filters = filters or {}
+        self._default = default or {}
+        self._heartbeat = heartbeat
+        # key -> (value, error, time sent)
+        self._last_sent = {}
+
+    # filters - dict of server tag name -> InputFiltering object or dict with "deadband" and "minimum_delay"
+    # Server tag names are prefixed with provider name, it is removed
+    @classmethod
+    def from_input_filtering(cls, filters, provider_name=None, default=None, heartbeat=HEARTBEAT):
+        prefix = "{}.".format(provider_name) if provider_name is not None else ""
+        converted = {}
+        for tag_name, f in filters.items():
+            if prefix and tag_name.startswith(prefix):
+                tag_name = tag_name[len(prefix):]
+            if isinstance(f, dict):
+                converted[tag_name] = {k: f.get(k) for k in cls.SETTINGS}
+            else:
+                converted[tag_name] = {k: getattr(f, k, None) for k in cls.SETTINGS}
+        return cls(converted, default, heartbeat)
+
+    # Load filters of datasource from server ("filters/<datasource id>" view)
+    @classmethod
+    def from_url(cls, url, provider_name=None, default=None, heartbeat=HEARTBEAT, cert=False):
+        import requests
+        r = requests.get(url, verify=cert)
+        r.raise_for_status()
+        return cls.from_input_filtering(r.json()["filters"], provider_name, default, heartbeat)
+
+    def _need_to_send(self, key, reading, now):
+        if key not in self._last_sent:
+            return True
+        settings = self._filters.get(key, self._default)
+        last_value, last_error, last_time = self._last_sent[key]
+        value = reading.get("reading")
+        error = reading.get("error")
+        elapsed = now - last_time
+        if error != last_error:
+            return True
+        maximum_delay = settings.get("maximum_delay") or self._heartbeat
+        if maximum_delay is not None and elapsed >= maximum_delay:
+            return True
+        if value == last_value and settings.get("ignore_duplicates") is not False:
+            return False
+        deadband = settings.get("deadband")
+        if deadband is not None and isinstance(value, (int, float)) and isinstance(last_value, (int, float)):
+            if abs(last_value - value) <= deadband:
+                return False
+        minimum_delay = settings.get("minimum_delay")
+        if minimum_delay is not None and elapsed <= minimum_delay:
+            return False
+        return True
+
+    def process(self, provider_name, reading):
+        now = time.monotonic()
+        result = []
+        for r in reading:
+            key = "{}.{}".format(r.get("name"), r.get("measured_parameter"))
+            if self._need_to_send(key, r, now):
+                self._last_sent[key] = (r.get("reading"), r.get("error"), now)
+                result.append(r)
+        return result
@@ -0,0 +1,9 @@
+# Data processor
+# Stage between reading and sending: takes readings of a provider and returns readings to be sent
+# Processors are attached with Provider.add_processor and run in order of adding
+# Returning an empty list means that nothing is sent this time
+
+class Processor:
+
+    def process(self, provider_name, reading):
+        raise NotImplementedError
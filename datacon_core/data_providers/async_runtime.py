@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+# Asyncio-based provider runtime
+# Drop-in replacement for BackgroundScheduler: pass it as provider scheduler,
+# polls become coroutines on a single event loop instead of thread pool jobs
+# Blocking driver calls (get_current_reading) go to a small executor, sending is done on the loop
+#
+# RUNTIME = AsyncRuntime()
+# HTU = HTU21D("GY-21", "Temperature and humidity measurement", RUNTIME, broker="redis")
+# HTU.set_polling({"cron": {"minute": "0-50/10"}})
+# HTU.activate_polling()
+# RUNTIME.run_forever()
+
+
+class AsyncRuntime(AsyncIOScheduler):
+
+    # Checked by Provider.set_polling
+    is_async = True
+
+    # max_workers - number of threads for blocking driver calls
+    def __init__(self, max_workers=4, **options):
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=max_workers))
+        self._logger = logging.getLogger(__name__)
+        super().__init__(event_loop=self._loop, **options)
+
+    def get_loop(self):
+        return self._loop
+
+    def run_forever(self):
+        asyncio.set_event_loop(self._loop)
+        self.start()
+        self._logger.info("Async provider runtime started")
+        try:
+            self._loop.run_forever()
+        finally:
+            self.shutdown(wait=False)
+            self._loop.run_until_complete(self._loop.shutdown_default_executor())
+            self._loop.close()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
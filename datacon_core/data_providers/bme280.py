@@ -1,10 +1,15 @@
 from .proto import Provider
-from smbus2 import SMBus
+from .i2c_bus import get_bus
 from math import log, fabs
+from statistics import median, fmean
 import logging
 import time
 import sys
 
+# forced_mode - sensor sleeps between polls, measurement is started by poll and its end is detected
+#               by polling measuring bit of status register
+# burst - number of forced measurements per poll, published values are their median or mean (burst_average),
+#         only used in forced mode
 class BME280(Provider):
 
     DEFAULT_ADDRESS = 0x76
@@ -52,15 +57,25 @@ class BME280(Provider):
 
     DATA_LENGTH = 8
 
+    STATUS_MEASURING = 0x08
+    STATUS_CHECK_INTERVAL = 0.001
+
+    AVERAGES = {"median": median, "mean": fmean}
+
     def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
                  command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG, bus_number=0,
                  address=DEFAULT_ADDRESS, standby=STANDBY_125, forced_mode=False,
-                 p_os=OVERSAMPLING_4, t_os=OVERSAMPLING_4, h_os=OVERSAMPLING_2, iir_filter=FILTER_2):
+                 p_os=OVERSAMPLING_4, t_os=OVERSAMPLING_4, h_os=OVERSAMPLING_2, iir_filter=FILTER_2,
+                 burst=1, burst_average="median"):
+        # Settings are checked before the bus is touched, errors of bus init below are only logged
+        self._check_settings(p_os=p_os, t_os=t_os, h_os=h_os, iir_filter=iir_filter, standby=standby,
+                             burst=burst, burst_average=burst_average)
         super().__init__(name, description, scheduler, broker, publish_routing_key,
                          command_routing_keys, redis_channel, pass_to, loglevel)
         self.log_message("Initializing I2C bus", logging.INFO)
         try:
-            self.bus = SMBus(bus_number)
+            # Bus is shared with other devices (see i2c_bus)
+            self.bus = get_bus(bus_number)
             self.p_os = p_os
             self.t_os = t_os
             self.h_os = h_os
@@ -69,10 +84,15 @@ class BME280(Provider):
             self.forced_mode = forced_mode
             self.standby = standby
             self.mode = self.MODE_SLEEP if forced_mode else self.MODE_NORMAL
+            self.burst = burst if forced_mode else 1
+            self.burst_average = self.AVERAGES[burst_average]
+            if burst > 1 and not forced_mode:
+                self.log_message("Burst is only used in forced mode", logging.WARNING)
 
             self.log_message("Initializing BME280 and loading calibration",logging.DEBUG) 
             self._get_chip_id()
             self._get_calibration()
+            self._precompute_compensation()
 
             self.log_message("Setting up BME280",logging.DEBUG) 
             self._upload_settings_hum()
@@ -80,7 +100,24 @@ class BME280(Provider):
             self._upload_settings_config()
 
         except:
-            self.log_message("I2C bus init failed: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("I2C bus init failed: {}", logging.ERROR, sys.exc_info()[0])
+
+    # Allowed values of settings, as written to the registers
+    SETTING_RANGES = {"p_os": range(OVERSAMPLING_1, OVERSAMPLING_16 + 1),
+                      "t_os": range(OVERSAMPLING_1, OVERSAMPLING_16 + 1),
+                      "h_os": range(OVERSAMPLING_1, OVERSAMPLING_16 + 1),
+                      "iir_filter": range(FILTER_0, FILTER_16 + 1),
+                      "standby": range(STANDBY_0p5, STANDBY_20 + 1)}
+
+    def _check_settings(self, burst, burst_average, **settings):
+        for setting, value in settings.items():
+            if value not in self.SETTING_RANGES[setting]:
+                raise ValueError("Invalid {} of BME280: {}".format(setting, value))
+        if not isinstance(burst, int) or burst < 1:
+            raise ValueError("Invalid burst of BME280: {}".format(burst))
+        if burst_average not in self.AVERAGES:
+            raise ValueError("Invalid burst_average of BME280: {}, should be one of {}".format(
+                burst_average, ", ".join(self.AVERAGES)))
 
     def _get_calibration(self):
         calibration = self.bus.read_i2c_block_data(self.address, self.CALIBRATION_1_START, self.CALIBRATION_1_LENGTH)
@@ -129,6 +166,46 @@ class BME280(Provider):
             if self.digH[i] & 0x0080:
                 self.digH[i] = (-self.digH[i] ^ 0x00FF) + 1
 
+    # Calibration-dependent constants of compensation formulas (floating point ones from datasheet),
+    # so that compensation of a sample is a few multiplications and additions
+    def _precompute_compensation(self):
+        T, P, H = self.digT, self.digP, self.digH
+        self._comp_t = (T[0] / 1024.0, T[0] / 8192.0, T[1], T[2])
+        self._comp_p = (P[5] / 131072.0, P[4] / 2.0, P[3] * 65536.0,
+                        P[2] * P[0] / 9007199254740992.0, P[1] * P[0] / 17179869184.0, float(P[0]),
+                        P[8] / 34359738368.0, P[7] / 524288.0, P[6] / 16.0)
+        self._comp_h = (H[3] * 64.0, H[4] / 16384.0, H[1] / 65536.0, H[5] / 67108864.0, H[2] / 67108864.0,
+                        H[0] / 524288.0)
+        # Typical measurement time in seconds (oversampling settings are register values)
+        samples = [(1 << (os_setting - 1)) if os_setting > 0 else 0 for os_setting in (self.t_os, self.p_os, self.h_os)]
+        self._t_measure_typ = (1.0 + 2.0 * samples[0] + (2.0 * samples[1] + 0.5 if samples[1] else 0) +
+                               (2.0 * samples[2] + 0.5 if samples[2] else 0)) / 1000.0
+        self._t_measure_max = (1.25 + 2.3 * samples[0] + (2.3 * samples[1] + 0.575 if samples[1] else 0) +
+                               (2.3 * samples[2] + 0.575 if samples[2] else 0)) / 1000.0
+
+    # Temperature in °C, pressure in Pa and humidity in % from raw values
+    def _compensate(self, temperature_raw, pressure_raw, humidity_raw):
+        ct1, ct2, ct3, ct4 = self._comp_t
+        t_fine = (temperature_raw / 16384.0 - ct1) * ct3 + (temperature_raw / 131072.0 - ct2) ** 2 * ct4
+        temperature = t_fine / 5120.0
+
+        cp1, cp2, cp3, cp4, cp5, cp6, cp7, cp8, cp9 = self._comp_p
+        var1 = t_fine / 2.0 - 64000.0
+        var2 = var1 * var1 * cp1 + var1 * cp2 + cp3
+        var1 = cp6 + var1 * var1 * cp4 + var1 * cp5
+        if var1 == 0.0:
+            pressure = 0
+        else:
+            p = (1048576.0 - pressure_raw - var2 / 4096.0) * 6250.0 / var1
+            pressure = p + p * p * cp7 + p * cp8 + cp9
+
+        ch1, ch2, ch3, ch4, ch5, ch6 = self._comp_h
+        var_H = t_fine - 76800.0
+        var_H = (humidity_raw - (ch1 + ch2 * var_H)) * (ch3 * (1.0 + ch4 * var_H * (1.0 + ch5 * var_H)))
+        var_H = var_H * (1.0 - ch6 * var_H)
+        humidity = min(max(var_H, 0.0), 100.0)
+        return temperature, pressure, humidity
+
     def _get_chip_id(self):
         self.chip_id = self.bus.read_byte_data(self.address, self.ADDRESS_CHIPID)
         
@@ -162,12 +239,21 @@ class BME280(Provider):
     def _make_settings_config(self):
         return ((self.standby & 0x07) << 5) | ((self.iir_filter & 0x07) << 2) | 0x00
 
+    # Start forced measurement and wait until measuring bit is cleared
+    # (measurement surely runs after its typical time, sleeping that long avoids reading status too early)
+    def _measure_forced(self):
+        self._set_forced_mode()
+        time.sleep(self._t_measure_typ)
+        deadline = time.monotonic() + self._t_measure_max * 2
+        while self.bus.read_byte_data(self.address, self.ADDRESS_STATUS) & self.STATUS_MEASURING:
+            if time.monotonic() > deadline:
+                raise TimeoutError("BME280 measurement is not finished in time")
+            time.sleep(self.STATUS_CHECK_INTERVAL)
+
     def _read_raw_data(self):
         if self.forced_mode:
-            self._set_forced_mode()
-            t_measure_max = 1.25 + (2.3 * self.t_os) + (2.3 * self.p_os + 0.575) + (2.3 * self.h_os + 0.575)
-            time.sleep(t_measure_max/1000.0)
-        
+            self._measure_forced()
+
         data = self.bus.read_i2c_block_data(self.address, self.ADDRESS_DATA, self.DATA_LENGTH)
 
         self.pressure_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
@@ -178,38 +264,15 @@ class BME280(Provider):
             self.mode = self.MODE_SLEEP
 
 
-    def _calculate_parameters(self):
-        self.log_message("Compensating temperature", logging.INFO)
-        self.temperature_factor = ((self.temperature_raw / 16384.0 - self.digT[0] / 1024.0) * self.digT[1] +
-                                  (self.temperature_raw / 131072.0 - self.digT[0] / 8192.0) ** 2 * self.digT[2])
-        self.temperature_celsius = self.temperature_factor / 5120.0
-
-        self.log_message("Compensating pressure", logging.INFO)
-        var1 = self.temperature_factor / 2.0 - 64000.0
-        var2 = var1 ** 2 * (self.digP[5]) / 32768.0
-        var2 = var2 + var1 * (self.digP[4]) * 2.0
-        var2 = (var2 / 4.0)+(self.digP[3] * 65536.0)
-        var1 = (self.digP[2] * var1 * var1 / 524288.0 + self.digP[1] * var1) / 524288.0
-        var1 = (1.0 + var1 / 32768.0)*self.digP[0]
-        if var1 == 0.0:
-            self.pressure_pascals = 0
+    # Compensated values of the last raw data, or average of `burst` samples
+    def _calculate_parameters(self, samples=None):
+        if samples is None:
+            samples = [self._compensate(self.temperature_raw, self.pressure_raw, self.humidity_raw)]
+        if len(samples) == 1:
+            self.temperature_celsius, self.pressure_pascals, self.humidity_percent = samples[0]
         else:
-            p = 1048576.0 - self.pressure_raw
-            p = (p - (var2 / 4096.0)) * 6250.0 / var1
-            var1 = self.digP[8] * p ** 2 / 2147483648.0
-            var2 = p * self.digP[7] / 32768.0
-            self.pressure_pascals = p + (var1 + var2 + self.digP[6]) / 16.0
+            self.temperature_celsius, self.pressure_pascals, self.humidity_percent = [self.burst_average(v) for v in zip(*samples)]
         self.pressure_mm_hg = self.pressure_pascals / 133.322
-
-        self.log_message("Compensating humidity", logging.INFO)
-        var_H = self.temperature_factor - 76800.0
-        var_H = (self.humidity_raw - (self.digH[3] * 64.0 + self.digH[4] / 16384.0 * var_H)) * (self.digH[1] / 65536.0 * (1.0 + self.digH[5] / 67108864.0 * var_H * (1.0 + self.digH[2] / 67108864.0 * var_H)))
-        var_H = var_H * (1.0 - self.digH[0] * var_H / 524288.0)
-        if var_H > 100.0:
-            var_H = 100.0
-        elif var_H < 0.0:
-            var_H = 0.0
-        self.humidity_percent = var_H
         dewpoint_gamma = 17.27 * self.temperature_celsius / (237.7 + self.temperature_celsius) + log(self.humidity_percent)
         self.dewpoint_celsius = 17.27 * dewpoint_gamma / (237.7 - dewpoint_gamma)
 
@@ -217,9 +280,12 @@ class BME280(Provider):
 # Overriding defaults
 
     def get_current_reading(self, src_id=None):
-        self.log_message("Reading values via I2C bus",logging.INFO)
-        self._read_raw_data()
-        self._calculate_parameters()     
+        self.log_message("Reading values via I2C bus",logging.DEBUG)
+        samples = []
+        for i in range(self.burst):
+            self._read_raw_data()
+            samples.append(self._compensate(self.temperature_raw, self.pressure_raw, self.humidity_raw))
+        self._calculate_parameters(samples)
         reading = []
         reading.append({"name": "Chip_ID",
                    "measured_parameter": "id",
@@ -0,0 +1,130 @@
+import threading
+import json
+import time
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from .encoders import CONTENT_TYPE_JSON
+
+# Provider commands received from "{name}.provideq" (see Provider command_routing_keys)
+# Command is a JSON object, reply is sent to reply_to queue of the request with the same correlation_id:
+#
+# {"command": "poll"} - immediate poll, message is published as usual and sent as reply
+#                       (encoded by provider encoder, with tags if schema interning is on)
+# {"command": "announce"} - next message announces tag schema
+# {"command": "get", "parameter": "..."} - get_parameter of provider
+# {"command": "set", "parameter": "...", "value": ...} - set_parameter of provider
+#
+# Replies other than poll messages are JSON: {"name", "command", "status": "ok" or "error", "result" or "error"}
+#
+# Poll requests are coalesced: requests arriving while a poll is running or within `window` seconds
+# after it has finished get the result of that poll, so hardware is read once
+
+
+class PollRequest:
+
+    __slots__ = ("waiters", "done", "finished", "data", "content_type", "error")
+
+    def __init__(self):
+        self.waiters = []
+        self.done = False
+        self.finished = None
+        self.data = None
+        self.content_type = None
+        self.error = None
+
+
+class CommandConsumer:
+
+    COALESCE_WINDOW = 2.0
+
+    def __init__(self, provider, reply, window=COALESCE_WINDOW, max_workers=2):
+        self._provider = provider
+        self._reply = reply
+        self._window = window
+        self._lock = threading.Lock()
+        self._poll = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def set_window(self, window):
+        self._window = window
+
+    # Called by publisher IO thread, so the work is handed over to executor
+    def handle(self, body, properties):
+        try:
+            command = json.loads(body)
+            name = command["command"]
+        except:
+            self._send_status(properties, None, "error", error="Malformed command")
+            return
+        if name == "poll":
+            self._request_poll(properties)
+        elif name in ("announce", "get", "set"):
+            self._executor.submit(self._run_command, command, properties)
+        else:
+            self._send_status(properties, name, "error", error="Unknown command {}".format(name))
+
+    def _send(self, properties, data, content_type):
+        if properties is None or properties.reply_to is None:
+            return
+        self._reply(properties.reply_to, properties.correlation_id, data, content_type)
+
+    def _send_status(self, properties, command, status, **fields):
+        reply = {"name": self._provider.get_name(), "command": command, "status": status}
+        reply.update(fields)
+        self._send(properties, json.dumps(reply, default=str), CONTENT_TYPE_JSON)
+
+    def _run_command(self, command, properties):
+        name = command["command"]
+        try:
+            if name == "announce":
+                self._provider.request_announce()
+                result = None
+            elif name == "get":
+                result = self._provider.get_parameter(command["parameter"])
+            else:
+                result = self._provider.set_parameter(command["parameter"], command.get("value"))
+        except NotImplementedError:
+            self._send_status(properties, name, "error", error="Not supported")
+            return
+        except:
+            self._send_status(properties, name, "error", error="{}: {}".format(sys.exc_info()[0].__name__,
+                                                                                 sys.exc_info()[1]))
+            return
+        self._send_status(properties, name, "ok", result=result)
+
+    def _request_poll(self, properties):
+        with self._lock:
+            poll = self._poll
+            if poll is not None and poll.done and time.monotonic() - poll.finished > self._window:
+                poll = None
+            if poll is None:
+                poll = self._poll = PollRequest()
+                self._executor.submit(self._run_poll, poll)
+            if not poll.done:
+                poll.waiters.append(properties)
+                return
+        self._send_poll_result(poll, properties)
+
+    def _run_poll(self, poll):
+        try:
+            poll.data, poll.content_type = self._provider.poll_now()
+            if poll.data is None:
+                poll.error = "Nothing to send"
+        except:
+            poll.error = "{}: {}".format(sys.exc_info()[0].__name__, sys.exc_info()[1])
+        with self._lock:
+            poll.done = True
+            poll.finished = time.monotonic()
+            waiters = poll.waiters
+            poll.waiters = []
+        for properties in waiters:
+            self._send_poll_result(poll, properties)
+
+    def _send_poll_result(self, poll, properties):
+        if poll.error is not None:
+            self._send_status(properties, "poll", "error", error=poll.error)
+        else:
+            self._send(properties, poll.data, poll.content_type)
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
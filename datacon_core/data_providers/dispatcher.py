@@ -0,0 +1,111 @@
+import threading
+import time
+import sys
+import logging
+from collections import deque
+from .poll_stats import Histogram
+
+# Bounded in-process queue between poll and collectors for broker="direct"
+# Poll only puts message to the queue, dispatcher threads call deliver(item) and report(item, result)
+#
+# Overflow policies (queue is full):
+# "drop_oldest" - the oldest queued message is dropped to make room, drop(item) is called for it
+# "block" - poll waits for room (no longer than block_timeout seconds if set), then message is rejected
+# "spool" - message is rejected at once, so that provider can spool it
+
+
+class DirectDispatcher:
+
+    OVERFLOW_POLICIES = ("drop_oldest", "block", "spool")
+
+    def __init__(self, deliver, report, max_size=100, workers=1, overflow="drop_oldest", block_timeout=None,
+                 name="dispatcher", drop=None):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {}".format(overflow))
+        self._deliver = deliver
+        self._report = report
+        self._drop = drop
+        self._max_size = max_size
+        self._overflow = overflow
+        self._block_timeout = block_timeout
+        self._logger = logging.getLogger(__name__)
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._stats = {"accepted": 0, "dropped": 0, "rejected": 0, "delivered": 0, "failed": 0, "max_depth": 0}
+        # wait - time in queue, deliver - collector calls, milliseconds
+        self._wait = Histogram()
+        self._delivery = Histogram()
+        self._threads = [threading.Thread(target=self._run, name="{}-{}".format(name, i), daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    # Returns False if message is rejected
+    def submit(self, item):
+        dropped = None
+        with self._condition:
+            if len(self._queue) >= self._max_size:
+                if self._overflow == "drop_oldest":
+                    dropped = self._queue.popleft()[1]
+                    self._stats["dropped"] += 1
+                elif self._overflow == "block":
+                    if not self._condition.wait_for(lambda: len(self._queue) < self._max_size or self._stopped,
+                                                    self._block_timeout) or self._stopped:
+                        self._stats["rejected"] += 1
+                        return False
+                else:
+                    self._stats["rejected"] += 1
+                    return False
+            self._queue.append((time.perf_counter(), item))
+            self._stats["accepted"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+            self._condition.notify_all()
+        if dropped is not None and self._drop is not None:
+            try:
+                self._drop(dropped)
+            except:
+                self._logger.error("Could not report dropped message: {}".format(sys.exc_info()[0]))
+        return True
+
+    def get_depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._queue)
+            stats["wait"] = self._wait.to_dict()
+            stats["delivery"] = self._delivery.to_dict()
+        return stats
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._queue) > 0 or self._stopped)
+                if len(self._queue) == 0:
+                    return
+                queued, item = self._queue.popleft()
+                # Room for blocked submitters
+                self._condition.notify_all()
+            started = time.perf_counter()
+            try:
+                result = self._deliver(item)
+            except:
+                self._logger.error("Delivery failed: {}".format(sys.exc_info()[0]))
+                result = False
+            done = time.perf_counter()
+            with self._condition:
+                self._wait.add((started - queued) * 1000.0)
+                self._delivery.add((done - started) * 1000.0)
+                self._stats["delivered" if result else "failed"] += 1
+            try:
+                self._report(item, result)
+            except:
+                self._logger.error("Could not report delivery result: {}".format(sys.exc_info()[0]))
@@ -1,11 +1,19 @@
 from .proto import Provider
-import sys, re, os
+import sys, re, os, time
 import datetime
 import logging
 
 
+# Temperature is converted on all sensors at once via therm_bulk_read of bus masters (Linux 5.10+),
+# then converted values are read from "temperature" attributes of sensors
+# So poll takes about one conversion time (750 ms) regardless of number of sensors
+# If bulk conversion is not available, sensors are read one by one via w1_slave (each read converts):
+# bus master holds its mutex for the whole conversion, so concurrent reads would not overlap anyway
 class Ds18b20(Provider):
     DALLAS_BASE_DIR = '/sys/bus/w1/devices/'
+    # Maximum conversion time is 750 ms at 12-bit resolution
+    CONVERSION_TIMEOUT = 1.5
+    CONVERSION_CHECK_INTERVAL = 0.05
 
     def _get_sensor_by_id(self, sensor_id):
         for s in self._sensors:
@@ -14,11 +22,12 @@ class Ds18b20(Provider):
         return None
 
     def _add_sensor(self, sensor_id):
-        self.log_message("Adding sensor {}".format(sensor_id), logging.INFO)
+        self.log_message("Adding sensor {}", logging.INFO, sensor_id)
         sens = {"id": sensor_id,
-                "full_path": self.DALLAS_BASE_DIR + sensor_id + "/w1_slave"}
+                "full_path": os.path.join(self._base_dir, sensor_id, "w1_slave"),
+                "temperature_path": os.path.join(self._base_dir, sensor_id, "temperature")}
         if sensor_id in self._sensor_aliases:
-            self.log_message("Sensor {} has alias {}".format(sensor_id, self._sensor_aliases[sensor_id]), logging.DEBUG)
+            self.log_message("Sensor {} has alias {}", logging.DEBUG, sensor_id, self._sensor_aliases[sensor_id])
             sens["alias"] = self._sensor_aliases[sensor_id]
         sens["added"] = datetime.datetime.utcnow().isoformat()
         sens["updated"] = datetime.datetime.utcnow().isoformat()
@@ -26,16 +35,29 @@ class Ds18b20(Provider):
         self._sensors.append(sens)
 
     def _refresh_sensors_list(self):
-        for f in os.listdir(self.DALLAS_BASE_DIR):
+        for f in os.listdir(self._base_dir):
             if re.match("28(.*)", f):
                 if self._get_sensor_by_id(f) is None:
                     self._add_sensor(f)
+        self._bulk_paths = []
+        if len(self._sensors) == 0 or not all(os.path.exists(s["temperature_path"]) for s in self._sensors):
+            return
+        for f in os.listdir(self._base_dir):
+            path = os.path.join(self._base_dir, f, "therm_bulk_read")
+            if f.startswith("w1_bus_master") and os.path.exists(path):
+                self._bulk_paths.append(path)
+        if len(self._bulk_paths) > 0:
+            self.log_message("Using bulk conversion on {} bus master(s)", logging.INFO, len(self._bulk_paths))
 
 
+    # base_dir - 1-wire sysfs devices directory
     def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
-                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG, sensor_aliases={}):
+                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG, sensor_aliases={},
+                 base_dir=DALLAS_BASE_DIR):
         self._sensors = []
         self._sensor_aliases = sensor_aliases
+        self._base_dir = base_dir
+        self._bulk_paths = []
         
         self._crc_re = re.compile("(YES|NO)")
         self._temp_re = re.compile("t=(([-]*)(\d+))")
@@ -44,43 +66,97 @@ class Ds18b20(Provider):
                          command_routing_keys, redis_channel, pass_to, loglevel)
         self._refresh_sensors_list()
 
+    # Start conversion on all sensors and wait for its end, False if it failed
+    def _bulk_convert(self):
+        try:
+            for path in self._bulk_paths:
+                with open(path, "w") as f:
+                    f.write("trigger\n")
+            deadline = time.monotonic() + self.CONVERSION_TIMEOUT
+            pending = list(self._bulk_paths)
+            while len(pending) > 0:
+                # -1 - conversion is in progress, 1 - converted values are available
+                with open(pending[0]) as f:
+                    state = f.read().strip()
+                if state != "-1":
+                    pending.pop(0)
+                elif time.monotonic() > deadline:
+                    self.log_message("Bulk conversion timed out", logging.WARNING)
+                    return False
+                else:
+                    time.sleep(self.CONVERSION_CHECK_INTERVAL)
+        except:
+            self.log_message("Bulk conversion failed: {}", logging.WARNING, sys.exc_info()[0])
+            return False
+        return True
+
+    def _start_sensor_reading(self, s):
+        current = {}
+        if "alias" in s:
+            self.log_message("Querying {} ({})", logging.DEBUG, s["alias"], s["id"])
+            current["name"] = s["alias"]
+        else:
+            self.log_message("Querying {}", logging.DEBUG, s["id"])
+            current["name"] = s["id"]
+        return current
+
+    def _set_temperature(self, current, temp):
+        current["reading"] = temp
+        current["units"] = "°C"
+        current["measured_parameter"] = "temperature"
+        current["type"] = "Numeric"
+
+    # Value converted by bulk conversion, CRC is checked by kernel
+    def _read_converted(self, s):
+        current = self._start_sensor_reading(s)
+        try:
+            with open(s["temperature_path"]) as sensor_file:
+                self._set_temperature(current, int(sensor_file.read().strip()) / 1000)
+        except OSError:
+            self.log_message("Reading error for {}", logging.WARNING, current["name"])
+            current["error"] = "Reading error"
+        except:
+            self.log_message("Error querying sensors: {}", logging.ERROR, sys.exc_info()[0])
+            return None
+        return current
+
+    # Conversion and reading via w1_slave
+    def _read_sensor(self, s):
+        try:
+            current = self._start_sensor_reading(s)
+            temp = None
+            crc = None
+            with open(s["full_path"]) as sensor_file:
+                readings = sensor_file.readlines()
+            for r in readings:
+                crc_match = self._crc_re.search(r)
+                temp_match = self._temp_re.search(r)
+                if crc_match:
+                    crc = crc_match.group(1) == "YES"
+                elif temp_match:
+                    temp = float(temp_match.group(1))/1000
+            if temp is None or crc is None:
+                self.log_message("Reading error for {}", logging.WARNING, current["name"])
+                current["error"] = "Reading error"
+            elif not crc:
+                self.log_message("CRC error for {}", logging.WARNING, current["name"])
+                current["error"] = "CRC error"
+            else:
+                self._set_temperature(current, temp)
+            return current
+        except:
+            self.log_message("Error querying sensors: {}", logging.ERROR, sys.exc_info()[0])
+            return None
+
 
 # Overriding defaults
 
     def get_current_reading(self, src_id=None):
         self.log_message("Querying sensors via 1-wire bus", logging.DEBUG)
-        reading = []
-        for s in self._sensors:
-            try:
-                current = {}
-                if "alias" in s:
-                    self.log_message("Querying {} ({})".format(s["alias"], s["id"]), logging.DEBUG)
-                    current["name"] = s["alias"]
-                else:
-                    self.log_message("Querying {}".format(s["id"]), logging.DEBUG)
-                    current["name"] = s["id"]
-                with open(s["full_path"]) as sensor_file:
-                    readings = sensor_file.readlines()
-                for r in readings:
-                    crc_match = self._crc_re.search(r)
-                    temp_match = self._temp_re.search(r)
-                    if crc_match:
-                        crc = crc_match.group(1) == "YES"
-                    elif temp_match:
-                        temp = float(temp_match.group(1))/1000
-                if temp is None or crc is None:
-                    self.log_message("Reading error for {}".format(current["name"]), logging.WARNING)
-                    current["error"] = "Reading error"
-                elif not crc:
-                    self.log_message("CRC error for {}".format(current["name"]), logging.WARNING)
-                    current["error"] = "CRC error"
-                else:
-                    current["reading"] = temp
-                    current["units"] = "°C"
-                    current["measured_parameter"] = "temperature"
-                    current["type"] = "Numeric"
-                reading.append(current)
-            except:
-                self.log_message("Error querying sensors: {}".format(sys.exc_info()[0]), logging.ERROR)   
-        return reading
-
+        if len(self._sensors) == 0:
+            return []
+        if len(self._bulk_paths) > 0 and self._bulk_convert():
+            results = [self._read_converted(s) for s in self._sensors]
+        else:
+            results = [self._read_sensor(s) for s in self._sensors]
+        return [r for r in results if r is not None]
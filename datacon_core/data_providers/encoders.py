@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta
+
+has_msgpack = False
+try:
+    import msgpack
+    has_msgpack = True
+except ImportError:
+    pass
+
+# Message encoders
+# Encoder turns message dict into bytes and tells content type of the result
+# Content type travels with the message: AMQP message properties, HTTP Content-Type header
+# Redis has no message properties, so receivers detect content type by the first byte
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+
+EPOCH = datetime(1970, 1, 1)
+
+# Short keys of compact (MessagePack) messages
+MESSAGE_KEYS = {"name": "n", "start_time": "s", "end_time": "f", "reading": "r", "messages": "m"}
+READING_KEYS = {"name": "n", "measured_parameter": "p", "units": "u", "type": "t", "reading": "v", "error": "e"}
+READING_TYPES = {"Numeric": 0, "Discrete": 1, "Text": 2}
+
+# Reverse mappings, for receivers of compact messages
+EXPANDED_MESSAGE_KEYS = {v: k for k, v in MESSAGE_KEYS.items()}
+EXPANDED_READING_KEYS = {v: k for k, v in READING_KEYS.items()}
+EXPANDED_READING_TYPES = {v: k for k, v in READING_TYPES.items()}
+
+
+def detect_content_type(data):
+    if isinstance(data, str) or data[:1] in (b"{", b"["):
+        return CONTENT_TYPE_JSON
+    return CONTENT_TYPE_MSGPACK
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError("{} is not JSON serializable".format(type(value)))
+
+
+def to_epoch(value):
+    if isinstance(value, datetime):
+        return (value - EPOCH).total_seconds()
+    return value
+
+
+class JSONEncoder:
+    content_type = CONTENT_TYPE_JSON
+
+    def encode(self, message):
+        return json.dumps(message, default=_json_default).encode("utf-8")
+
+
+# Timestamps are sent as UTC epoch seconds, keys and reading types are shortened
+class MsgPackEncoder:
+    content_type = CONTENT_TYPE_MSGPACK
+
+    def __init__(self):
+        if not has_msgpack:
+            raise ImportError("msgpack is needed for MessagePack encoding")
+
+    def _compact_reading(self, reading):
+        compact = {}
+        for k, v in reading.items():
+            if k == "type":
+                v = READING_TYPES.get(v, v)
+            compact[READING_KEYS.get(k, k)] = v
+        return compact
+
+    # Member messages of group envelope (see group.ProviderGroup) are compacted the same way
+    def _compact_message(self, message):
+        compact = {}
+        for k, v in message.items():
+            if k == "reading":
+                v = [self._compact_reading(r) for r in v]
+            elif k == "messages":
+                v = [self._compact_message(m) for m in v]
+            elif k in ("start_time", "end_time"):
+                v = to_epoch(v)
+            compact[MESSAGE_KEYS.get(k, k)] = v
+        return compact
+
+    def encode(self, message):
+        return msgpack.packb(self._compact_message(message), use_bin_type=True)
+
+
+ENCODERS = {"json": JSONEncoder,
+            "msgpack": MsgPackEncoder}
+
+
+# Compact message (and members of group envelope) back to regular one,
+# epoch timestamps become ISO strings as in JSON messages
+def expand_compact(message):
+    expanded = {}
+    for k, v in message.items():
+        k = EXPANDED_MESSAGE_KEYS.get(k, k)
+        if k == "reading":
+            v = [{EXPANDED_READING_KEYS.get(rk, rk): EXPANDED_READING_TYPES.get(rv, rv) if rk == "t" else rv
+                  for rk, rv in r.items()} for r in v]
+        elif k == "messages":
+            v = [expand_compact(m) for m in v]
+        elif k in ("start_time", "end_time") and isinstance(v, (int, float)):
+            v = (EPOCH + timedelta(seconds=v)).isoformat()
+        expanded[k] = v
+    return expanded
+
+
+def decode_msgpack(data):
+    if not has_msgpack:
+        raise ValueError("msgpack is needed to decode MessagePack messages")
+    return expand_compact(msgpack.unpackb(data, raw=False))
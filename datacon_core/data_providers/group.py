@@ -0,0 +1,134 @@
+from .proto import Provider
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import asyncio
+import time
+import logging
+import sys
+
+# Group of co-scheduled providers published as one message (envelope) per poll
+# Members are read concurrently, every member builds its own message as usual (processors, sampling,
+# schema interning, ring buffer, self-metrics), members are not scheduled themselves and do not send anything
+# Message-building settings are therefore set on members, the group rejects them with ValueError
+#
+# Envelope:
+# name - group name
+# start_time, end_time - UTC times of start and end of group poll
+# messages - list of member messages, in order of adding members
+#
+# GROUP = ProviderGroup("Local", "Sensors of the node", scheduler, broker="redis")
+# GROUP.add_member(Ds18b20("DS1", "Local dallas sensors", scheduler, broker="direct"))
+# GROUP.add_member(HTU21D("GY-21", "Temperature and humidity measurement", scheduler, broker="direct"))
+# GROUP.set_polling({"cron": {"minute": "0-50/10"}})
+# GROUP.activate_polling()
+#
+# Activating and deactivating the group also resumes and pauses sampling jobs of its members
+
+
+class ProviderGroup(Provider):
+
+    def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
+                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG):
+        self._members = []
+        self._members_by_name = {}
+        self._executor = None
+        super().__init__(name, description, scheduler, broker, publish_routing_key,
+                         command_routing_keys, redis_channel, pass_to, loglevel)
+
+    def add_member(self, provider):
+        if provider.get_name() in self._members_by_name:
+            raise ValueError("Provider {} is already a member of {}".format(provider.get_name(), self._name))
+        self.log_message("Adding {} to group", logging.INFO, provider.get_name())
+        self._members.append(provider)
+        self._members_by_name[provider.get_name()] = provider
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=len(self._members),
+                                            thread_name_prefix="{}-member".format(self._name))
+
+    def get_members(self):
+        return list(self._members)
+
+    def _start_message(self):
+        return {"name": self._name, "start_time": datetime.utcnow(), "messages": []}
+
+    # Failed member gets message with error readings, so that the rest of the group is still sent
+    def _read_member(self, member, fresh):
+        try:
+            with member._poll_lock:
+                return member._read_message(fresh)
+        except:
+            self.log_message("Member {} failed: {}", logging.ERROR, member.get_name(), sys.exc_info()[0])
+            return member._build_message(member._start_message(), member._error_reading("Reading error"))
+
+    def _read_message(self, fresh=False):
+        started = self._start_poll()
+        envelope = self._start_message()
+        futures = [self._executor.submit(self._read_member, m, fresh) for m in self._members]
+        for f in futures:
+            message = f.result()
+            if message is not None:
+                envelope["messages"].append(message)
+        self._stats.add_time("read", time.perf_counter() - started)
+        if len(envelope["messages"]) == 0:
+            self.log_message("Nothing to send", logging.DEBUG)
+            return None
+        return self._finalize_message(envelope)
+
+    # Tags are added to member messages which are interned
+    def _add_tags(self, message):
+        added = False
+        for m in message["messages"]:
+            added = self._members_by_name[m["name"]]._add_tags(m) or added
+        return added
+
+    def request_announce(self):
+        for m in self._members:
+            m.request_announce()
+
+    # Members are read in group executor, so the whole poll is run in executor of the loop
+    async def _poll_current_reading_async(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._poll_current_reading)
+
+    def activate_polling(self):
+        super().activate_polling()
+        for m in self._members:
+            m.activate_polling()
+
+    def deactivate_polling(self):
+        super().deactivate_polling()
+        for m in self._members:
+            m.deactivate_polling()
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["members"] = {m.get_name(): m.get_stats() for m in self._members}
+        return stats
+
+    def _reject_setting(self, setting):
+        raise ValueError("{} of group {} is not supported, it should be set on its members".format(setting, self._name))
+
+    def add_processor(self, processor):
+        self._reject_setting("Processor")
+
+    def set_sampling(self, *args, **kwargs):
+        self._reject_setting("Sampling")
+
+    def set_schema_interning(self, *args, **kwargs):
+        self._reject_setting("Schema interning")
+
+    def set_ring_buffer(self, *args, **kwargs):
+        self._reject_setting("Ring buffer")
+
+    def set_self_metrics(self, *args, **kwargs):
+        self._reject_setting("Self-metrics")
+
+    def set_isolation(self, *args, **kwargs):
+        self._reject_setting("Isolation")
+
+    # Plain readings of all members
+    def get_current_reading(self, src_id=None):
+        reading = []
+        for m in self._members:
+            reading.extend(m.get_current_reading(src_id))
+        return reading
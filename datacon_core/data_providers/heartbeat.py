@@ -1,47 +1,224 @@
-from .proto import Provider
-from random import randint
+from .proto import Provider, QUEUE_FULL
+from random import Random
+from math import sin, pi
+from collections import deque
+import threading
+import time
 import datetime
 import logging
 import sys
 
 HEARTBEAT_UPPER_LIMIT = 4096
 
-class Heartbeat(Provider):
-    def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
-                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG):
+# Value generators of synthetic tags
+# Every generator takes dict of its settings (tag spec) and random generator, next(t) gives value at t seconds
+
+
+# Goes from 0 to upper limit and back by 1 every message
+class CounterValue:
+
+    def __init__(self, spec, rng):
+        self._limit = spec.get("upper", HEARTBEAT_UPPER_LIMIT)
         self._counter = 0
         self._increment = True
-        super().__init__(name, description, scheduler, broker, publish_routing_key,
-                         command_routing_keys, redis_channel, pass_to, loglevel)
-        self.log_message("Starting heartbeat", logging.INFO)
 
-    def get_current_reading(self, src_id=None):
-        reading = []
-
-        self.log_message("Generating counter", logging.DEBUG)
-        reading.append({
-            "name": "test",
-            "units": "",
-            "measured_parameter": "counter",
-            "reading": self._counter,
-            "type": "Numeric"
-        })
-
-        self.log_message("Generating random", logging.DEBUG)
-        reading.append({
-            "name": "test",
-            "units": "",
-            "measured_parameter": "random",
-            "reading": randint(0, HEARTBEAT_UPPER_LIMIT),
-            "type": "Numeric"
-        })
-
-        if self._counter >= HEARTBEAT_UPPER_LIMIT:
+    def next(self, t):
+        value = self._counter
+        if self._counter >= self._limit:
             self._increment = False
         elif self._counter <= 0:
             self._increment = True
-        if self._increment:
-            self._counter += 1
+        self._counter += 1 if self._increment else -1
+        return value
+
+
+class RandomValue:
+
+    def __init__(self, spec, rng):
+        self._rng = rng
+        self._lower = spec.get("lower", 0)
+        self._upper = spec.get("upper", HEARTBEAT_UPPER_LIMIT)
+
+    def next(self, t):
+        return self._rng.randint(self._lower, self._upper)
+
+
+class ConstantValue:
+
+    def __init__(self, spec, rng):
+        self._value = spec.get("value", 0)
+
+    def next(self, t):
+        return self._value
+
+
+# Switches between low and high every period/2 seconds
+class StepValue:
+
+    def __init__(self, spec, rng):
+        self._low = spec.get("low", 0.0)
+        self._high = spec.get("high", 1.0)
+        self._period = spec.get("period", 60.0)
+
+    def next(self, t):
+        return self._high if (t % self._period) >= self._period / 2 else self._low
+
+
+# Gaussian steps of given sigma, kept within lower..upper
+class RandomWalkValue:
+
+    def __init__(self, spec, rng):
+        self._rng = rng
+        self._value = spec.get("start", 0.0)
+        self._sigma = spec.get("sigma", 1.0)
+        self._lower = spec.get("lower")
+        self._upper = spec.get("upper")
+
+    def next(self, t):
+        self._value += self._rng.gauss(0, self._sigma)
+        if self._lower is not None:
+            self._value = max(self._value, self._lower)
+        if self._upper is not None:
+            self._value = min(self._value, self._upper)
+        return self._value
+
+
+class NoisySineValue:
+
+    def __init__(self, spec, rng):
+        self._rng = rng
+        self._offset = spec.get("offset", 0.0)
+        self._amplitude = spec.get("amplitude", 1.0)
+        self._period = spec.get("period", 600.0)
+        self._noise = spec.get("noise", 0.1)
+
+    def next(self, t):
+        return (self._offset + self._amplitude * sin(2 * pi * t / self._period) +
+                self._rng.gauss(0, self._noise))
+
+
+DISTRIBUTIONS = {"counter": CounterValue,
+                 "random": RandomValue,
+                 "constant": ConstantValue,
+                 "step": StepValue,
+                 "random_walk": RandomWalkValue,
+                 "noisy_sine": NoisySineValue}
+
+DEFAULT_TAGS = [{"name": "test", "measured_parameter": "counter", "distribution": "counter"},
+                {"name": "test", "measured_parameter": "random", "distribution": "random"}]
+
+
+# Synthetic load generator
+# tags - list of tag specs: "name", "measured_parameter", "units", "distribution" (see DISTRIBUTIONS)
+#        and settings of the distribution; default is the classic heartbeat (counter and random)
+# tag_count - instead of tags: that many tags "load.<number>" with given distribution settings
+# distribution - spec used for tag_count tags, e.g. {"distribution": "noisy_sine", "amplitude": 5}
+# error_ratio - share of readings replaced with error
+# payload_size - length of Text reading "payload" added to every message (to reach given message size)
+# report_rate - add target and achieved send rates to messages ("Load" tags)
+# rate_window - achieved rate is measured over sends of last rate_window seconds
+# seed - random seed for reproducible load
+class Heartbeat(Provider):
+    def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
+                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG,
+                 tags=None, tag_count=None, distribution=None, error_ratio=0.0, payload_size=0,
+                 report_rate=False, seed=None, rate_window=10.0):
+        self._rng = Random(seed)
+        if tag_count is not None:
+            spec = distribution or {"distribution": "random_walk"}
+            tags = [dict(spec, name="load.{}".format(i), measured_parameter=spec.get("measured_parameter", "value"))
+                    for i in range(tag_count)]
+        self._tags = [(t, DISTRIBUTIONS[t.get("distribution", "random")](t, self._rng)) for t in (tags or DEFAULT_TAGS)]
+        self._error_ratio = error_ratio
+        self._payload = "x" * payload_size
+        self._target_rate = None
+        self._report_rate = report_rate
+        self._started = time.monotonic()
+        self._rate_window = rate_window
+        # Times of sends within rate window, send counters, all guarded by _sent_lock
+        # (results of dispatcher sends come from its threads)
+        self._sent_times = deque()
+        self._sent_lock = threading.Lock()
+        self._sent = 0
+        self._failed = 0
+        super().__init__(name, description, scheduler, broker, publish_routing_key,
+                         command_routing_keys, redis_channel, pass_to, loglevel)
+        self.log_message("Starting heartbeat, {} tag(s) per message", logging.INFO, len(self._tags))
+
+    # Poll (and send) `rate` messages per second, instead of set_polling
+    # Achieved rate is measured anew
+    def set_rate(self, rate):
+        self._target_rate = rate
+        with self._sent_lock:
+            self._sent_times.clear()
+        return self.set_polling({"delay": 1.0 / rate})
+
+    def _after_send(self, message, data, content_type, sent):
+        if sent is None:
+            # Queued by dispatcher, result comes later
+            pass
+        elif sent and sent is not QUEUE_FULL:
+            now = time.monotonic()
+            with self._sent_lock:
+                self._sent_times.append(now)
+                self._expire_sent(now)
+                self._sent += 1
         else:
-            self._counter -=1
-        return reading
\ No newline at end of file
+            with self._sent_lock:
+                self._failed += 1
+        super()._after_send(message, data, content_type, sent)
+
+    def _expire_sent(self, now):
+        while len(self._sent_times) > 0 and self._sent_times[0] < now - self._rate_window:
+            self._sent_times.popleft()
+
+    # Messages per second actually sent within rate window, None if there are less than two sends
+    def get_actual_rate(self):
+        with self._sent_lock:
+            self._expire_sent(time.monotonic())
+            if len(self._sent_times) < 2 or self._sent_times[-1] <= self._sent_times[0]:
+                return None
+            return (len(self._sent_times) - 1) / (self._sent_times[-1] - self._sent_times[0])
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self._sent_lock:
+            sent, failed = self._sent, self._failed
+        stats["load"] = {"target_rate": self._target_rate,
+                         "actual_rate": self.get_actual_rate(),
+                         "sent": sent,
+                         "failed": failed}
+        return stats
+
+    def _rate_reading(self):
+        reading = []
+        for parameter, value in (("rate_target", self._target_rate), ("rate_actual", self.get_actual_rate())):
+            r = {"name": "Load", "units": "1/s", "measured_parameter": parameter, "type": "Numeric"}
+            if value is None:
+                r["error"] = "No data"
+            else:
+                r["reading"] = value
+            reading.append(r)
+        return reading
+
+    def get_current_reading(self, src_id=None):
+        self.log_message("Generating {} tag(s)", logging.DEBUG, len(self._tags))
+        t = time.monotonic() - self._started
+        reading = []
+        for spec, generator in self._tags:
+            r = {"name": spec.get("name", "test"),
+                 "units": spec.get("units", ""),
+                 "measured_parameter": spec.get("measured_parameter", "value"),
+                 "type": "Numeric"}
+            value = generator.next(t)
+            if self._error_ratio and self._rng.random() < self._error_ratio:
+                r["error"] = "Injected error"
+            else:
+                r["reading"] = value
+            reading.append(r)
+        if self._payload:
+            reading.append({"name": "test", "units": "", "measured_parameter": "payload", "type": "Text",
+                            "reading": self._payload})
+        if self._report_rate:
+            reading.extend(self._rate_reading())
+        return reading
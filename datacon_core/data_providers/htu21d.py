@@ -1,6 +1,7 @@
 from .proto import Provider
-from smbus2 import SMBus
+from .i2c_bus import get_bus
 import datetime
+import time
 from math import log, fabs
 import logging
 import sys
@@ -8,8 +9,17 @@ import sys
 class HTU21D(Provider):
     SLAVE_ADDRESS = 0x40
 
-    READ_TEMPERATURE_COMMAND = 0xE3
-    READ_HUMIDITY_COMMAND = 0xE5
+    # No-hold master commands: sensor does not stretch the clock while converting,
+    # bus is free for other devices until result is read
+    READ_TEMPERATURE_COMMAND = 0xF3
+    READ_HUMIDITY_COMMAND = 0xF5
+
+    # Maximum conversion times in seconds (14-bit temperature, 12-bit humidity)
+    TEMPERATURE_CONVERSION_TIME = 0.050
+    HUMIDITY_CONVERSION_TIME = 0.016
+    # Sensor does not acknowledge read until conversion is finished
+    RESULT_RETRY_INTERVAL = 0.005
+    RESULT_RETRIES = 10
 
     READ_USER_REGISTER_COMMAND = 0xE7
     WRITE_USER_REGISTER_COMMAND = 0xE6
@@ -32,6 +42,21 @@ class HTU21D(Provider):
     # TODO:
     # CRC-8 check
 
+    # Start conversion, wait for it without holding the bus and read (msb, lsb, crc)
+    # Whole sequence holds the device lock, so no other command reaches the sensor before its result is read
+    # (e.g. from reading outside of provider poll), other devices use the bus while it converts
+    def _measure(self, command, conversion_time):
+        with self._bus.device(self.SLAVE_ADDRESS):
+            self._bus.write_byte(self.SLAVE_ADDRESS, command)
+            time.sleep(conversion_time)
+            for i in range(self.RESULT_RETRIES):
+                try:
+                    return self._bus.read_bytes(self.SLAVE_ADDRESS, 3)
+                except OSError:
+                    if i == self.RESULT_RETRIES - 1:
+                        raise
+                    time.sleep(self.RESULT_RETRY_INTERVAL)
+
     def _get_temperature(self):
         out_temp = {"name": "Main",
                     "measured_parameter": "temperature",
@@ -39,13 +64,13 @@ class HTU21D(Provider):
                     "type": "Numeric"}
         try:
             self.log_message("Reading temperature", logging.DEBUG)  
-            msb, lsb, crc = self._bus.read_i2c_block_data(self.SLAVE_ADDRESS, self.READ_TEMPERATURE_COMMAND ,3)
+            msb, lsb, crc = self._measure(self.READ_TEMPERATURE_COMMAND, self.TEMPERATURE_CONVERSION_TIME)
             temp = -46.85 + 175.72 * (msb * 256 + lsb) / 65536.0
             out_temp["reading"] = temp
             self._last_temperature = temp
             self._temperature_ok = True
         except:
-            self.log_message("Could not read temperature: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not read temperature: {}", logging.ERROR, sys.exc_info()[0])
             out_temp["error"] = "Reading error"
             self._temperature_ok = False
         return out_temp
@@ -57,13 +82,13 @@ class HTU21D(Provider):
                     "type": "Numeric"}
         try:
             self.log_message("Reading humidity", logging.DEBUG)  
-            msb, lsb, crc = self._bus.read_i2c_block_data(self.SLAVE_ADDRESS, self.READ_HUMIDITY_COMMAND ,3)
+            msb, lsb, crc = self._measure(self.READ_HUMIDITY_COMMAND, self.HUMIDITY_CONVERSION_TIME)
             hum = -6 + 125 * (msb * 256 + lsb) / 65536.0
             out_hum["reading"] = hum
             self._last_humidity = hum
             self._humidity_ok = True
         except:
-            self.log_message("Could not read humidity: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not read humidity: {}", logging.ERROR, sys.exc_info()[0])
             out_hum["error"] = "Reading error"
             self._humidity_ok = False
         return out_hum
@@ -93,7 +118,7 @@ class HTU21D(Provider):
                 self._dewpoint = dewpoint
                 self._dew_control()
             except:
-                self.log_message("Could not calculate dewpoint: {}".format(sys.exc_info()[0]), logging.ERROR)
+                self.log_message("Could not calculate dewpoint: {}", logging.ERROR, sys.exc_info()[0])
                 out_dew["error"] = "Calculation error"
         return out_dew
 
@@ -112,28 +137,30 @@ class HTU21D(Provider):
             out_heater["reading"] = self._get_user_register_as_list()[-3] == "1"
             self._heater_status = out_heater["reading"]
         except:
-            self.log_message("Could not get heater status: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not get heater status: {}", logging.ERROR, sys.exc_info()[0])
             out_heater["error"] = "Reading error"
         return out_heater
 
 
     def _enable_heating(self):
-        current_register = self._get_user_register_as_list()
-        if current_register[-3] != "1":
-            current_register[-3] = "1"
-            self._bus.write_i2c_block_data(self.SLAVE_ADDRESS, self.WRITE_USER_REGISTER_COMMAND, [int("".join(current_register), 2)])
-            return True
-        else:
-            return False
+        with self._bus.device(self.SLAVE_ADDRESS), self._bus.transaction():
+            current_register = self._get_user_register_as_list()
+            if current_register[-3] != "1":
+                current_register[-3] = "1"
+                self._bus.write_i2c_block_data(self.SLAVE_ADDRESS, self.WRITE_USER_REGISTER_COMMAND, [int("".join(current_register), 2)])
+                return True
+            else:
+                return False
 
     def _disable_heating(self):
-        current_register = self._get_user_register_as_list()
-        if current_register[-3] != "0":
-            current_register[-3] = "0"
-            self._bus.write_i2c_block_data(self.SLAVE_ADDRESS, self.WRITE_USER_REGISTER_COMMAND, [int("".join(current_register), 2)])
-            return True
-        else:
-            return False
+        with self._bus.device(self.SLAVE_ADDRESS), self._bus.transaction():
+            current_register = self._get_user_register_as_list()
+            if current_register[-3] != "0":
+                current_register[-3] = "0"
+                self._bus.write_i2c_block_data(self.SLAVE_ADDRESS, self.WRITE_USER_REGISTER_COMMAND, [int("".join(current_register), 2)])
+                return True
+            else:
+                return False
 
     def _heater_control(self):
         if self._dewpoint_reached:
@@ -163,15 +190,16 @@ class HTU21D(Provider):
         super().__init__(name, description, scheduler, broker, publish_routing_key,
                          command_routing_keys, redis_channel, pass_to, loglevel)
         self.log_message("Initializing I2C bus", logging.INFO)
+        # Bus is shared with other devices (see i2c_bus)
         try:
-            self._bus = SMBus(bus_number)
+            self._bus = get_bus(bus_number)
             self._heater_operation = self.HEATER_OPERATION
             self._heater_cooldown = self.HEATER_COOLDOWN
             self._last_humidity = None
             self._last_temperature = None
             self._heater_status = None
         except:
-            self.log_message("I2C bus init failed: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("I2C bus init failed: {}", logging.ERROR, sys.exc_info()[0])
 
 
 # Overriding defaults
@@ -0,0 +1,85 @@
+import threading
+from smbus2 import SMBus, i2c_msg
+
+# Shared I2C bus manager
+# All devices on a bus use one SMBus handle, every transaction holds the bus lock,
+# so transfers of different providers do not interleave
+# Drivers should not hold the bus while a device converts (no clock stretching, no sleeping under lock),
+# then one device's conversion overlaps with transfers to other devices
+#
+# bus = get_bus(0)
+# bus.write_byte(0x40, 0xF3)
+# with bus.transaction():
+#     ... several transfers that should go together ...
+# with bus.device(0x40):
+#     ... command, conversion and result of one device, other devices may use the bus meanwhile ...
+
+
+class I2CBus:
+
+    def __init__(self, bus_number, bus=None):
+        self.bus_number = bus_number
+        self._bus = SMBus(bus_number) if bus is None else bus
+        self._lock = threading.RLock()
+        # address -> lock of multi-step sequence of the device
+        self._device_locks = {}
+        self._device_locks_lock = threading.Lock()
+
+    def transaction(self):
+        return self._lock
+
+    # Lock of one device: its command/result sequences do not interleave, the bus is not held
+    def device(self, address):
+        with self._device_locks_lock:
+            if address not in self._device_locks:
+                self._device_locks[address] = threading.RLock()
+            return self._device_locks[address]
+
+    def read_byte_data(self, address, register):
+        with self._lock:
+            return self._bus.read_byte_data(address, register)
+
+    def write_byte_data(self, address, register, value):
+        with self._lock:
+            self._bus.write_byte_data(address, register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+        with self._lock:
+            return self._bus.read_i2c_block_data(address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        with self._lock:
+            self._bus.write_i2c_block_data(address, register, data)
+
+    def write_byte(self, address, value):
+        with self._lock:
+            self._bus.write_byte(address, value)
+
+    # Plain read of `length` bytes (no register address), e.g. result of no-hold measurement
+    # Raises OSError if device does not acknowledge (measurement is not finished yet)
+    def read_bytes(self, address, length):
+        msg = i2c_msg.read(address, length)
+        with self._lock:
+            self._bus.i2c_rdwr(msg)
+        return list(msg)
+
+    def close(self):
+        with self._lock:
+            self._bus.close()
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+# Bus manager of given bus number, created on first use
+def get_bus(bus_number):
+    with _buses_lock:
+        if bus_number not in _buses:
+            _buses[bus_number] = I2CBus(bus_number)
+        return _buses[bus_number]
+
+# Use custom SMBus-compatible object for given bus number (e.g. emulated bus)
+def set_bus(bus_number, bus):
+    with _buses_lock:
+        _buses[bus_number] = I2CBus(bus_number, bus)
+        return _buses[bus_number]
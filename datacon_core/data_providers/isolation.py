@@ -0,0 +1,144 @@
+import multiprocessing
+import importlib
+import threading
+import logging
+import logging.handlers
+import sys
+
+# Process-isolated reading with hard timeouts
+# get_current_reading of the provider runs in a worker process, which is kept between polls
+# (so driver state, e.g. open bus handles and counters, lives in the worker)
+# Worker that does not answer in time is killed and a new one is started for the next poll
+#
+# Worker is started with "forkserver" ("spawn" where it is not available), not forked from the node:
+# forked child would inherit locks held by other threads (bus, logging) at fork time
+# Driver is built in the worker with the same constructor arguments, without scheduler and sending,
+# worker log records are passed to the node loggers via queue
+
+# Leading positional arguments shared by all providers
+PROVIDER_ARGS = ("name", "description", "scheduler", "broker", "publish_routing_key",
+                 "command_routing_keys", "redis_channel", "pass_to", "loglevel")
+
+
+class PollTimeout(Exception):
+    pass
+
+
+class WorkerError(Exception):
+    pass
+
+
+# (module, class name, args, kwargs) to build a copy of provider in worker
+def reader_spec(provider):
+    args, kwargs = getattr(provider, "_init_args", ((), {}))
+    kwargs = dict(kwargs)
+    kwargs.update(zip(PROVIDER_ARGS, args))
+    kwargs.update({"scheduler": None, "broker": "direct", "pass_to": None, "command_routing_keys": []})
+    cls = type(provider)
+    return cls.__module__, cls.__qualname__, tuple(args[len(PROVIDER_ARGS):]), kwargs
+
+
+def _build_provider(spec):
+    module_name, class_name, args, kwargs = spec
+    return getattr(importlib.import_module(module_name), class_name)(*args, **kwargs)
+
+
+def _worker(spec, conn, log_queue, log_level):
+    root = logging.getLogger()
+    root.handlers = []
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(log_level)
+    provider = None
+    while True:
+        try:
+            src_id = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            if provider is None:
+                provider = _build_provider(spec)
+            conn.send(("ok", provider.get_current_reading(src_id)))
+        except:
+            conn.send(("error", "{}: {}".format(sys.exc_info()[0].__name__, sys.exc_info()[1])))
+
+
+# Worker records go to the logger of the same name in the node
+class ForwardingHandler(logging.Handler):
+
+    def emit(self, record):
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def _get_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class IsolatedReader:
+
+    def __init__(self, provider, timeout=10):
+        self._provider = provider
+        self._spec = reader_spec(provider)
+        self._timeout = timeout
+        self._context = _get_context()
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._logger = logging.getLogger(__name__)
+        self._log_queue = self._context.Queue()
+        self._log_listener = logging.handlers.QueueListener(self._log_queue, ForwardingHandler())
+        self._log_listener.start()
+
+    def _start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(target=_worker,
+                                              args=(self._spec, child_conn, self._log_queue,
+                                                    logging.getLogger().getEffectiveLevel()),
+                                              name="{}-reader".format(self._provider.get_name()), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+    def _kill(self):
+        self._logger.warning("Killing reader process of {}".format(self._provider.get_name()))
+        try:
+            self._process.kill()
+            self._process.join(1)
+        except:
+            self._logger.error("Could not kill reader process: {}".format(sys.exc_info()[0]))
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def stop(self):
+        with self._lock:
+            if self._process is not None:
+                self._kill()
+        self._log_listener.stop()
+
+    def read(self, src_id=None):
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                if self._process is not None:
+                    self._kill()
+                self._start()
+            try:
+                self._conn.send(src_id)
+                ready = self._conn.poll(self._timeout)
+            except (EOFError, OSError):
+                self._kill()
+                raise WorkerError("Reader process died")
+            if not ready:
+                self._kill()
+                raise PollTimeout("No reading in {} s".format(self._timeout))
+            try:
+                status, result = self._conn.recv()
+            except (EOFError, OSError):
+                self._kill()
+                raise WorkerError("Reader process died")
+        if status != "ok":
+            raise WorkerError(result)
+        return result
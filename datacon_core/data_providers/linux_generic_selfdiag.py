@@ -1,12 +1,40 @@
 from .proto import Provider
+from . import probe_cache as probes
+from .procfs import ProcfsSampler
+from data_processors.counter_rate import CounterRate
 import re, os, logging, psutil, sys, socket
 
+# Subclasses should call _take_snapshot() at the beginning of get_current_reading,
+# then CPU, RAM and network readings come from one pass over procfs (see procfs.ProcfsSampler)
+# Without snapshot (or if procfs is not available) psutil is used
 class LinuxSelfDiagProto(Provider):
 
     def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
                  command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG):
         super().__init__(name, description, scheduler, broker, publish_routing_key,
                          command_routing_keys, redis_channel, pass_to, loglevel)
+        self._snapshot = None
+        try:
+            self._procfs = ProcfsSampler()
+        except OSError:
+            self.log_message("procfs is not available, using psutil: {}", logging.WARNING, sys.exc_info()[1])
+            self._procfs = None
+
+    # Publish network traffic and error counters as per-second rates ("traffic_in_rate" and so on),
+    # cumulative values are sent only once in totals_interval seconds
+    # Rates are derived before other processors (e.g. EdgeFilter), counter going down gives no rate once
+    def set_counter_rates(self, totals_interval=3600):
+        self._processors.insert(0, CounterRate(["traffic_in", "traffic_out", "errors_in", "errors_out"],
+                                               totals_interval))
+
+    def _take_snapshot(self):
+        if self._procfs is None:
+            return
+        try:
+            self._snapshot = self._procfs.sample()
+        except:
+            self.log_message("Could not read procfs: {}", logging.ERROR, sys.exc_info()[0])
+            self._snapshot = None
 
     def _get_free_space(self, path="/"):
         res_list = []
@@ -20,13 +48,13 @@ class LinuxSelfDiagProto(Provider):
                 "measured_parameter": "total",
                 "type": "Numeric"}
         try:
-            p = psutil.disk_usage(path)
+            p = probes.disk_usage(path)
             free_gb = (p.total - p.used) / 1048576.0
             total_gb = p.total / 1048576.0
             f_gb["reading"] = free_gb
             t_gb["reading"] = total_gb
         except:
-            self.log_message("Could not get free space on disk: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not get free space on disk: {}", logging.ERROR, sys.exc_info()[0])
             f_gb["error"] = "Reading error"
             t_gb["error"] = "Reading error"
         res_list.append(f_gb)
@@ -44,11 +72,14 @@ class LinuxSelfDiagProto(Provider):
                 "units": "Mb",
                 "measured_parameter": "total",
                 "type": "Numeric"}
-        matches = 0
-        mem = psutil.virtual_memory()
         try:
-            t_ram["reading"] = mem.total / 1048576.0
-            f_ram["reading"] = mem.available / 1048576.0
+            if self._snapshot is not None:
+                t_ram["reading"] = self._snapshot["memory"]["MemTotal"] / 1024.0
+                f_ram["reading"] = self._snapshot["memory"]["MemAvailable"] / 1024.0
+            else:
+                mem = probes.virtual_memory()
+                t_ram["reading"] = mem.total / 1048576.0
+                f_ram["reading"] = mem.available / 1048576.0
         except:
             for rd in [t_ram, f_ram]:
                 if "reading" not in rd:
@@ -58,7 +89,8 @@ class LinuxSelfDiagProto(Provider):
         res_list.append(f_ram)
         return res_list
 
-    def _get_cpu_usage(self):
+    # per_core - add load of every core as "CPU.<number>" (only with procfs snapshot)
+    def _get_cpu_usage(self, per_core=False):
         res_list = []
         self.log_message("Getting CPU usage", logging.DEBUG)
         cpu_l = {
@@ -67,12 +99,27 @@ class LinuxSelfDiagProto(Provider):
             "units": "%",
             "type": "Numeric"
         }
+        res_list.append(cpu_l)
+        if self._snapshot is not None:
+            if self._snapshot["cpu"] is None:
+                cpu_l["error"] = "No data"
+            else:
+                cpu_l["reading"] = self._snapshot["cpu"]
+            if per_core:
+                for i, load in enumerate(self._snapshot["cores"]):
+                    core = {k: v for k, v in cpu_l.items() if k not in ("reading", "error")}
+                    core["name"] = "CPU.{}".format(i)
+                    if load is None:
+                        core["error"] = "No data"
+                    else:
+                        core["reading"] = load
+                    res_list.append(core)
+            return res_list
         try:
-            cpu_l["reading"] = psutil.cpu_percent(interval=0.1)
+            cpu_l["reading"] = probes.cpu_percent(0.1)
         except:
-            self.log_message("Could not get CPU load: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not get CPU load: {}", logging.ERROR, sys.exc_info()[0])
             cpu_l["error"] = "reading error"
-        res_list.append(cpu_l)
         return res_list
 
     def _get_cpu_frequency(self):
@@ -85,9 +132,9 @@ class LinuxSelfDiagProto(Provider):
             "type": "Numeric"
         }
         try:
-            cpu_f["reading"] = psutil.cpu_freq().current
+            cpu_f["reading"] = probes.cpu_freq().current
         except:
-            self.log_message("Could not get CPU frequency: {}".format(sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not get CPU frequency: {}", logging.ERROR, sys.exc_info()[0])
             cpu_f["error"] = "reading error"
         res_list.append(cpu_f)
         return res_list
@@ -96,25 +143,31 @@ class LinuxSelfDiagProto(Provider):
         res_list = []
         if sensor_name is None:
             sensor_name = sensor_id
-        self.log_message("Getting {} temperature".format(sensor_name), logging.DEBUG)
+        self.log_message("Getting {} temperature", logging.DEBUG, sensor_name)
         tmp = { "name": sensor_name,
                 "units": "°C",
                 "measured_parameter": "temperature",
                 "type": "Numeric"}
         try:
-            tmp_value = psutil.sensors_temperatures()[sensor_id][0].current
+            tmp_value = probes.sensors_temperatures()[sensor_id][0].current
             tmp["reading"] = tmp_value
         except:
-            self.log_message("Could not get {} temperature: {}".format(sensor_name, sys.exc_info()[0]), logging.ERROR)
+            self.log_message("Could not get {} temperature: {}", logging.ERROR, sensor_name, sys.exc_info()[0])
             tmp["error"] = "Reading error"
         res_list.append(tmp)
         return res_list
 
+    # interface -> (bytes received, bytes sent, receive errors, transmit errors)
+    def _get_net_counters(self):
+        if self._snapshot is not None:
+            return self._snapshot["net"]
+        return {k: (v.bytes_recv, v.bytes_sent, v.errin, v.errout) for k, v in probes.net_io_counters().items()}
+
     def _get_net_stats(self, if_id, if_name=None, get_bytes=True, get_errors=True):
         res_list = []
         if if_name is None:
             if_name = if_id
-        self.log_message("Getting network interface {} statistics".format(if_name), logging.DEBUG)
+        self.log_message("Getting network interface {} statistics", logging.DEBUG, if_name)
         if get_bytes:
             bytes_rx = { "name": "Network.{}".format(if_name),
                     "units": "Mb",
@@ -147,7 +200,7 @@ class LinuxSelfDiagProto(Provider):
                 "type": "Text"}
         res_list.append(ip_v4)
         res_list.append(mac)
-        addr = psutil.net_if_addrs()
+        addr = probes.net_if_addrs()
         if if_id not in addr:
             ip_v4["error"] = "Interface not found"
             mac["error"] = "Interface not found"
@@ -164,15 +217,15 @@ class LinuxSelfDiagProto(Provider):
                     mac["reading"] = i.address
                     continue
         if get_bytes or get_errors:
-            stats = psutil.net_io_counters(pernic=True)
+            stats = self._get_net_counters()
             if get_bytes:
                 try:
                     if if_id not in stats:
                         for t in [bytes_rx, bytes_tx]:
                             t["error"] = "Interface not found"
                             res_list.append(t)
-                    bytes_rx["reading"] = stats[if_id].bytes_recv / 1048576.0
-                    bytes_tx["reading"] = stats[if_id].bytes_sent / 1048576.0
+                    bytes_rx["reading"] = stats[if_id][0] / 1048576.0
+                    bytes_tx["reading"] = stats[if_id][1] / 1048576.0
                 except:
                     for t in [bytes_rx, bytes_tx]:
                         t["error"] = "Error getting stats"
@@ -183,8 +236,8 @@ class LinuxSelfDiagProto(Provider):
                         for t in [err_rx, err_tx]:
                             t["error"] = "Interface not found"
                             res_list.append(t)
-                    err_rx["reading"] = stats[if_id].errin
-                    err_tx["reading"] = stats[if_id].errout
+                    err_rx["reading"] = stats[if_id][2]
+                    err_tx["reading"] = stats[if_id][3]
                 except:
                     for t in [err_rx, err_tx]:
                         t["error"] = "Error getting stats"
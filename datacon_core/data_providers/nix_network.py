@@ -1,13 +1,19 @@
 from .proto import Provider
+from . import probe_cache as probes
+from . import sock_diag
 import sys, re, os, psutil, socket
 from datetime import datetime
 import logging
 
+# backend - how sockets are enumerated: "netlink" or "proc" (see sock_diag), "psutil" (all sockets of the host),
+# "auto" - netlink, falling back to proc if netlink sock_diag is not available
 class ConnectionMon(Provider):
 
     def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
                  command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG,
-                 connection_filter={}):
+                 connection_filter={}, backend="auto"):
+        self._backend = "netlink" if backend == "auto" else backend
+        self._fallback = backend == "auto"
         self._iface = connection_filter.get("iface")
         self._port = connection_filter.get("port")
         self._alias_conn = connection_filter.get("alias_conn")
@@ -18,13 +24,34 @@ class ConnectionMon(Provider):
 
     def _check_iface_address(self):
         self._ip_addresses = []
-        for name, settings in psutil.net_if_addrs().items():
+        for name, settings in probes.net_if_addrs().items():
             if self._iface is not None and self._iface != name:
                 continue
             for s in settings:
                 if s.family == socket.AF_INET:
                     self._ip_addresses.append(s.address)
 
+    def _get_psutil_sockets(self):
+        for conn in probes.net_connections():
+            laddr_fields = conn.laddr._fields
+            if(type(conn.laddr) == psutil._common.addr and "port" in laddr_fields and "ip" in laddr_fields):
+                if conn.laddr.port == self._port or self._port is None:
+                    raddr = conn.raddr.ip if type(conn.raddr) == psutil._common.addr and "ip" in conn.raddr._fields else None
+                    yield conn.status, sock_diag.unmap_address(conn.laddr.ip), sock_diag.unmap_address(raddr)
+
+    # (status, local IP, remote IP) of sockets with configured port
+    def _get_sockets(self):
+        if self._backend == "psutil":
+            return list(self._get_psutil_sockets())
+        try:
+            return list(sock_diag.query(self._port, self._backend))
+        except OSError:
+            if not self._fallback or self._backend != "netlink":
+                raise
+            self.log_message("Netlink sock_diag is not available ({}), using /proc", logging.WARNING, sys.exc_info()[1])
+            self._backend = "proc"
+            return list(sock_diag.query(self._port, self._backend))
+
     def _get_connection_stats(self):
 
         tag_name = self._alias_if or self._iface or "all"
@@ -43,22 +70,16 @@ class ConnectionMon(Provider):
                 "measured_parameter": "clients_{}".format(tag_subname),
                 "type": "Numeric",
                 "reading": 0 }
-        client_ips = []
-        for conn in psutil.net_connections():
-            laddr_fields = conn.laddr._fields
-            if(type(conn.laddr) == psutil._common.addr and "port" in laddr_fields and "ip" in laddr_fields):
-                port = conn.laddr.port
-                addr = conn.laddr.ip
-                port_pass = port == self._port or self._port is None
-                ip_pass = addr in self._ip_addresses or len(self._ip_addresses) == 0
-                if port_pass and ip_pass:
-                    if conn.status == "ESTABLISHED":
-                        connection_counter["reading"] += 1
-                        if (type(conn.raddr) == psutil._common.addr and "ip" in conn.raddr._fields):
-                            if conn.raddr.ip not in client_ips:
-                                client_ips.append(conn.raddr.ip)
-                    elif conn.status == "LISTEN":
-                        is_listening["reading"] = True
+        client_ips = set()
+        ip_addresses = set(self._ip_addresses)
+        for status, laddr, raddr in self._get_sockets():
+            if laddr in ip_addresses or len(ip_addresses) == 0:
+                if status == "ESTABLISHED":
+                    connection_counter["reading"] += 1
+                    if raddr is not None:
+                        client_ips.add(raddr)
+                elif status == "LISTEN":
+                    is_listening["reading"] = True
         ip_connected["reading"] = len(client_ips)
         res_list = [connection_counter, is_listening, ip_connected]
         return res_list
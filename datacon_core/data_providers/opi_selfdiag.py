@@ -6,8 +6,9 @@ import logging
 class OrangePiSelfDiag(LinuxSelfDiagProto):
 
     def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
-                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG):
+                 command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG, per_core_load=False):
             
+        self._per_core_load = per_core_load
         super().__init__(name, description, scheduler, broker, publish_routing_key,
                          command_routing_keys, redis_channel, pass_to, loglevel)
         self.log_message("Initializing self-diagnostics for Orange Pi", logging.INFO)
@@ -16,7 +17,8 @@ class OrangePiSelfDiag(LinuxSelfDiagProto):
 
     def get_current_reading(self, src_id=None):
         reading = []
-        reading.extend(self._get_cpu_usage())
+        self._take_snapshot()
+        reading.extend(self._get_cpu_usage(self._per_core_load))
         reading.extend(self._get_cpu_frequency())
         reading.extend(self._get_temperature("iio_hwmon", "SoC"))
         reading.extend(self._get_free_space())
@@ -0,0 +1,130 @@
+import threading
+import signal
+import json
+from datetime import datetime
+
+# Poll instrumentation
+# Latencies are kept in fixed-bucket histograms (constant memory), values are in milliseconds
+# Every histogram is kept twice: since start ("total") and since last self-metrics reading ("window")
+
+
+class Histogram:
+
+    # Upper bounds of buckets in milliseconds, last bucket is unbounded
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        i = 0
+        while i < len(self.BOUNDS) and value > self.BOUNDS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # Upper bound of bucket containing given percentile (maximum for the last bucket)
+    def percentile(self, q):
+        if self.count == 0:
+            return None
+        threshold = q / 100.0 * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= threshold and c > 0:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else None,
+                "p50": self.percentile(50),
+                "p95": self.percentile(95),
+                "max": self.max if self.count else None,
+                "buckets": dict(zip([str(b) for b in self.BOUNDS] + ["inf"], self.counts))}
+
+
+class PollStats:
+
+    # read - get_current_reading and processing, encode - serialization, publish - sending
+    # lateness - actual start of poll against scheduled fire time
+    HISTOGRAMS = ("read", "encode", "publish", "lateness")
+    # queue_overflows - messages rejected by full dispatcher queue, queue_drops - queued messages dropped for new ones
+    COUNTERS = ("polls", "publish_failures", "read_failures", "timeouts", "missed", "queue_overflows", "queue_drops")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = datetime.utcnow()
+        self._total = self._new_set()
+        self._window = self._new_set()
+
+    def _new_set(self):
+        stats = {h: Histogram() for h in self.HISTOGRAMS}
+        stats.update({c: 0 for c in self.COUNTERS})
+        return stats
+
+    def add_time(self, histogram, seconds):
+        with self._lock:
+            for s in (self._total, self._window):
+                s[histogram].add(seconds * 1000.0)
+
+    def add_count(self, counter):
+        with self._lock:
+            for s in (self._total, self._window):
+                s[counter] += 1
+
+    def _to_dict(self, stats):
+        return {k: v.to_dict() if isinstance(v, Histogram) else v for k, v in stats.items()}
+
+    def to_dict(self):
+        with self._lock:
+            result = self._to_dict(self._total)
+        result["since"] = self._started.isoformat()
+        return result
+
+    # Self-metrics readings for the period since previous call
+    def take_window_reading(self):
+        with self._lock:
+            window = self._window
+            self._window = self._new_set()
+        reading = []
+        for h in self.HISTOGRAMS:
+            for field in ("mean", "p95", "max"):
+                r = {"name": "Poll",
+                     "measured_parameter": "{}_{}".format(h, field),
+                     "units": "ms",
+                     "type": "Numeric"}
+                value = window[h].to_dict()[field]
+                if value is None:
+                    r["error"] = "No data"
+                else:
+                    r["reading"] = value
+                reading.append(r)
+        for c in self.COUNTERS:
+            reading.append({"name": "Poll",
+                            "measured_parameter": c,
+                            "units": "",
+                            "type": "Numeric",
+                            "reading": window[c]})
+        return reading
+
+
+# Local stats dump of several providers as JSON (to file or as a string)
+def dump_stats(providers, filename=None):
+    stats = {"{} ({})".format(p.get_name(), p.get_description()): p.get_stats() for p in providers}
+    dump = json.dumps(stats, sort_keys=True, indent=2)
+    if filename is not None:
+        with open(filename, "w") as f:
+            f.write(dump)
+    return dump
+
+
+# Write stats dump on signal, e.g. "kill -USR1 <pid>"
+def install_dump_signal(providers, filename, signum=signal.SIGUSR1):
+    signal.signal(signum, lambda s, f: dump_stats(providers, filename))
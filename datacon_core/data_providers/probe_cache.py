@@ -0,0 +1,78 @@
+import threading
+import time
+import psutil
+
+# Process-wide snapshot cache for expensive system probes
+# Providers polled on the same tick share one call of each probe (e.g. psutil.net_connections)
+# Snapshot is kept for `ttl` seconds, only one thread runs a probe at a time (single-flight),
+# others wait for its result
+# Snapshots are shared, so callers should not modify them
+
+
+class ProbeCache:
+
+    DEFAULT_TTL = 5.0
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (lock, timestamp, value)
+        self._entries = {}
+
+    def set_ttl(self, ttl):
+        self._ttl = ttl
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    # Cached result of probe(*args), key identifies the probe and its arguments
+    def get(self, key, probe, *args, ttl=None):
+        ttl = self._ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [threading.Lock(), None, None]
+        if entry[1] is not None and time.monotonic() - entry[1] <= ttl:
+            return entry[2]
+        with entry[0]:
+            # Another thread might have taken the snapshot while we were waiting
+            if entry[1] is not None and time.monotonic() - entry[1] <= ttl:
+                return entry[2]
+            value = probe(*args)
+            entry[2] = value
+            entry[1] = time.monotonic()
+            return value
+
+
+_shared_cache = ProbeCache()
+
+def get_probe_cache():
+    return _shared_cache
+
+
+# Cached psutil probes
+
+def net_connections(kind="inet"):
+    return _shared_cache.get(("net_connections", kind), psutil.net_connections, kind)
+
+def net_if_addrs():
+    return _shared_cache.get("net_if_addrs", psutil.net_if_addrs)
+
+def net_io_counters():
+    return _shared_cache.get("net_io_counters", psutil.net_io_counters, True)
+
+def sensors_temperatures():
+    return _shared_cache.get("sensors_temperatures", psutil.sensors_temperatures)
+
+def virtual_memory():
+    return _shared_cache.get("virtual_memory", psutil.virtual_memory)
+
+def disk_usage(path):
+    return _shared_cache.get(("disk_usage", path), psutil.disk_usage, path)
+
+def cpu_freq():
+    return _shared_cache.get("cpu_freq", psutil.cpu_freq)
+
+def cpu_percent(interval=0.1):
+    return _shared_cache.get(("cpu_percent", interval), psutil.cpu_percent, interval)
@@ -0,0 +1,96 @@
+import os
+import threading
+
+# Single-pass procfs reader for self-diagnostics
+# /proc/stat, /proc/meminfo and /proc/net/dev are kept open and re-read with pread on every sample,
+# CPU load (total and per core) is computed from deltas against the previous sample, so no sleeping is needed
+# First sample is taken on creation, so the first poll gets load since provider start
+#
+# sample() returns dict:
+# cpu - total load, % (None if there is no previous sample or no time has passed)
+# cores - list of per-core loads, %
+# memory - dict of /proc/meminfo values in kB (e.g. "MemTotal", "MemAvailable")
+# net - dict of interface -> (bytes received, bytes sent, receive errors, transmit errors)
+
+
+class ProcfsSampler:
+
+    CHUNK = 4096
+
+    def __init__(self, root="/proc"):
+        self._lock = threading.Lock()
+        self._fds = {}
+        try:
+            for key, path in (("stat", "stat"), ("meminfo", "meminfo"), ("net_dev", "net/dev")):
+                self._fds[key] = os.open(os.path.join(root, path), os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self.close()
+            raise
+        # key of the first cpu line is "cpu", per-core ones are "cpu0", "cpu1" and so on
+        self._cpu_times = {}
+        self.sample()
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+    # stop - stop reading once this marker is seen (e.g. the rest of /proc/stat is not needed)
+    def _read(self, key, stop=None):
+        fd = self._fds[key]
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, self.CHUNK, offset)
+            chunks.append(chunk)
+            offset += len(chunk)
+            if len(chunk) < self.CHUNK or (stop is not None and stop in chunk):
+                break
+        return b"".join(chunks)
+
+    def _cpu_loads(self, data):
+        loads = {}
+        for line in data.split(b"\n"):
+            if not line.startswith(b"cpu"):
+                break
+            fields = line.split()
+            # user, nice, system, idle, iowait, irq, softirq, steal (guest time is included in user)
+            times = [int(v) for v in fields[1:9]]
+            total = sum(times)
+            idle = times[3] + times[4]
+            name = fields[0].decode()
+            previous = self._cpu_times.get(name)
+            self._cpu_times[name] = (total, idle)
+            if previous is None or total <= previous[0]:
+                loads[name] = None
+                continue
+            elapsed = total - previous[0]
+            loads[name] = 100.0 * (elapsed - (idle - previous[1])) / elapsed
+        return loads
+
+    def _memory(self, data):
+        memory = {}
+        for line in data.split(b"\n"):
+            name, _, value = line.partition(b":")
+            if value:
+                memory[name.decode()] = int(value.split()[0])
+        return memory
+
+    def _net(self, data):
+        net = {}
+        # Two header lines
+        for line in data.split(b"\n")[2:]:
+            name, _, value = line.partition(b":")
+            if not value:
+                continue
+            fields = value.split()
+            net[name.strip().decode()] = (int(fields[0]), int(fields[8]), int(fields[2]), int(fields[10]))
+        return net
+
+    def sample(self):
+        with self._lock:
+            loads = self._cpu_loads(self._read("stat", stop=b"\nintr"))
+            memory = self._memory(self._read("meminfo"))
+            net = self._net(self._read("net_dev"))
+        cores = [loads[k] for k in sorted((k for k in loads if k != "cpu"), key=lambda k: int(k[3:]))]
+        return {"cpu": loads.get("cpu"), "cores": cores, "memory": memory, "net": net}
@@ -1,39 +1,44 @@
-import sched, time, redis
-from pika import BlockingConnection
-import json
+import sched, time
+import asyncio
+import threading
+from .encoders import ENCODERS, JSONEncoder, to_epoch
+from .schema import TagSchema, SCHEMA_UNKNOWN
+from .poll_stats import PollStats
+from .sampling import WindowAggregator
+from log_utils import get_logger, log_message as write_log
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import sys
 
 DEFAULT_EXCHANGE = "MainData"
 
+# Result of _send when message is rejected by full dispatcher queue (see set_dispatcher)
+QUEUE_FULL = "queue_full"
+
 # Data provider
 # Main abstract class for implementing data collection entities
+# Broker clients and optional subsystems (spool, dispatcher, isolation, ring buffer, scheduler events)
+# are imported when they are enabled, so a node loads only what its config uses
 
 class Provider:
 
 
-    def log_message(self, message, level=40):
-        if level > self._loglevel:
-            message_out = "{:%Y-%m-%d %H:%M:%S.%f}: {} [{}]: {}".format(datetime.utcnow(),
-                                                                    self._name,
-                                                                    self.LOG_LEVELS[level][1],
-                                                                    message)
-            print(message_out)
-            self.LOG_LEVELS[level][0](message_out)
+    # message is formatted with args only if it is going to be written, e.g.
+    # self.log_message("Reading: {}", logging.DEBUG, reading)
+    def log_message(self, message, level=40, *args):
+        write_log(self._logger, self._name, self._loglevel, message, level, args)
 
 
-    def _revoke_channel(self):
-        self.log_message("Connecting to RabbitMQ...", logging.DEBUG)
-        try:
-            self._connection = BlockingConnection()
-            self._channel = self._connection.channel()
-        except:
-            self.log_message("Connection failed: {}".format(sys.exc_info()[0]), logging.ERROR)
-        self.log_message("Connection OK", logging.DEBUG)
-
     # broker can be: "amqp", "redis", "direct". If direct, 'pass_to' needs to be specified
     allowed_brokers = ["amqp", "redis", "direct"]
+    # Seconds between attempts of asynchronous poll to take poll lock held by another poll
+    POLL_LOCK_INTERVAL = 0.01
+
+    # Constructor arguments are kept, so that isolated reader can build the same driver in its worker
+    def __new__(cls, *args, **kwargs):
+        provider = super().__new__(cls)
+        provider._init_args = (args, kwargs)
+        return provider
 
     def __init__(self, name, description, scheduler, broker="amqp", publish_routing_key="all.all",
                  command_routing_keys=[], redis_channel="all", pass_to=None, loglevel=logging.DEBUG):
@@ -41,39 +46,58 @@ class Provider:
         self._name = name
         self._description = description
         self._loglevel = loglevel
-        self._logger = logging.getLogger(__name__)
-        self._logger.setLevel(loglevel)
-        self.LOG_LEVELS = {50: (self._logger.critical, "Critical"),
-                           40: (self._logger.error, "Error"),
-                           30: (self._logger.warning, "Warning"),
-                           20: (self._logger.info, "Info"),
-                           10: (self._logger.debug, "Debug")}
-        self.log_message("{} is being initialized".format(self._name), logging.INFO)
+        self._logger = get_logger(__name__, name)
+        self.log_message("{} is being initialized", logging.INFO, self._name)
         self._invalid_config = broker not in self.allowed_brokers
         self._broker = broker
+        self._spool = None
+        self._spool_drainer = None
+        self._dispatcher = None
+        self._ring_buffer = None
+        self._ring_buffer_raw = True
+        self._encoder = JSONEncoder()
+        self._schema = None
+        self._processors = []
+        self._stats = PollStats()
+        self._self_metrics_every = None
+        self._polls_since_metrics = 0
+        self._sampler = None
+        self._job_id = None
+        self._sampling_job_id = None
+        self._isolated_reader = None
+        self._last_reading = []
+        self._commands = None
+        # Held by every poll of the provider (scheduled, on-demand, sampling, as group member),
+        # so hardware and processors are not used by two polls at once
+        # Plain lock: asynchronous poll acquires and releases it in the loop thread (see _poll_current_reading_async)
+        self._poll_lock = threading.Lock()
 
         if broker == "amqp":
             self.log_message("Setting up AMQP", logging.INFO)
             self._pass_to = None
             self._publish_routing_key = publish_routing_key
-            try:
-                self._connection = BlockingConnection()
-                self._channel = self._connection.channel()
-            except:
-                self.log_message("Connection failed: {}".format(sys.exc_info()[0]), logging.ERROR)
+            from .publisher import get_publisher
+            # Connection is shared by all providers of the process and kept open
+            self._publisher = get_publisher()
             if command_routing_keys is not None and len(command_routing_keys) > 0:
-                try:
-                    self.log_message("Subscribing to queue", logging.INFO)
-                    self._channel.queue_declare(queue="{}.provideq".format(self._name), durable=True)
-                    for k in command_routing_keys:
-                        self._channel.queue_bind("{}.provideq".format(self._name), DEFAULT_EXCHANGE, "{}.provide".format(k))
-                except:
-                    self.log_message("Queue declaring failed: {}".format(sys.exc_info()[0]), logging.ERROR)
-            self._connection.close()
-            self.log_message("AMQP connection OK", logging.INFO)
+                from .commands import CommandConsumer
+                self.log_message("Subscribing to queue", logging.INFO)
+                self._commands = CommandConsumer(self, self._publisher.reply)
+                self._publisher.declare_queue("{}.provideq".format(self._name),
+                                              ["{}.provide".format(k) for k in command_routing_keys],
+                                              self._commands.handle)
+            self.log_message("AMQP publisher OK", logging.INFO)
         elif broker == "redis":
             self.log_message("Setting up Redis", logging.INFO)
+            import redis
             self._redis = redis.StrictRedis()
+            self._redis_async = None
+            # Asynchronous client is optional (redis-py 4.2+), otherwise publishing is run in executor
+            try:
+                import redis.asyncio as async_redis
+                self._async_redis_module = async_redis
+            except ImportError:
+                self._async_redis_module = None
             self._redis_channel = redis_channel
         elif broker == "direct":
             self.log_message("Direct passing mode enabled", logging.WARNING)
@@ -88,13 +112,13 @@ class Provider:
     def _start_message(self):
         message = {}
         message["name"] = self._name
-        message["start_time"] = datetime.utcnow().isoformat()
+        message["start_time"] = datetime.utcnow()
         message["reading"] = []
         return message
 
     # Add measurement finish time to message
     def _finalize_message(self, message):
-        message["end_time"] = datetime.utcnow().isoformat()
+        message["end_time"] = datetime.utcnow()
         return message
 
     # Current reading should be a dictionary:
@@ -110,31 +134,416 @@ class Provider:
     def get_current_reading(self, src_id=None):
         raise NotImplementedError
 
-    def _send_amqp(self, message):
-        self.log_message("Revoking channel", logging.DEBUG)
-        self._revoke_channel()
-        self._channel.publish(DEFAULT_EXCHANGE, self._publish_routing_key, message)
-        self._connection.close()
+    def _send_amqp(self, message, content_type):
+        if not self._publisher.publish(self._publish_routing_key, message, content_type):
+            self.log_message("AMQP publisher is not ready, message is not sent", logging.ERROR)
+            return False
+        return True
     
-    def _send_redis(self, message):
-        self._redis.publish(self._redis_channel, message)
+    # Redis messages have no properties, content type is detected by receiver
+    def _send_redis(self, message, content_type):
+        try:
+            self._redis.publish(self._redis_channel, message)
+        except:
+            self.log_message("Redis publishing failed: {}", logging.ERROR, sys.exc_info()[0])
+            return False
+        return True
 
-    def _send_direct(self, message):
+    def _send_direct(self, message, content_type):
         self.log_message("Sending in simple way", logging.DEBUG)
+        result = True
         for collector in self._pass_to:
-            collector.upload_data(message)
+            try:
+                # Unknown schema is a failure: schema is announced and message is spooled with tags
+                uploaded = collector.upload_data(message, content_type)
+                result = uploaded is not SCHEMA_UNKNOWN and bool(uploaded) and result
+            except:
+                self.log_message("Collector {} failed: {}", logging.ERROR, collector.get_name(), sys.exc_info()[0])
+                result = False
+        return result
+
+    # Returns True if message was accepted by broker (or by every collector in direct mode)
+    # None if message is queued by dispatcher (see set_dispatcher), result is reported to _after_send later,
+    # QUEUE_FULL if dispatcher queue has no room for it
+    # original - message before encoding, needed by dispatcher only
+    def _send(self, message, content_type, original=None):
+        if self._broker == "amqp":
+            return self._send_amqp(message, content_type)
+        elif self._broker == "redis":
+            return self._send_redis(message, content_type)
+        elif self._broker == "direct" and self._pass_to is not None:
+            if self._dispatcher is not None and original is not None:
+                return None if self._dispatcher.submit((original, message, content_type)) else QUEUE_FULL
+            return self._send_direct(message, content_type)
+        return False
+
+    # Send direct-mode messages from bounded queue in dispatcher threads, so slow collectors do not delay polls
+    # max_size - queue length
+    # workers - number of dispatcher threads; if more than one, messages may arrive out of order,
+    #           and with schema interning a message may reach collector before the announce of its schema
+    #           (it is then rejected as unknown schema and spooled with tags)
+    # overflow - policy for full queue: "drop_oldest", "block" or "spool"
+    # block_timeout - longest wait of poll for room in queue with "block" policy, None - wait as long as needed
+    # Message rejected by full queue ("spool", or "block" timed out) is spooled if spool is set, otherwise lost;
+    # it is counted as queue_overflows, not as publish failure. Dropped ones are counted as queue_drops
+    def set_dispatcher(self, max_size=100, workers=1, overflow="drop_oldest", block_timeout=None):
+        if self._broker != "direct":
+            self.log_message("Dispatcher is used with direct broker only", logging.WARNING)
+            return
+        self.log_message("Dispatching via queue of {} message(s), {} thread(s), overflow policy is {}",
+                         logging.INFO, max_size, workers, overflow)
+        from .dispatcher import DirectDispatcher
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+        self._dispatcher = DirectDispatcher(self._deliver_queued, self._report_queued, max_size, workers, overflow,
+                                            block_timeout, name="{}-dispatcher".format(self._name),
+                                            drop=self._drop_queued)
+
+    def _deliver_queued(self, item):
+        message, data, content_type = item
+        return self._send_direct(data, content_type)
+
+    def _report_queued(self, item, sent):
+        message, data, content_type = item
+        self._after_send(message, data, content_type, sent)
+
+    def _drop_queued(self, item):
+        self._stats.add_count("queue_drops")
+        self.log_message("Dispatcher queue is full, oldest message is dropped", logging.WARNING)
+
+    # Spool records keep content type in front of message: b"<content type>\n<message>"
+    def _spool_message(self, message, content_type):
+        self._spool.append(content_type.encode("utf-8") + b"\n" + message)
+
+    def _send_spooled(self, record):
+        content_type, _, message = record.partition(b"\n")
+        # Drainer runs in its own thread, so replayed messages bypass dispatcher queue
+        return self._send(message, content_type.decode("utf-8"))
+
+    # Set message encoder: name from encoders.ENCODERS ("json", "msgpack") or encoder instance
+    def set_encoder(self, encoder):
+        if isinstance(encoder, str):
+            encoder = ENCODERS[encoder]()
+        self.log_message("Using {} encoding", logging.INFO, encoder.content_type)
+        self._encoder = encoder
+
+    # Keep messages on disk while broker is unavailable and replay them afterwards
+    # path - spool directory (one per provider)
+    # max_bytes - spool size limit, oldest messages are dropped when it is exceeded
+    # fsync - Spool.FSYNC_ALWAYS, Spool.FSYNC_INTERVAL or Spool.FSYNC_NEVER ("always", "interval", "never")
+    # drain_rate - maximum number of replayed messages per second
+    # retry_delay - interval in seconds between attempts to replay backlog
+    def set_spool(self, path, max_bytes=64 * 1048576, fsync="interval", drain_rate=50, retry_delay=10):
+        from .spool import Spool, SpoolDrainer
+        self.log_message("Setting up spool at {}", logging.INFO, path)
+        self._spool = Spool(path, max_bytes=max_bytes, fsync=fsync)
+        self._spool_drainer = SpoolDrainer(self._spool, self._send_spooled, drain_rate, retry_delay)
+        self._spool_drainer.start()
+
+    # Keep polled values in on-device ring buffer (shared by providers using the same file),
+    # so that they can be queried locally without the server (see ring_buffer)
+    # path - buffer file, memory-mapped and re-attached after restart
+    # capacity - number of kept values of all tags, max_tags - size of tag table
+    # socket_path - Unix socket of query API
+    # raw - keep readings as taken, before processors (e.g. EdgeFilter drops unchanged values),
+    #       otherwise keep readings of sent messages
+    def set_ring_buffer(self, path, capacity=65536, max_tags=1024, socket_path=None, raw=True):
+        from .ring_buffer import get_ring_buffer
+        self.log_message("Keeping {} values in ring buffer {}", logging.INFO, "raw" if raw else "processed", path)
+        self._ring_buffer = get_ring_buffer(path, capacity, max_tags, socket_path)
+        self._ring_buffer_raw = raw
+
+    # Send tag metadata only in schema announcements, regular messages carry slots and values
+    # announce_every - number of messages after which schema is announced again
+    def set_schema_interning(self, announce_every=30):
+        self.log_message("Enabling schema-interned messages", logging.INFO)
+        self._schema = TagSchema(announce_every)
+
+    # Make next message announce the schema (e.g. receiver asked for it)
+    def request_announce(self):
+        if self._schema is not None:
+            self._schema.request_announce()
+
+    # Add processing stage (see data_processors), stages run in order of adding
+    def add_processor(self, processor):
+        self._processors.append(processor)
+
+    def _process_reading(self, reading):
+        for p in self._processors:
+            reading = p.process(self._name, reading)
+        return reading
+
+    # Turn readings into message ready for encoding, None if there is nothing to send
+    def _build_message(self, message, reading):
+        if self._ring_buffer is not None and self._ring_buffer_raw:
+            self._ring_buffer.add_readings(self._name, to_epoch(datetime.utcnow()), reading)
+        message["reading"].extend(self._process_reading(reading))
+        if self._self_metrics_every is not None:
+            self._polls_since_metrics += 1
+            if self._polls_since_metrics >= self._self_metrics_every:
+                self._polls_since_metrics = 0
+                message["reading"].extend(self._stats.take_window_reading())
+        if len(message["reading"]) == 0:
+            self.log_message("Nothing to send", logging.DEBUG)
+            return None
+        message = self._finalize_message(message)
+        if self._ring_buffer is not None and not self._ring_buffer_raw:
+            self._ring_buffer.add_message(message)
+        if self._schema is not None:
+            message = self._schema.intern(message)
+        return message
+
+    def _after_send(self, message, data, content_type, sent):
+        if sent is None:
+            # Queued by dispatcher, called again with result
+            return
+        if sent is QUEUE_FULL:
+            # Collectors are slow, not failed: schema and failure stats are left alone
+            self._stats.add_count("queue_overflows")
+            if self._spool is not None:
+                self.log_message("Dispatcher queue is full, message is spooled", logging.WARNING)
+                if self._add_tags(message):
+                    data = self._encoder.encode(message)
+                self._spool_message(data, content_type)
+            else:
+                self.log_message("Dispatcher queue is full, message is lost", logging.WARNING)
+        elif sent:
+            if self._spool_drainer is not None:
+                self._spool_drainer.notify()
+        else:
+            self._stats.add_count("publish_failures")
+            # Receiver might have lost the schema while we were away
+            self.request_announce()
+            if self._spool is not None:
+                self.log_message("Sending failed, message is spooled", logging.WARNING)
+                if self._add_tags(message):
+                    data = self._encoder.encode(message)
+                self._spool_message(data, content_type)
+
+    # Make interned message self-describing (e.g. before it is spooled), returns True if tags were added
+    def _add_tags(self, message):
+        if self._schema is None or "tags" in message:
+            return False
+        self._schema.add_tags(message)
+        return True
 
-    def _poll_current_reading(self):
+    def _start_poll(self):
         self.log_message("Time to get data and send it", logging.DEBUG)
-        current_rdg = self._start_message()
-        current_rdg["reading"].extend(self.get_current_reading())
-        current_data = json.dumps(self._finalize_message(current_rdg))
+        self._stats.add_count("polls")
+        return time.perf_counter()
+
+    def _read_current(self):
+        if self._isolated_reader is not None:
+            return self._read_isolated()
+        try:
+            return self.get_current_reading()
+        except:
+            self._stats.add_count("read_failures")
+            raise
+
+    # Run get_current_reading in a supervised worker process, which is killed after `timeout` seconds
+    # Blocking drivers then cannot hold scheduler threads
+    def set_isolation(self, timeout=10):
+        from .isolation import IsolatedReader
+        self.log_message("Readings will be taken in a separate process, timeout is {} s", logging.INFO, timeout)
+        self._isolated_reader = IsolatedReader(self, timeout)
+
+    # Same tags as in the last good reading, with given error
+    def _error_reading(self, error):
+        if len(self._last_reading) == 0:
+            return [{"name": "Poll", "measured_parameter": "status", "type": "Text", "error": error}]
+        reading = []
+        for r in self._last_reading:
+            tag = {k: v for k, v in r.items() if k not in ("reading", "error")}
+            tag["error"] = error
+            reading.append(tag)
+        return reading
+
+    def _read_isolated(self):
+        from .isolation import PollTimeout
+        try:
+            reading = self._isolated_reader.read()
+        except PollTimeout:
+            self.log_message("Reading timed out, reader process is restarted", logging.ERROR)
+            self._stats.add_count("timeouts")
+            return self._error_reading("Timeout")
+        except:
+            self.log_message("Reading failed: {}", logging.ERROR, sys.exc_info()[1])
+            self._stats.add_count("read_failures")
+            return self._error_reading("Reading error")
+        self._last_reading = reading
+        return reading
+
+    # High-rate sampling: readings are taken every `interval` seconds and aggregated,
+    # scheduled poll publishes window aggregates (see sampling.WindowAggregator)
+    # fields - aggregates to publish: "min", "max", "mean", "count"
+    # as_tags - publish aggregates as separate tags or as "aggregate" field of readings
+    def set_sampling(self, interval, fields=WindowAggregator.FIELDS, as_tags=True):
+        self.log_message("Setting up sampling every {} s", logging.INFO, interval)
+        self._sampler = WindowAggregator(fields, as_tags)
+        self._sampling_job_id = self._sched.add_job(self._sample_current_reading, "interval", seconds=interval).id
+        self._sched.pause_job(job_id=self._sampling_job_id)
+
+    def _sample_current_reading(self):
+        with self._poll_lock:
+            self._sampler.add(self._read_current())
+
+    # Reading for scheduled poll: window aggregates if sampling is on, otherwise current reading
+    def _get_poll_reading(self):
+        if self._sampler is not None and not self._sampler.is_empty():
+            return self._sampler.take()
+        return self._read_current()
+
+    # Take reading and build message of it (see _build_message), None if there is nothing to send
+    # fresh - read hardware even if sampling window is available
+    # Caller holds poll lock
+    def _read_message(self, fresh=False):
+        started = self._start_poll()
+        reading = self._read_current() if fresh else self._get_poll_reading()
+        message = self._build_message(self._start_message(), reading)
+        self._stats.add_time("read", time.perf_counter() - started)
+        return message
+
+    # Returns sent message, None if there was nothing to send
+    # Whole poll holds poll lock, so messages of concurrent polls are also sent in order of reading
+    def _poll_current_reading(self, fresh=False):
+        with self._poll_lock:
+            return self._poll_locked(fresh)
+
+    def _poll_locked(self, fresh):
+        current_rdg = self._read_message(fresh)
+        read_done = time.perf_counter()
+        if current_rdg is None:
+            return None
+        current_data = self._encoder.encode(current_rdg)
+        content_type = self._encoder.content_type
+        encode_done = time.perf_counter()
+        sent = self._send(current_data, content_type, current_rdg)
+        self._stats.add_time("encode", encode_done - read_done)
+        self._stats.add_time("publish", time.perf_counter() - encode_done)
+        self._after_send(current_rdg, current_data, content_type, sent)
+        return current_rdg
+
+    # On-demand poll (see commands.CommandConsumer): message is published as usual and returned encoded,
+    # with tags if schema interning is on, (None, None) if there is nothing to send
+    def poll_now(self):
+        message = self._poll_current_reading(fresh=True)
+        if message is None:
+            return None, None
+        self._add_tags(message)
+        return self._encoder.encode(message), self._encoder.content_type
+
+    # Poll commands arriving within `window` seconds after a poll get its result instead of a new reading
+    def set_coalesce_window(self, window):
+        if self._commands is not None:
+            self._commands.set_window(window)
+
+    # Add self-metrics readings (stage latencies, lateness, failures) to every N-th message
+    def set_self_metrics(self, every=6):
+        self._self_metrics_every = every
+
+    def get_stats(self):
+        stats = self._stats.to_dict()
         if self._broker == "amqp":
-            self._send_amqp(current_data)
+            stats["publisher"] = self._publisher.get_stats()
+        if self._dispatcher is not None:
+            stats["dispatcher"] = self._dispatcher.get_stats()
+        return stats
+
+    # Scheduler events: lateness is start of poll against its scheduled fire time
+    # Start time comes with the event as return value of the job run (see _scheduled_poll)
+    def _on_job_event(self, event):
+        from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+        if event.job_id != self._job_id:
+            return
+        if event.code == EVENT_JOB_MISSED:
+            self._stats.add_count("missed")
+        elif event.code == EVENT_JOB_EXECUTED and isinstance(event.retval, datetime):
+            lateness = (event.retval - event.scheduled_run_time).total_seconds()
+            self._stats.add_time("lateness", max(lateness, 0))
+
+    # Asynchronous counterparts, used when provider runs on AsyncRuntime
+    # Blocking drivers are run in executor, providers may override get_current_reading_async
+
+    async def get_current_reading_async(self, src_id=None):
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_current_reading, src_id)
+
+    async def _send_redis_async(self, message, content_type):
+        if self._async_redis_module is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self._send_redis, message, content_type)
+        try:
+            if self._redis_async is None:
+                self._redis_async = self._async_redis_module.StrictRedis()
+            await self._redis_async.publish(self._redis_channel, message)
+        except:
+            self.log_message("Redis publishing failed: {}", logging.ERROR, sys.exc_info()[0])
+            return False
+        return True
+
+    async def _send_async(self, message, content_type, original=None):
+        if self._broker == "amqp":
+            # Shared publisher only queues the message, it does not block
+            return self._send_amqp(message, content_type)
         elif self._broker == "redis":
-            self._send_redis(current_data)
+            return await self._send_redis_async(message, content_type)
         elif self._broker == "direct" and self._pass_to is not None:
-            self._send_direct(current_data)
+            if self._dispatcher is not None and original is not None:
+                # Only "block" policy may wait
+                return await asyncio.get_running_loop().run_in_executor(None, self._send, message, content_type, original)
+            return await asyncio.get_running_loop().run_in_executor(None, self._send_direct, message, content_type)
+        return False
+
+    # Poll lock is also taken by polls in threads (sampling, commands, group), so it is not awaited in executor
+    # (cancelled wait would leave the lock acquired by nobody), it is tried every POLL_LOCK_INTERVAL seconds instead
+    async def _poll_current_reading_async(self):
+        while not self._poll_lock.acquire(blocking=False):
+            await asyncio.sleep(self.POLL_LOCK_INTERVAL)
+        try:
+            await self._poll_locked_async()
+        finally:
+            self._poll_lock.release()
+
+    async def _poll_locked_async(self):
+        started = self._start_poll()
+        current_rdg = self._start_message()
+        if self._sampler is not None and not self._sampler.is_empty():
+            reading = self._sampler.take()
+        elif self._isolated_reader is not None:
+            reading = await asyncio.get_running_loop().run_in_executor(None, self._read_isolated)
+        else:
+            try:
+                reading = await self.get_current_reading_async()
+            except:
+                self._stats.add_count("read_failures")
+                raise
+        current_rdg = self._build_message(current_rdg, reading)
+        read_done = time.perf_counter()
+        self._stats.add_time("read", read_done - started)
+        if current_rdg is None:
+            return
+        current_data = self._encoder.encode(current_rdg)
+        content_type = self._encoder.content_type
+        encode_done = time.perf_counter()
+        sent = await self._send_async(current_data, content_type, current_rdg)
+        self._stats.add_time("encode", encode_done - read_done)
+        self._stats.add_time("publish", time.perf_counter() - encode_done)
+        self._after_send(current_rdg, current_data, content_type, sent)
+
+    # Scheduled job runs return their start time, so lateness is not mixed up with on-demand polls
+    def _scheduled_poll(self):
+        started = datetime.now(timezone.utc)
+        self._poll_current_reading()
+        return started
+
+    async def _scheduled_poll_async(self):
+        started = datetime.now(timezone.utc)
+        await self._poll_current_reading_async()
+        return started
+
+    def _get_poll_job(self):
+        if getattr(self._sched, "is_async", False):
+            return self._scheduled_poll_async
+        return self._scheduled_poll
 
     # Activate and deactivate scheduled data retrieval
     # time_settings is a dict with following fields:
@@ -144,10 +553,12 @@ class Provider:
     # if both delay and cron are passed, the delay will be used
     # collectors is a list of data collectors
     def set_polling(self, time_settings):
+        from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
         self.log_message("Setting up schedule", logging.INFO)
+        self._sched.add_listener(self._on_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
         if "delay" in time_settings:
             self.log_message("Declaring job as delayed", logging.DEBUG)
-            self._job_id = self._sched.add_job(self._poll_current_reading, "interval", seconds=time_settings["delay"]).id
+            self._job_id = self._sched.add_job(self._get_poll_job(), "interval", seconds=time_settings["delay"]).id
             self._sched.pause_job(job_id=self._job_id)
 
         elif "cron" in time_settings:
@@ -155,7 +566,7 @@ class Provider:
                 if p not in time_settings["cron"]:
                     time_settings["cron"][p] = None
             self.log_message("Declaring job as cron-set", logging.DEBUG)
-            self._job_id = self._sched.add_job(self._poll_current_reading, "cron",
+            self._job_id = self._sched.add_job(self._get_poll_job(), "cron",
             year=time_settings["cron"]["year"], month=time_settings["cron"]["month"],
             day=time_settings["cron"]["day"], week=time_settings["cron"]["week"],
             day_of_week=time_settings["cron"]["day_of_week"], hour=time_settings["cron"]["hour"],
@@ -165,12 +576,18 @@ class Provider:
             return False
         return True
 
+    # Polling job is missing for providers which are not scheduled themselves (group members),
+    # their sampling job is still resumed and paused
     def activate_polling(self):
         self.log_message("Resuming job", logging.INFO)
-        self._sched.resume_job(job_id=self._job_id)
+        for job_id in (self._job_id, self._sampling_job_id):
+            if job_id is not None:
+                self._sched.resume_job(job_id=job_id)
     def deactivate_polling(self):
         self.log_message("Pausing job", logging.INFO)
-        self._sched.pause_job(job_id=self._job_id)
+        for job_id in (self._job_id, self._sampling_job_id):
+            if job_id is not None:
+                self._sched.pause_job(job_id=job_id)
 
     def set_parameter(self, parameter_name, parameter_value):
         raise NotImplementedError
@@ -0,0 +1,268 @@
+import pika
+import threading
+import logging
+import sys
+from collections import deque, OrderedDict
+
+DEFAULT_EXCHANGE = "MainData"
+
+# Shared AMQP publisher
+# One long-lived connection per process, reused by every Provider with broker="amqp"
+# Connection lives in its own IO thread (like Collector) and reconnects with exponential backoff
+# publish() is thread-safe: messages are queued and handed over to the IO thread
+#
+# With confirm_window set, channel works in publisher confirms mode:
+# no more than confirm_window messages are left unconfirmed at once,
+# broker acks (including multiple ones) release the window, nacked messages are re-published
+#
+# Queues declared with consumer callback are consumed on the same connection,
+# callback(body, properties) is called in the IO thread, so it should not block
+
+
+class PublisherThread(threading.Thread):
+    def __init__(self, publisher):
+        threading.Thread.__init__(self, daemon=True)
+        self.publisher = publisher
+    def run(self):
+        self.publisher._run()
+
+
+class AMQPPublisher:
+
+    RECONNECT_DELAY_MIN = 1
+    RECONNECT_DELAY_MAX = 60
+    # Messages accepted while channel is open but not yet handed over to the broker
+    MAX_PENDING = 1000
+
+    def __init__(self, parameters=None, exchange=DEFAULT_EXCHANGE, confirm_window=None):
+        self._parameters = parameters
+        self._exchange = exchange
+        self._confirm_window = confirm_window
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._connection = None
+        self._channel = None
+        self._pending = deque()
+        # delivery tag -> (exchange, routing key, message, properties), only used in confirms mode
+        self._unconfirmed = OrderedDict()
+        self._delivery_tag = 0
+        self._stats = {"published": 0, "confirmed": 0, "nacked": 0}
+        self._queues = {}
+        self._consumers = {}
+        self._thread = PublisherThread(self)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(connection.close)
+            except:
+                self._logger.error("Could not close AMQP connection: {}".format(sys.exc_info()[0]))
+
+    def is_connected(self):
+        with self._lock:
+            return self._channel is not None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["unconfirmed"] = len(self._unconfirmed)
+        return stats
+
+    # Queue is (re)declared and bound on every successful connection
+    # consumer - callback(body, properties) for messages of the queue (no acknowledgements)
+    def declare_queue(self, queue, routing_keys, consumer=None):
+        with self._lock:
+            self._queues[queue] = list(routing_keys)
+            if consumer is not None:
+                self._consumers[queue] = consumer
+            connection = self._connection
+            channel = self._channel
+        if channel is not None:
+            connection.ioloop.add_callback_threadsafe(lambda: self._declare_queue(channel, queue))
+
+    # Returns False if message could not be accepted (no connection or pending queue is full)
+    def publish(self, routing_key, message, content_type=None):
+        properties = pika.BasicProperties(content_type=content_type) if content_type is not None else None
+        return self._enqueue(self._exchange, routing_key, message, properties)
+
+    # Reply to RPC-style request: default exchange, reply_to queue, same correlation id
+    def reply(self, reply_to, correlation_id, message, content_type=None):
+        properties = pika.BasicProperties(content_type=content_type, correlation_id=correlation_id)
+        return self._enqueue("", reply_to, message, properties)
+
+    def _enqueue(self, exchange, routing_key, message, properties):
+        with self._lock:
+            if self._channel is None or len(self._pending) >= self.MAX_PENDING:
+                return False
+            self._pending.append((exchange, routing_key, message, properties))
+            connection = self._connection
+        try:
+            connection.ioloop.add_callback_threadsafe(self._flush)
+        except:
+            # Message stays pending and will be flushed after reconnection
+            self._logger.warning("Could not schedule publishing: {}".format(sys.exc_info()[0]))
+        return True
+
+    # Everything below runs in the IO thread
+
+    def _window_is_full(self):
+        return self._confirm_window is not None and len(self._unconfirmed) >= self._confirm_window
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                if self._channel is None or len(self._pending) == 0 or self._window_is_full():
+                    return
+                channel = self._channel
+                item = self._pending.popleft()
+            try:
+                channel.basic_publish(*item)
+            except:
+                self._logger.error("Publishing failed: {}".format(sys.exc_info()[0]))
+                with self._lock:
+                    self._pending.appendleft(item)
+                return
+            with self._lock:
+                self._stats["published"] += 1
+                if self._confirm_window is not None:
+                    self._delivery_tag += 1
+                    self._unconfirmed[self._delivery_tag] = item
+
+    # Confirmations may cover several messages at once (multiple=True)
+    def _on_delivery_confirmation(self, method_frame):
+        method = method_frame.method
+        acked = method.NAME == "Basic.Ack"
+        with self._lock:
+            if method.multiple:
+                tags = [t for t in self._unconfirmed if t <= method.delivery_tag]
+            else:
+                tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+            resend = []
+            for t in tags:
+                item = self._unconfirmed.pop(t)
+                if not acked:
+                    resend.append(item)
+            if acked:
+                self._stats["confirmed"] += len(tags)
+            else:
+                self._stats["nacked"] += len(tags)
+                # Nacked ones go first to keep publishing order
+                self._pending.extendleft(reversed(resend))
+        if not acked:
+            self._logger.warning("Broker rejected {} message(s), re-publishing".format(len(tags)))
+        self._flush()
+
+    # Delivery tags start over on a new channel, unconfirmed messages are published once again
+    def _requeue_unconfirmed(self):
+        with self._lock:
+            self._pending.extendleft(reversed(list(self._unconfirmed.values())))
+            self._unconfirmed.clear()
+            self._delivery_tag = 0
+
+    def _declare_queue(self, channel, queue):
+        with self._lock:
+            routing_keys = list(self._queues.get(queue, []))
+            consumer = self._consumers.get(queue)
+        def on_declared(frame):
+            for k in routing_keys:
+                channel.queue_bind(queue=queue, exchange=self._exchange, routing_key=k,
+                                   callback=lambda frame: None)
+            if consumer is not None:
+                channel.basic_consume(lambda ch, method, properties, body: consumer(body, properties),
+                                      queue=queue, no_ack=True)
+        channel.queue_declare(queue=queue, durable=True, callback=on_declared)
+
+    def _on_channel_open(self, channel):
+        self._logger.info("AMQP channel OK")
+        channel.add_on_close_callback(self._on_channel_closed)
+        self._requeue_unconfirmed()
+        if self._confirm_window is not None:
+            self._logger.info("Enabling publisher confirms, window is {}".format(self._confirm_window))
+            channel.confirm_delivery(self._on_delivery_confirmation)
+        with self._lock:
+            self._channel = channel
+            queues = list(self._queues)
+        self._delay = self.RECONNECT_DELAY_MIN
+        for q in queues:
+            self._declare_queue(channel, q)
+        self._flush()
+
+    def _on_channel_closed(self, channel, *args):
+        self._logger.warning("AMQP channel closed: {}".format(args))
+        with self._lock:
+            self._channel = None
+            connection = self._connection
+        if connection is not None and connection.is_open:
+            connection.close()
+
+    def _on_connection_open(self, connection):
+        self._logger.debug("AMQP connection OK, opening channel")
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error=""):
+        self._logger.error("AMQP connection error: {}".format(error))
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, *args):
+        self._logger.warning("AMQP connection closed: {}".format(args))
+        with self._lock:
+            self._channel = None
+        connection.ioloop.stop()
+
+    def _run(self):
+        self._delay = self.RECONNECT_DELAY_MIN
+        while not self._stop_event.is_set():
+            self._logger.info("Connecting to AMQP broker")
+            try:
+                connection = pika.SelectConnection(self._parameters,
+                                                   on_open_callback=self._on_connection_open,
+                                                   on_open_error_callback=self._on_connection_error,
+                                                   on_close_callback=self._on_connection_closed)
+                with self._lock:
+                    self._connection = connection
+                connection.ioloop.start()
+            except:
+                self._logger.error("AMQP IO loop failed: {}".format(sys.exc_info()[0]))
+            with self._lock:
+                self._connection = None
+                self._channel = None
+            if self._stop_event.is_set():
+                break
+            self._logger.info("Reconnecting to AMQP broker in {} s".format(self._delay))
+            self._stop_event.wait(self._delay)
+            self._delay = min(self._delay * 2, self.RECONNECT_DELAY_MAX)
+
+
+_shared_publisher = None
+_shared_lock = threading.Lock()
+
+# Set up process-wide publisher
+# Should be called before creating providers, otherwise defaults are used
+# confirm_window - maximum number of unconfirmed messages (None disables confirms)
+# Raises ValueError if publisher is already running with other settings
+def init_publisher(parameters=None, confirm_window=None):
+    global _shared_publisher
+    with _shared_lock:
+        if _shared_publisher is None:
+            _shared_publisher = AMQPPublisher(parameters, confirm_window=confirm_window)
+            _shared_publisher.start()
+        elif (_shared_publisher._parameters, _shared_publisher._confirm_window) != (parameters, confirm_window):
+            raise ValueError("AMQP publisher is already running with confirm window {}, "
+                             "init_publisher should be called before creating providers".format(
+                                 _shared_publisher._confirm_window))
+        return _shared_publisher
+
+# Get process-wide publisher, starting it with default settings on first use
+def get_publisher():
+    with _shared_lock:
+        if _shared_publisher is not None:
+            return _shared_publisher
+    return init_publisher()
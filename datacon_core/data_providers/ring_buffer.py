@@ -0,0 +1,264 @@
+import os
+import mmap
+import math
+import json
+import struct
+import threading
+import socketserver
+import logging
+import sys
+from .encoders import to_epoch
+
+# On-device ring buffer of recent values
+# Fixed-size memory-mapped file, so memory is bounded and buffer is re-attached instantly after restart:
+#
+# header - magic, version, capacity, tag table size, number of tags, next sequence number
+# tag table - tag key ("<provider>.<name>.<measured_parameter>") and sequence number of its latest record
+# records - ring of `capacity` records, record with sequence number N is in slot N % capacity
+#
+# Records of a tag are chained by prev_seq (per-tag index), so latest value and ranges are read
+# without scanning the ring. Record is valid while its slot keeps its sequence number and tag,
+# older ones are overwritten silently
+# Numeric and Discrete readings are kept (as float), readings with error are kept as NaN with FLAG_ERROR
+#
+# Queries are answered via Unix socket (see RingQueryServer), one JSON object per line:
+# {"query": "tags"}
+# {"query": "latest", "tag": "DS1.Outside.temperature"} ("tag" omitted - latest values of all tags)
+# {"query": "range", "tag": "DS1.Outside.temperature", "start": 1700000000, "end": 1700003600, "limit": 100}
+# {"query": "stats"}
+# Times are UTC epoch seconds
+
+
+class RingBuffer:
+
+    MAGIC = b"DCRING01"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIIIIQ32x")
+    TAG = struct.Struct("<120sQ")
+    # seq, prev_seq, timestamp, value, tag index, flags
+    RECORD = struct.Struct("<QQddHB5x")
+    FLAG_ERROR = 0x01
+    KEY_BYTES = 120
+
+    def __init__(self, path, capacity=65536, max_tags=1024):
+        self._path = path
+        self._capacity = capacity
+        self._max_tags = max_tags
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+        self._tags_offset = self.HEADER.size
+        self._records_offset = self._tags_offset + max_tags * self.TAG.size
+        size = self._records_offset + capacity * self.RECORD.size
+        self._tag_index = {}
+        self._tag_full_reported = False
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            attach = os.fstat(fd).st_size == size
+            if not attach:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if attach and self._attach():
+            self._logger.info("Ring buffer {} attached, {} tag(s)".format(path, len(self._tag_index)))
+        else:
+            self._format()
+
+    def _attach(self):
+        magic, version, capacity, max_tags, tag_count, self._next_seq = self.HEADER.unpack_from(self._map, 0)
+        if (magic, version, capacity, max_tags) != (self.MAGIC, self.VERSION, self._capacity, self._max_tags):
+            return False
+        for i in range(tag_count):
+            key, last_seq = self.TAG.unpack_from(self._map, self._tags_offset + i * self.TAG.size)
+            self._tag_index[key.rstrip(b"\0").decode("utf-8", "ignore")] = i
+        return True
+
+    def _format(self):
+        self._logger.info("Formatting ring buffer {}".format(self._path))
+        self._map[:] = bytes(len(self._map))
+        self._next_seq = 1
+        self._tag_index = {}
+        self._write_header()
+
+    def _write_header(self):
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.VERSION, self._capacity, self._max_tags,
+                              len(self._tag_index), self._next_seq)
+
+    def _tag_offset(self, index):
+        return self._tags_offset + index * self.TAG.size
+
+    def _record_offset(self, seq):
+        return self._records_offset + (seq % self._capacity) * self.RECORD.size
+
+    def _last_seq(self, index):
+        return self.TAG.unpack_from(self._map, self._tag_offset(index))[1]
+
+    # Record of given tag with given sequence number, None if it is overwritten
+    def _record(self, seq, index):
+        record = self.RECORD.unpack_from(self._map, self._record_offset(seq))
+        if seq == 0 or record[0] != seq or record[4] != index:
+            return None
+        return record
+
+    # Keys are kept as they are stored in tag table
+    def _key(self, key):
+        return key.encode("utf-8")[:self.KEY_BYTES].decode("utf-8", "ignore")
+
+    def _get_index(self, key):
+        key = self._key(key)
+        index = self._tag_index.get(key)
+        if index is None:
+            if len(self._tag_index) >= self._max_tags:
+                if not self._tag_full_reported:
+                    self._logger.error("Ring buffer tag table is full, new tags are not kept")
+                    self._tag_full_reported = True
+                return None
+            index = len(self._tag_index)
+            self.TAG.pack_into(self._map, self._tag_offset(index), key.encode("utf-8"), 0)
+            self._tag_index[key] = index
+            self._write_header()
+        return index
+
+    # timestamp - UTC epoch seconds, value None means error
+    def append(self, key, timestamp, value, error=False):
+        with self._lock:
+            index = self._get_index(key)
+            if index is None:
+                return False
+            self._append(index, timestamp, value, error)
+        return True
+
+    def _append(self, index, timestamp, value, error):
+        seq = self._next_seq
+        flags = self.FLAG_ERROR if error or value is None else 0
+        self.RECORD.pack_into(self._map, self._record_offset(seq), seq, self._last_seq(index), timestamp,
+                              math.nan if value is None else value, index, flags)
+        # Record first, then index and header: torn write is ignored on re-attach
+        key = self.TAG.unpack_from(self._map, self._tag_offset(index))[0]
+        self.TAG.pack_into(self._map, self._tag_offset(index), key, seq)
+        self._next_seq = seq + 1
+        self._write_header()
+
+    # Keep readings of provider message (before schema interning)
+    def add_message(self, message):
+        self.add_readings(message["name"], to_epoch(message["end_time"]), message["reading"])
+
+    # Keep readings of provider taken at timestamp (UTC epoch seconds)
+    def add_readings(self, provider_name, timestamp, reading):
+        with self._lock:
+            for r in reading:
+                if r.get("type") not in ("Numeric", "Discrete"):
+                    continue
+                value = r.get("reading")
+                error = bool(r.get("error")) or value is None
+                if not error:
+                    try:
+                        value = float(value)
+                    except (TypeError, ValueError):
+                        continue
+                index = self._get_index("{}.{}.{}".format(provider_name, r.get("name"), r.get("measured_parameter")))
+                if index is not None:
+                    self._append(index, timestamp, None if error else value, error)
+
+    def _to_dict(self, record):
+        result = {"seq": record[0], "time": record[2]}
+        if record[5] & self.FLAG_ERROR:
+            result["error"] = True
+        else:
+            result["value"] = record[3]
+        return result
+
+    def tags(self):
+        with self._lock:
+            return list(self._tag_index)
+
+    def latest(self, key):
+        with self._lock:
+            index = self._tag_index.get(self._key(key))
+            if index is None:
+                return None
+            record = self._record(self._last_seq(index), index)
+            return None if record is None else self._to_dict(record)
+
+    # Values of tag within start..end (epoch seconds, None - unbounded), at most `limit` latest ones, oldest first
+    def range(self, key, start=None, end=None, limit=1000):
+        result = []
+        with self._lock:
+            index = self._tag_index.get(self._key(key))
+            if index is None:
+                return result
+            seq = self._last_seq(index)
+            while len(result) < limit:
+                record = self._record(seq, index)
+                if record is None or (start is not None and record[2] < start):
+                    break
+                if end is None or record[2] <= end:
+                    result.append(self._to_dict(record))
+                seq = record[1]
+        result.reverse()
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            return {"path": self._path, "capacity": self._capacity, "records": min(self._next_seq - 1, self._capacity),
+                    "tags": len(self._tag_index), "max_tags": self._max_tags}
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+
+
+class RingQueryHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.answer(json.loads(line))
+            except:
+                response = {"error": "Incorrect request: {}".format(sys.exc_info()[1])}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+# Local query API of ring buffer, see RingBuffer for requests
+class RingQueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, buffer, socket_path):
+        self._buffer = buffer
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, RingQueryHandler)
+        self._thread = threading.Thread(target=self.serve_forever, name="ring-query", daemon=True)
+        self._thread.start()
+
+    def answer(self, request):
+        query = request.get("query")
+        if query == "tags":
+            return {"tags": self._buffer.tags()}
+        if query == "latest":
+            tags = [request["tag"]] if "tag" in request else self._buffer.tags()
+            return {"latest": {t: self._buffer.latest(t) for t in tags}}
+        if query == "range":
+            return {"range": self._buffer.range(request["tag"], request.get("start"), request.get("end"),
+                                                request.get("limit", 1000))}
+        if query == "stats":
+            return self._buffer.get_stats()
+        return {"error": "Unknown query {}".format(query)}
+
+
+_buffers = {}
+_servers = {}
+_buffers_lock = threading.Lock()
+
+# Ring buffer of given file, shared by all providers of the process
+# socket_path - start query server on this Unix socket (once per buffer)
+def get_ring_buffer(path, capacity=65536, max_tags=1024, socket_path=None):
+    with _buffers_lock:
+        if path not in _buffers:
+            _buffers[path] = RingBuffer(path, capacity, max_tags)
+        if socket_path is not None and path not in _servers:
+            _servers[path] = RingQueryServer(_buffers[path], socket_path)
+        return _buffers[path]
@@ -0,0 +1,105 @@
+import threading
+
+# Windowed aggregation of high-rate samples
+# Keeps running min/max/mean/count/last per tag in constant memory,
+# window is taken (and started over) when provider publishes at its regular schedule
+#
+# as_tags=True - aggregates are separate tags: "<parameter>_min", "<parameter>_max" and so on,
+#                main tag keeps the last value
+# as_tags=False - main tag keeps the last value, aggregates go to "aggregate" field of the reading
+
+
+class TagWindow:
+
+    __slots__ = ("reading", "count", "total", "min", "max", "last", "error")
+
+    def __init__(self, reading):
+        self.reading = reading
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.error = None
+
+    def add(self, reading):
+        self.reading = reading
+        if "reading" not in reading or reading.get("error"):
+            self.error = reading.get("error", "No data")
+            return
+        value = reading["reading"]
+        self.last = value
+        self.error = None
+        if reading.get("type") != "Numeric" or not isinstance(value, (int, float)):
+            return
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def get(self, field):
+        if field == "mean":
+            return self.total / self.count if self.count else None
+        return getattr(self, field)
+
+
+class WindowAggregator:
+
+    FIELDS = ("min", "max", "mean", "count", "last")
+
+    def __init__(self, fields=FIELDS, as_tags=True):
+        self._fields = [f for f in fields if f != "last"]
+        self._as_tags = as_tags
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def is_empty(self):
+        with self._lock:
+            return len(self._windows) == 0
+
+    def add(self, reading):
+        with self._lock:
+            for r in reading:
+                key = (r.get("name"), r.get("measured_parameter"))
+                window = self._windows.get(key)
+                if window is None:
+                    window = self._windows[key] = TagWindow(r)
+                window.add(r)
+
+    def _make_reading(self, window):
+        main = {k: v for k, v in window.reading.items() if k not in ("reading", "error")}
+        if window.last is not None:
+            main["reading"] = window.last
+        if window.error is not None:
+            main["error"] = window.error
+        result = [main]
+        if window.reading.get("type") != "Numeric":
+            return result
+        aggregate = {f: window.get(f) for f in self._fields}
+        if not self._as_tags:
+            main["aggregate"] = aggregate
+            return result
+        for f, value in aggregate.items():
+            r = dict(main, measured_parameter="{}_{}".format(main.get("measured_parameter"), f))
+            r.pop("error", None)
+            if f == "count":
+                r["units"] = ""
+            if value is None:
+                r.pop("reading", None)
+                r["error"] = "No data"
+            else:
+                r["reading"] = value
+            result.append(r)
+        return result
+
+    # Readings of the window, window is started over
+    def take(self):
+        with self._lock:
+            windows = self._windows
+            self._windows = {}
+        reading = []
+        for w in windows.values():
+            reading.extend(self._make_reading(w))
+        return reading
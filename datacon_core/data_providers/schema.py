@@ -0,0 +1,101 @@
+import hashlib
+import json
+import threading
+from .encoders import to_epoch
+
+# Schema-interned messages
+# Tag metadata (name, measured parameter, type, units) is announced once together with schema hash,
+# following messages carry only values referring to tag slots:
+#
+# name - provider name
+# schema - schema hash
+# start_time, end_time - UTC epoch seconds
+# values - list of [slot, reading, error code], error code 0 means no error
+# errors - list of error texts, error code N refers to errors[N - 1] (only if there are errors)
+# tags - list of [name, measured_parameter, type, units] indexed by slot (only in announcements)
+#
+# Slots are assigned in order of appearance and never reused, so the schema only changes
+# when a new tag shows up
+#
+# Receiver answers 409 to interned message of unknown schema, upload_data of collectors then returns
+# SCHEMA_UNKNOWN: message is dropped and provider is asked to announce the schema
+
+SCHEMA_UNKNOWN = "schema_unknown"
+
+
+class TagSchema:
+
+    TAG_FIELDS = ("name", "measured_parameter", "type", "units")
+
+    # announce_every - number of messages after which schema is announced again
+    def __init__(self, announce_every=30):
+        self._slots = {}
+        self._tags = []
+        self._hash = None
+        self._announce_every = announce_every
+        self._since_announce = 0
+        self._announce_requested = True
+        # Used from poll, command and dispatcher threads
+        self._lock = threading.Lock()
+
+    def _slot(self, reading):
+        key = tuple(reading.get(f) for f in self.TAG_FIELDS)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._tags)
+            self._slots[key] = slot
+            self._tags.append(list(key))
+            self._hash = None
+        return slot
+
+    def get_hash(self):
+        with self._lock:
+            return self._get_hash()
+
+    def _get_hash(self):
+        if self._hash is None:
+            self._hash = hashlib.sha1(json.dumps(self._tags).encode("utf-8")).hexdigest()[:16]
+        return self._hash
+
+    # Next message will contain tag list (e.g. receiver does not know the schema)
+    def request_announce(self):
+        with self._lock:
+            self._announce_requested = True
+
+    # Make interned message self-describing (e.g. before it is spooled for later delivery)
+    # Tag list is copied, as it grows when new tags show up
+    def add_tags(self, interned):
+        with self._lock:
+            interned["tags"] = list(self._tags)
+        return interned
+
+    def intern(self, message):
+        with self._lock:
+            return self._intern(message)
+
+    def _intern(self, message):
+        previous_hash = self._hash
+        values = []
+        errors = []
+        for r in message["reading"]:
+            code = 0
+            error = r.get("error")
+            if error:
+                if error not in errors:
+                    errors.append(error)
+                code = errors.index(error) + 1
+            values.append([self._slot(r), r.get("reading"), code])
+        schema_hash = self._get_hash()
+        interned = {"name": message["name"],
+                    "schema": schema_hash,
+                    "start_time": to_epoch(message["start_time"]),
+                    "end_time": to_epoch(message["end_time"]),
+                    "values": values}
+        if errors:
+            interned["errors"] = errors
+        self._since_announce += 1
+        if self._announce_requested or schema_hash != previous_hash or self._since_announce >= self._announce_every:
+            interned["tags"] = list(self._tags)
+            self._announce_requested = False
+            self._since_announce = 0
+        return interned
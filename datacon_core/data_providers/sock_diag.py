@@ -0,0 +1,139 @@
+import socket
+import struct
+import os
+
+# TCP socket statistics with filtering done as close to the kernel as possible
+#
+# "netlink" - NETLINK_SOCK_DIAG dump, kernel returns only ESTABLISHED and LISTEN sockets
+#             with given local port (inet_diag bytecode filter), so cost depends on matching sockets
+# "proc" - streaming /proc/net/tcp and /proc/net/tcp6 parser, lines of other ports are skipped
+#          before any address decoding
+#
+# Both give (state, local address, remote address) of matching sockets, see query()
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_REQ_BYTECODE = 1
+INET_DIAG_BC_S_GE = 2
+INET_DIAG_BC_S_LE = 3
+
+TCP_ESTABLISHED = 1
+TCP_LISTEN = 10
+STATES = {TCP_ESTABLISHED: "ESTABLISHED", TCP_LISTEN: "LISTEN"}
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+# family, protocol, ext, pad, states, then inet_diag_sockid
+# (sport, dport, src, dst, interface, cookie)
+DIAG_REQUEST = struct.Struct("=BBBxI")
+SOCKID = struct.Struct("!HH16s16sI8x")
+BC_OP = struct.Struct("=BBH")
+RTATTR = struct.Struct("=HH")
+# family, state, timer, retrans
+DIAG_MESSAGE = struct.Struct("=BBBB")
+
+PROC_FILES = (("/proc/net/tcp", socket.AF_INET), ("/proc/net/tcp6", socket.AF_INET6))
+PROC_STATES = {"01": "ESTABLISHED", "0A": "LISTEN"}
+
+BACKENDS = ("auto", "netlink", "proc")
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+# Local port equals `port`: sport >= port and sport <= port, failed check jumps beyond the end (reject)
+def _port_filter(port):
+    return (BC_OP.pack(INET_DIAG_BC_S_GE, 8, 20) + BC_OP.pack(0, 0, port) +
+            BC_OP.pack(INET_DIAG_BC_S_LE, 8, 12) + BC_OP.pack(0, 0, port))
+
+
+def _address(family, raw):
+    if family == socket.AF_INET:
+        return socket.inet_ntop(socket.AF_INET, raw[:4])
+    if raw[:12] == b"\x00" * 10 + b"\xff\xff":
+        # IPv4-mapped address of dual-stack socket
+        return socket.inet_ntop(socket.AF_INET, raw[12:16])
+    return socket.inet_ntop(socket.AF_INET6, raw)
+
+
+def _netlink_request(family, port, seq):
+    states = (1 << TCP_ESTABLISHED) | (1 << TCP_LISTEN)
+    payload = DIAG_REQUEST.pack(family, socket.IPPROTO_TCP, 0, states) + bytes(SOCKID.size)
+    if port is not None:
+        bytecode = _port_filter(port)
+        payload += RTATTR.pack(RTATTR.size + len(bytecode), INET_DIAG_REQ_BYTECODE) + bytecode
+    header = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), SOCK_DIAG_BY_FAMILY,
+                               NLM_F_REQUEST | NLM_F_DUMP, seq, 0)
+    return header + payload
+
+
+def _netlink_family(sock, family, port, seq):
+    sock.send(_netlink_request(family, port, seq))
+    while True:
+        data = sock.recv(65536)
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                return
+            if msg_type == NLMSG_DONE:
+                return
+            if msg_type == NLMSG_ERROR:
+                error = -struct.unpack_from("=i", data, offset + NLMSG_HEADER.size)[0]
+                raise OSError(error, os.strerror(error))
+            body = offset + NLMSG_HEADER.size
+            _, state, _, _ = DIAG_MESSAGE.unpack_from(data, body)
+            _, _, src, dst, _ = SOCKID.unpack_from(data, body + DIAG_MESSAGE.size)
+            yield STATES.get(state), _address(family, src), _address(family, dst)
+            offset += _align(length)
+
+
+def query_netlink(port=None):
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG) as sock:
+        for seq, family in enumerate((socket.AF_INET, socket.AF_INET6), 1):
+            yield from _netlink_family(sock, family, port, seq)
+
+
+# Text address, as given by psutil, with IPv4-mapped addresses converted to IPv4 (as by _address)
+def unmap_address(address):
+    if address is not None and address.lower().startswith("::ffff:") and "." in address:
+        return address[7:]
+    return address
+
+
+def _proc_address(family, text):
+    raw = b"".join(struct.pack("=I", int(text[i:i + 8], 16)) for i in range(0, len(text), 8))
+    return _address(family, raw)
+
+
+def query_proc(port=None):
+    suffix = ":{:04X}".format(port) if port is not None else None
+    for filename, family in PROC_FILES:
+        try:
+            f = open(filename)
+        except FileNotFoundError:
+            continue
+        with f:
+            next(f, None)
+            for line in f:
+                fields = line.split(None, 4)
+                if suffix is not None and not fields[1].endswith(suffix):
+                    continue
+                state = PROC_STATES.get(fields[3])
+                if state is None:
+                    continue
+                yield (state, _proc_address(family, fields[1].partition(":")[0]),
+                       _proc_address(family, fields[2].partition(":")[0]))
+
+
+QUERIES = {"netlink": query_netlink, "proc": query_proc}
+
+
+# (state, local address, remote address) of ESTABLISHED and LISTEN TCP sockets with given local port
+# (all ports if port is None)
+def query(port=None, backend="netlink"):
+    return QUERIES[backend](port)
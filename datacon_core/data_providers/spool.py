@@ -0,0 +1,240 @@
+import os
+import struct
+import threading
+import time
+import zlib
+import logging
+import sys
+
+# Store-and-forward spool
+# Append-only log of messages that could not be sent, kept in a directory of segment files:
+# 00000001.seg, 00000002.seg, ...
+# Every record is a header (length, CRC32) followed by message bytes
+# Read position is kept in "cursor" file, fully read segments are removed
+# Total size is bounded by max_bytes, oldest segments are dropped when the limit is exceeded
+
+
+class Spool:
+
+    FSYNC_ALWAYS = "always"
+    FSYNC_INTERVAL = "interval"
+    FSYNC_NEVER = "never"
+
+    SEGMENT_SUFFIX = ".seg"
+    CURSOR_FILE = "cursor"
+    HEADER = struct.Struct(">II")
+    CURSOR = struct.Struct(">QQ")
+
+    def __init__(self, path, max_bytes=64 * 1048576, segment_bytes=1048576,
+                 fsync=FSYNC_INTERVAL, fsync_interval=1.0):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._segment_bytes = segment_bytes
+        self._fsync = fsync
+        self._fsync_interval = fsync_interval
+        self._last_fsync = 0
+        self._last_cursor_fsync = 0
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+        os.makedirs(path, exist_ok=True)
+        self._segments = sorted(int(f[:-len(self.SEGMENT_SUFFIX)]) for f in os.listdir(path)
+                                if f.endswith(self.SEGMENT_SUFFIX))
+        self._sizes = {s: os.path.getsize(self._segment_path(s)) for s in self._segments}
+        self._read_segment, self._read_offset = self._load_cursor()
+        # Always start a new segment, tail of the previous one might be torn
+        self._writer = None
+        self._open_segment(self._segments[-1] + 1 if self._segments else 1)
+
+    def _segment_path(self, segment):
+        return os.path.join(self._path, "{:08d}{}".format(segment, self.SEGMENT_SUFFIX))
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self._path, self.CURSOR_FILE), "rb") as f:
+                segment, offset = self.CURSOR.unpack(f.read(self.CURSOR.size))
+            if segment in self._segments:
+                return segment, offset
+        except (OSError, struct.error):
+            pass
+        return (self._segments[0] if self._segments else 1), 0
+
+    # Cursor is fsynced as often as segments are: an unsynced cursor lost on power failure only makes
+    # already replayed messages sent once again
+    def _save_cursor(self, force=False):
+        tmp = os.path.join(self._path, self.CURSOR_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(self.CURSOR.pack(self._read_segment, self._read_offset))
+            if self._fsync == self.FSYNC_ALWAYS or (force and self._fsync != self.FSYNC_NEVER):
+                f.flush()
+                os.fsync(f.fileno())
+            elif self._fsync == self.FSYNC_INTERVAL:
+                now = time.monotonic()
+                if now - self._last_cursor_fsync >= self._fsync_interval:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._last_cursor_fsync = now
+        os.replace(tmp, os.path.join(self._path, self.CURSOR_FILE))
+
+    def _open_segment(self, segment):
+        if self._writer is not None:
+            self._sync(force=True)
+            self._writer.close()
+        self._writer = open(self._segment_path(segment), "ab")
+        self._write_segment = segment
+        if segment not in self._sizes:
+            self._segments.append(segment)
+            self._sizes[segment] = 0
+
+    def _sync(self, force=False):
+        self._writer.flush()
+        if self._fsync == self.FSYNC_ALWAYS or (force and self._fsync != self.FSYNC_NEVER):
+            os.fsync(self._writer.fileno())
+        elif self._fsync == self.FSYNC_INTERVAL:
+            now = time.monotonic()
+            if now - self._last_fsync >= self._fsync_interval:
+                os.fsync(self._writer.fileno())
+                self._last_fsync = now
+
+    def _drop_segment(self, segment):
+        self._segments.remove(segment)
+        self._sizes.pop(segment, None)
+        try:
+            os.remove(self._segment_path(segment))
+        except OSError:
+            self._logger.error("Could not remove spool segment {}: {}".format(segment, sys.exc_info()[0]))
+
+    def _enforce_limit(self):
+        while self.size() > self._max_bytes and len(self._segments) > 1:
+            oldest = self._segments[0]
+            self._logger.warning("Spool is full, dropping {} bytes of oldest data".format(self._sizes[oldest]))
+            self._drop_segment(oldest)
+            if self._read_segment == oldest:
+                self._read_segment = self._segments[0]
+                self._read_offset = 0
+                self._save_cursor(force=True)
+
+    def size(self):
+        return sum(self._sizes.values())
+
+    def is_empty(self):
+        with self._lock:
+            return self._read_segment == self._write_segment and \
+                   self._read_offset >= self._sizes[self._write_segment]
+
+    def append(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._lock:
+            if self._sizes[self._write_segment] >= self._segment_bytes:
+                self._open_segment(self._write_segment + 1)
+            self._writer.write(self.HEADER.pack(len(data), zlib.crc32(data)))
+            self._writer.write(data)
+            self._sizes[self._write_segment] += self.HEADER.size + len(data)
+            self._sync()
+            self._enforce_limit()
+
+    # Returns list of (position, data) starting from current cursor, cursor is not moved
+    # Position should be passed to commit() after record is processed
+    def read_batch(self, max_records=16):
+        result = []
+        with self._lock:
+            self._writer.flush()
+            segment, offset = self._read_segment, self._read_offset
+            while len(result) < max_records and segment in self._sizes:
+                with open(self._segment_path(segment), "rb") as f:
+                    f.seek(offset)
+                    while len(result) < max_records:
+                        header = f.read(self.HEADER.size)
+                        if len(header) < self.HEADER.size:
+                            break
+                        length, crc = self.HEADER.unpack(header)
+                        data = f.read(length)
+                        if len(data) < length or zlib.crc32(data) != crc:
+                            if segment != self._write_segment:
+                                self._logger.warning("Spool segment {} is damaged, skipping its tail".format(segment))
+                            break
+                        offset += self.HEADER.size + length
+                        result.append(((segment, offset), data))
+                if len(result) >= max_records or segment == self._write_segment:
+                    break
+                # Rest of this segment is read or damaged, continue with the next one
+                next_segments = [s for s in self._segments if s > segment]
+                if not next_segments:
+                    break
+                segment, offset = next_segments[0], 0
+            if not result and (segment, offset) != (self._read_segment, self._read_offset):
+                # Nothing left to read in previous segments, forget them
+                self._commit(segment, offset)
+        return result
+
+    def _commit(self, segment, offset, save=True):
+        for s in [s for s in self._segments if s < segment and s != self._write_segment]:
+            self._drop_segment(s)
+        if segment not in self._sizes:
+            return
+        self._read_segment, self._read_offset = segment, offset
+        if save:
+            self._save_cursor()
+
+    # save=False - cursor is moved in memory only (e.g. for every record of a batch),
+    # commit of the last record of the batch saves it, records after the saved cursor may be replayed
+    # after restart
+    def commit(self, position, save=True):
+        with self._lock:
+            self._commit(*position, save)
+
+
+# Background thread replaying spooled messages
+# send - function returning True on successful delivery
+# rate - maximum number of messages per second
+class SpoolDrainer(threading.Thread):
+
+    BATCH_SIZE = 16
+
+    def __init__(self, spool, send, rate=50, retry_delay=10):
+        threading.Thread.__init__(self, daemon=True)
+        self._spool = spool
+        self._send = send
+        self._interval = 1.0 / rate if rate else 0
+        self._retry_delay = retry_delay
+        self._wakeup = threading.Event()
+        self._logger = logging.getLogger(__name__)
+
+    # Called when broker seems to be available again
+    def notify(self):
+        self._wakeup.set()
+
+    # Cursor file is written once per batch, after its last sent record
+    def _drain(self):
+        sent = 0
+        while True:
+            batch = self._spool.read_batch(self.BATCH_SIZE)
+            if not batch:
+                return sent, True
+            committed = None
+            try:
+                for position, data in batch:
+                    if not self._send(data):
+                        return sent, False
+                    self._spool.commit(position, save=False)
+                    committed = position
+                    sent += 1
+                    if self._interval:
+                        time.sleep(self._interval)
+            finally:
+                if committed is not None:
+                    self._spool.commit(committed)
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self._retry_delay)
+            self._wakeup.clear()
+            if self._spool.is_empty():
+                continue
+            try:
+                sent, complete = self._drain()
+            except:
+                self._logger.error("Spool draining failed: {}".format(sys.exc_info()[0]))
+                continue
+            if sent:
+                self._logger.info("Replayed {} spooled message(s){}".format(sent, "" if complete else ", broker is still unavailable"))
@@ -0,0 +1,19 @@
+# Collector standing in for the server, for direct-mode providers (pass_to=[NullCollector()])
+# Every upload_data call returns `result` (True, False or SCHEMA_UNKNOWN), messages are dropped,
+# or kept in `received` as (data, content type) if keep=True
+
+
+class NullCollector:
+
+    def __init__(self, result=True, keep=False):
+        self.result = result
+        self.keep = keep
+        self.received = []
+
+    def get_name(self):
+        return "null"
+
+    def upload_data(self, data, content_type=None):
+        if self.keep:
+            self.received.append((data, content_type))
+        return self.result
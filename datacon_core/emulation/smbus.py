@@ -0,0 +1,213 @@
+import struct
+import random
+import errno
+import time
+import threading
+
+# Emulated I2C bus and devices for running drivers without hardware
+# FakeSMBus implements the part of smbus2.SMBus used by drivers and can be installed with
+# data_providers.i2c_bus.set_bus:
+#
+# bus = FakeSMBus({0x76: EmulatedBME280(), 0x40: EmulatedHTU21D()})
+# set_bus(0, bus)
+#
+# Devices keep register maps and take conversion time like real ones (delays=False makes them instant)
+
+I2C_M_RD = 0x0001
+
+
+def _nack():
+    return OSError(errno.EREMOTEIO, "Remote I/O error")
+
+
+class EmulatedDevice:
+
+    def read_register(self, register, length):
+        raise _nack()
+
+    def write_register(self, register, data):
+        raise _nack()
+
+    def write_command(self, value):
+        raise _nack()
+
+    def read_plain(self, length):
+        raise _nack()
+
+
+# BME280 with calibration from datasheet example
+# Raw values are fixed (about 25 °C, 1006 hPa, 50 %) with optional noise in ADC counts
+class EmulatedBME280(EmulatedDevice):
+
+    CHIP_ID = 0x60
+    # dig_T1..dig_T3, dig_P1..dig_P9
+    CALIBRATION_TP = (27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+    # dig_H1..dig_H6
+    CALIBRATION_H = (75, 362, 0, 311, 50, 30)
+
+    def __init__(self, temperature_raw=519888, pressure_raw=415148, humidity_raw=31000, noise=0, delays=True):
+        self.raw = [pressure_raw, temperature_raw, humidity_raw]
+        self.noise = noise
+        self.delays = delays
+        self.registers = bytearray(256)
+        self.registers[0xD0] = self.CHIP_ID
+        self.registers[0x88:0x88 + 24] = struct.pack("<HhhHhhhhhhhh", *self.CALIBRATION_TP)
+        h1, h2, h3, h4, h5, h6 = self.CALIBRATION_H
+        self.registers[0xA1] = h1
+        self.registers[0xE1:0xE8] = struct.pack("<hB", h2, h3) + bytes([(h4 >> 4) & 0xFF, ((h5 & 0x0F) << 4) | (h4 & 0x0F),
+                                                                         (h5 >> 4) & 0xFF]) + struct.pack("<b", h6)
+        self._measuring_until = 0
+        self._update_data()
+
+    def _oversampling(self, setting):
+        return (1 << (setting - 1)) if setting > 0 else 0
+
+    # Typical measurement time of datasheet
+    def _measurement_time(self):
+        t = self._oversampling(self.registers[0xF4] >> 5)
+        p = self._oversampling((self.registers[0xF4] >> 2) & 0x07)
+        h = self._oversampling(self.registers[0xF2] & 0x07)
+        return (1.0 + 2.0 * t + (2.0 * p + 0.5 if p else 0) + (2.0 * h + 0.5 if h else 0)) / 1000.0
+
+    def _sample(self, value, bits):
+        if self.noise:
+            value += random.randint(-self.noise, self.noise)
+        return max(0, min(value, (1 << bits) - 1))
+
+    def _update_data(self):
+        p = self._sample(self.raw[0], 20)
+        t = self._sample(self.raw[1], 20)
+        h = self._sample(self.raw[2], 16)
+        self.registers[0xF7:0xFF] = bytes([p >> 12, (p >> 4) & 0xFF, (p & 0x0F) << 4,
+                                           t >> 12, (t >> 4) & 0xFF, (t & 0x0F) << 4,
+                                           h >> 8, h & 0xFF])
+
+    def _finish_measurement(self):
+        if self._measuring_until and time.monotonic() >= self._measuring_until:
+            self._measuring_until = 0
+            self._update_data()
+            # Back to sleep mode
+            self.registers[0xF4] &= 0xFC
+
+    def read_register(self, register, length):
+        self._finish_measurement()
+        if register == 0xF3:
+            return [0x08 if self._measuring_until else 0x00]
+        if (self.registers[0xF4] & 0x03) == 0x03:
+            # Normal mode: new data for every read
+            self._update_data()
+        return list(self.registers[register:register + length])
+
+    def write_register(self, register, data):
+        self.registers[register:register + len(data)] = bytes(data)
+        if register == 0xF4 and (data[0] & 0x03) in (0x01, 0x02):
+            if self.delays:
+                self._measuring_until = time.monotonic() + self._measurement_time()
+            else:
+                self._update_data()
+                self.registers[0xF4] &= 0xFC
+
+
+# HTU21D: hold (0xE3, 0xE5) and no-hold (0xF3, 0xF5) measurements, user register with heater bit
+class EmulatedHTU21D(EmulatedDevice):
+
+    CONVERSION_TIMES = {0xE3: 0.050, 0xF3: 0.050, 0xE5: 0.016, 0xF5: 0.016}
+
+    def __init__(self, temperature=22.0, humidity=45.0, delays=True):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.delays = delays
+        self.user_register = 0x02
+        self._command = None
+        self._ready_at = 0
+
+    def _crc(self, data):
+        crc = 0
+        for b in data:
+            crc ^= b
+            for i in range(8):
+                crc = ((crc << 1) ^ 0x131) if crc & 0x80 else (crc << 1)
+        return crc & 0xFF
+
+    def _result(self, command):
+        if command in (0xE3, 0xF3):
+            raw = int((self.temperature + 46.85) * 65536.0 / 175.72) & 0xFFFC
+        else:
+            raw = (int((self.humidity + 6) * 65536.0 / 125) & 0xFFFC) | 0x02
+        data = [raw >> 8, raw & 0xFF]
+        return data + [self._crc(data)]
+
+    def read_register(self, register, length):
+        if register == 0xE7:
+            return [self.user_register]
+        if register in (0xE3, 0xE5):
+            # Hold master: clock is stretched for the whole conversion
+            if self.delays:
+                time.sleep(self.CONVERSION_TIMES[register])
+            return self._result(register)[:length]
+        raise _nack()
+
+    def write_register(self, register, data):
+        if register != 0xE6:
+            raise _nack()
+        self.user_register = data[0]
+
+    def write_command(self, value):
+        if value not in (0xF3, 0xF5):
+            raise _nack()
+        self._command = value
+        self._ready_at = time.monotonic() + (self.CONVERSION_TIMES[value] if self.delays else 0)
+
+    def read_plain(self, length):
+        if self._command is None or time.monotonic() < self._ready_at:
+            raise _nack()
+        command = self._command
+        self._command = None
+        return self._result(command)[:length]
+
+
+class FakeSMBus:
+
+    def __init__(self, devices=None):
+        self.devices = devices or {}
+        self._lock = threading.Lock()
+        self.transfers = 0
+
+    def _device(self, address):
+        self.transfers += 1
+        if address not in self.devices:
+            raise _nack()
+        return self.devices[address]
+
+    def read_byte_data(self, address, register):
+        with self._lock:
+            return self._device(address).read_register(register, 1)[0]
+
+    def write_byte_data(self, address, register, value):
+        with self._lock:
+            self._device(address).write_register(register, [value])
+
+    def read_i2c_block_data(self, address, register, length):
+        with self._lock:
+            return self._device(address).read_register(register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        with self._lock:
+            self._device(address).write_register(register, list(data))
+
+    def write_byte(self, address, value):
+        with self._lock:
+            self._device(address).write_command(value)
+
+    # Only plain reads are supported, result is copied to message buffer
+    def i2c_rdwr(self, *msgs):
+        with self._lock:
+            for msg in msgs:
+                if not msg.flags & I2C_M_RD:
+                    raise OSError(errno.EINVAL, "Only reads are emulated")
+                data = self._device(msg.addr).read_plain(msg.len)
+                for i, b in enumerate(data):
+                    msg.buf[i] = bytes([b])
+
+    def close(self):
+        pass
@@ -0,0 +1,96 @@
+import io
+import os
+import shutil
+import builtins
+import tempfile
+import importlib
+from contextlib import contextmanager
+
+# Emulated 1-wire sysfs tree for Ds18b20 (pass its path as base_dir)
+# Every sensor gets w1_slave (as read by w1_therm) and temperature attributes,
+# bus master gets therm_bulk_read (bulk=False emulates kernels without bulk conversion)
+# Files are regular ones, so reads are instant, within attached() the driver module opens files of the tree
+# through the tree, which takes conversion time like w1_therm does:
+# every read of w1_slave converts its sensor, read of therm_bulk_read after trigger waits for bulk conversion
+# Conversion time is waited with time.sleep of the driver module, so it is skipped within no_sleep(),
+# delays=False makes conversions instant
+#
+# tree = FakeW1Tree({"28-0000043a174f": 21.5, "28-0000041b3610": -3.25})
+# provider = Ds18b20("DS1", "Emulated sensors", scheduler, base_dir=tree.path)
+# with tree.attached():
+#     provider.get_current_reading()
+
+
+class FakeW1Tree:
+
+    MASTER = "w1_bus_master1"
+    # 12-bit conversion time of datasheet
+    CONVERSION_TIME = 0.75
+
+    def __init__(self, sensors, path=None, bulk=True, delays=True):
+        self._temporary = path is None
+        self.path = tempfile.mkdtemp(prefix="w1-") if path is None else path
+        self.bulk = bulk
+        self.delays = delays
+        self._bulk_triggered = False
+        master = os.path.join(self.path, self.MASTER)
+        os.makedirs(master, exist_ok=True)
+        if bulk:
+            self._write(os.path.join(master, "therm_bulk_read"), "0\n")
+        for sensor_id, temperature in sensors.items():
+            self.set_temperature(sensor_id, temperature)
+
+    def _write(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+
+    # crc_ok=False makes w1_slave report CRC error
+    def set_temperature(self, sensor_id, temperature, crc_ok=True):
+        sensor_dir = os.path.join(self.path, sensor_id)
+        os.makedirs(sensor_dir, exist_ok=True)
+        value = int(round(temperature * 1000))
+        raw = (int(round(temperature * 16)) & 0xFFFF).to_bytes(2, "little")
+        scratchpad = "{:02x} {:02x} 4b 46 7f ff 0c 10 1c".format(raw[0], raw[1])
+        self._write(os.path.join(sensor_dir, "w1_slave"),
+                    "{} : crc=1c {}\n{} t={}\n".format(scratchpad, "YES" if crc_ok else "NO", scratchpad, value))
+        if self.bulk:
+            self._write(os.path.join(sensor_dir, "temperature"), "{}\n".format(value))
+
+    def _convert(self, module):
+        if self.delays:
+            module.time.sleep(self.CONVERSION_TIME)
+
+    @contextmanager
+    def attached(self, module="data_providers.ds18b20"):
+        module = importlib.import_module(module)
+        previous = getattr(module, "open", builtins.open)
+        root = os.path.join(os.path.realpath(self.path), "")
+
+        def tree_open(file, mode="r", *args, **kwargs):
+            path = os.path.realpath(file)
+            if not path.startswith(root):
+                return previous(file, mode, *args, **kwargs)
+            name = os.path.basename(path)
+            if name == "therm_bulk_read":
+                if "w" in mode:
+                    self._bulk_triggered = True
+                elif self._bulk_triggered:
+                    self._convert(module)
+                    self._bulk_triggered = False
+                    return io.StringIO("1\n")
+            elif name == "w1_slave":
+                self._convert(module)
+            return previous(file, mode, *args, **kwargs)
+
+        module.open = tree_open
+        try:
+            yield self
+        finally:
+            if previous is builtins.open:
+                del module.open
+            else:
+                module.open = previous
+
+    def cleanup(self):
+        if self._temporary:
+            shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+
+import time
+
+STARTED = time.monotonic()
+
+import sys
+import os
+import re
+import json
+import logging
+import argparse
+import importlib
+from log_utils import setup_logging
+
+has_yaml = False
+try:
+    import yaml
+    has_yaml = True
+except ImportError:
+    pass
+
+# Declarative node launcher
+# Providers, collectors and processors are built from JSON or YAML config,
+# driver modules are imported only when config uses them (so e.g. smbus2 is not needed on VPS)
+#
+# python3 launcher.py configs/main.json
+# python3 launcher.py --verbose configs/main.json (prints startup time, numbers of providers and collectors, RSS)
+#
+# Config:
+# {
+#   "logging": {"level": "DEBUG", "filename": "datacon_main.log", "queued": true},
+#   "scheduler": "background" (or "async", see data_providers.async_runtime),
+#   "collectors": [{"class": "JSONSender", "name": "json-sender-0", "description": "...",
+#                   "args": {"address": "${shared_config.URL_TO_SEND}", "broker": "redis"}}],
+#   "providers": [{"class": "HTU21D", "name": "GY-21", "description": "...", "args": {"broker": "redis"},
+#                  "setup": {"set_encoder": "msgpack", "set_spool": {"path": "/var/spool/datacon/GY-21"}},
+#                  "processors": [{"class": "EdgeFilter", "args": {"heartbeat": 3600}}],
+#                  "polling": {"cron": {"minute": "0-50/10"}}, "active": true}]
+# }
+#
+# "class" is a name from REGISTRY or "module:Class"
+# String "${shared_config.NAME}" is replaced with value from shared_config.py, "${env:NAME}" - with
+# environment variable, whole-string references keep value type (e.g. port numbers)
+# "loglevel" in args may be a level name
+# "pass_to" in provider args is a list of collector names (for "direct" broker)
+# "setup" calls provider methods in order: dict value - keyword arguments, list - positional ones,
+# anything else - single argument
+# "members" of ProviderGroup are provider entries without polling, their broker is "direct" unless set
+
+REGISTRY = {"BME280": "data_providers.bme280:BME280",
+            "Ds18b20": "data_providers.ds18b20:Ds18b20",
+            "HTU21D": "data_providers.htu21d:HTU21D",
+            "Heartbeat": "data_providers.heartbeat:Heartbeat",
+            "OrangePiSelfDiag": "data_providers.opi_selfdiag:OrangePiSelfDiag",
+            "VPSSelfDiag": "data_providers.vps_selfdiag:VPSSelfDiag",
+            "ConnectionMon": "data_providers.nix_network:ConnectionMon",
+            "ProviderGroup": "data_providers.group:ProviderGroup",
+            "JSONSender": "data_collectors.sender:JSONSender",
+            "SimplePrinter": "data_collectors.simple:SimplePrinter",
+            "SimpleFileWrite": "data_collectors.simple:SimpleFileWrite",
+            "EdgeFilter": "data_processors.edge_filter:EdgeFilter"}
+
+SCHEDULERS = {"background": "apscheduler.schedulers.background:BackgroundScheduler",
+              "async": "data_providers.async_runtime:AsyncRuntime"}
+
+REFERENCE = re.compile(r"\$\{(env:|shared_config\.)(\w+)\}")
+
+
+class ConfigError(Exception):
+    pass
+
+
+def load_class(name):
+    path = REGISTRY.get(name, name)
+    if ":" not in path:
+        raise ConfigError("Unknown class {}".format(name))
+    module_name, class_name = path.split(":", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def load_config(filename):
+    with open(filename) as f:
+        if os.path.splitext(filename)[1] in (".yaml", ".yml"):
+            if not has_yaml:
+                raise ConfigError("PyYAML is needed for YAML configs")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _resolve_reference(kind, name):
+    if kind == "env:":
+        if name not in os.environ:
+            raise ConfigError("Environment variable {} is not set".format(name))
+        return os.environ[name]
+    shared_config = importlib.import_module("shared_config")
+    if not hasattr(shared_config, name):
+        raise ConfigError("shared_config has no {}".format(name))
+    return getattr(shared_config, name)
+
+
+# Replace ${...} references in config values
+def substitute(value):
+    if isinstance(value, dict):
+        return {k: substitute(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute(v) for v in value]
+    if not isinstance(value, str):
+        return value
+    m = REFERENCE.fullmatch(value)
+    if m:
+        return _resolve_reference(m.group(1), m.group(2))
+    return REFERENCE.sub(lambda m: str(_resolve_reference(m.group(1), m.group(2))), value)
+
+
+def _make_args(entry):
+    args = dict(entry.get("args", {}))
+    if isinstance(args.get("loglevel"), str):
+        args["loglevel"] = logging.getLevelName(args["loglevel"].upper())
+    return args
+
+
+def _call(method, value):
+    if isinstance(value, dict):
+        return method(**value)
+    if isinstance(value, list):
+        return method(*value)
+    return method(value)
+
+
+def build_collector(entry):
+    cls = load_class(entry["class"])
+    return cls(entry["name"], entry.get("description", ""), **_make_args(entry))
+
+
+def build_processor(entry):
+    cls = load_class(entry["class"])
+    return cls(**_make_args(entry))
+
+
+def build_provider(entry, scheduler, collectors):
+    cls = load_class(entry["class"])
+    args = _make_args(entry)
+    if "pass_to" in args:
+        try:
+            args["pass_to"] = [collectors[c] for c in args["pass_to"]]
+        except KeyError:
+            raise ConfigError("Unknown collector {} in pass_to of {}".format(sys.exc_info()[1], entry["name"]))
+    provider = cls(entry["name"], entry.get("description", ""), scheduler, **args)
+    for m in entry.get("members", []):
+        member = dict(m, args=dict({"broker": "direct"}, **m.get("args", {})))
+        member.pop("polling", None)
+        provider.add_member(build_provider(member, scheduler, collectors))
+    for method, value in entry.get("setup", {}).items():
+        _call(getattr(provider, method), value)
+    for p in entry.get("processors", []):
+        provider.add_processor(build_processor(p))
+    if "polling" in entry:
+        provider.set_polling(entry["polling"])
+        if entry.get("active", True):
+            provider.activate_polling()
+    return provider
+
+
+# Resident set size in kB (peak value if /proc is not available)
+def get_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Node:
+
+    def __init__(self, config):
+        config = substitute(config)
+        log_config = dict(config.get("logging", {}))
+        if isinstance(log_config.get("level"), str):
+            log_config["level"] = logging.getLevelName(log_config["level"].upper())
+        setup_logging(**log_config)
+        self._logger = logging.getLogger(__name__)
+        scheduler_name = config.get("scheduler", "background")
+        self.scheduler = load_class(SCHEDULERS.get(scheduler_name, scheduler_name))()
+        self.is_async = getattr(self.scheduler, "is_async", False)
+        if not self.is_async:
+            self.scheduler.start()
+        self.collectors = {}
+        for entry in config.get("collectors", []):
+            self.collectors[entry["name"]] = build_collector(entry)
+        self.providers = [build_provider(entry, self.scheduler, self.collectors)
+                          for entry in config.get("providers", [])]
+
+    def run(self):
+        if self.is_async:
+            self.scheduler.run_forever()
+            return
+        while True:
+            time.sleep(5)
+
+
+# Build node from config file and run it until interrupted
+# verbose - print startup report (it is logged anyway)
+def launch(filename, verbose=False):
+    node = Node(load_config(filename))
+    report = "Node started in {:.2f} s, {} provider(s), {} collector(s), RSS {} kB".format(
+        time.monotonic() - STARTED, len(node.providers), len(node.collectors), get_rss())
+    logging.getLogger(__name__).info(report)
+    if verbose:
+        print(report)
+    try:
+        node.run()
+    except KeyboardInterrupt:
+        print("End")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run datacon node from config file")
+    parser.add_argument("config", help="JSON or YAML node config")
+    parser.add_argument("--verbose", action="store_true", help="print startup report")
+    args = parser.parse_args()
+    launch(args.config, args.verbose)
@@ -0,0 +1,88 @@
+import logging
+import logging.handlers
+import queue
+import copy
+import atexit
+import time
+import sys
+
+# Shared logging layer for providers and collectors
+#
+# log_message(message, level, *args) formats message with str.format only when record is emitted,
+# so hot paths cost almost nothing when level is filtered out
+# Nothing is printed to stdout unless setup_logging(stdout=True) is used
+# With setup_logging(queued=True) records are handed over to a background thread, which writes them;
+# message text is still built in the calling thread, since args (e.g. readings) may change afterwards
+
+LEVEL_NAMES = {50: "Critical",
+               40: "Error",
+               30: "Warning",
+               20: "Info",
+               10: "Debug"}
+
+LOG_FORMAT = "%(asctime)s: %(message)s"
+
+
+class LazyMessage:
+
+    __slots__ = ("message", "args")
+
+    def __init__(self, message, args):
+        self.message = message
+        self.args = args
+
+    def __str__(self):
+        return self.message.format(*self.args)
+
+
+# Like QueueHandler, message is merged with its args before the record is queued,
+# but timestamp and layout are left to handlers of the listener (so LOG_FORMAT is applied once)
+# Only records which passed level checks of logger and handler get here, filtered ones are never formatted
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+# Logger of a provider or collector, its level is inherited, so setup_logging level applies to all
+def get_logger(module_name, source_name):
+    return logging.getLogger("{}.{}".format(module_name, source_name))
+
+
+# Message is logged if level is above log level of its source and enabled for the logger
+def log_message(logger, source_name, source_level, message, level, args):
+    if level > source_level and logger.isEnabledFor(level):
+        logger.log(level, "%s [%s]: %s", source_name, LEVEL_NAMES.get(level, level),
+                   LazyMessage(message, args) if args else message)
+
+
+# Set up root logger
+# filename - log file, stdout - print messages as well, queued - write records in background thread
+def setup_logging(level=logging.WARNING, filename=None, stdout=False, queued=False):
+    handlers = []
+    if filename is not None:
+        handlers.append(logging.FileHandler(filename))
+    if stdout:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    formatter = logging.Formatter(LOG_FORMAT)
+    formatter.converter = time.gmtime
+    for h in handlers:
+        h.setFormatter(formatter)
+    root = logging.getLogger()
+    root.setLevel(level)
+    if queued:
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        root.addHandler(DeferredQueueHandler(records))
+    else:
+        for h in handlers:
+            root.addHandler(h)
@@ -1,6 +1,8 @@
 import pika
 
 DEFAULT_EXCHANGE = "MainData"
+# Dead-letter exchange of collector queues (see data_collectors/proto.py)
+DEAD_LETTER_EXCHANGE = "MainData.dead"
 
 def initial_config():
 
@@ -8,6 +10,7 @@ def initial_config():
     channel = connection.channel()
 
     channel.exchange_declare(exchange=DEFAULT_EXCHANGE)
+    channel.exchange_declare(exchange=DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True)
 
     connection.close()
 
@@ -0,0 +1,62 @@
+import os
+import sys
+import logging
+import pytest
+
+# Tests are run from any directory, modules of the node are imported as top-level ones (as in launcher)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emulation.w1 import FakeW1Tree
+from emulation.collector import NullCollector
+
+
+# Time source for modules using time.monotonic(), moved by tests
+class FakeClock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def collector():
+    return NullCollector(keep=True)
+
+
+@pytest.fixture
+def direct_options(collector):
+    return {"broker": "direct", "pass_to": [collector], "loglevel": logging.CRITICAL}
+
+
+@pytest.fixture
+def w1_sensors():
+    return {"28-0000043a174f": 21.5, "28-0000041b3610": -3.25, "28-00000412a0c1": 0.0}
+
+
+@pytest.fixture
+def w1_tree(w1_sensors):
+    tree = FakeW1Tree(w1_sensors)
+    yield tree
+    tree.cleanup()
+
+
+@pytest.fixture
+def w1_tree_legacy(w1_sensors):
+    tree = FakeW1Tree(w1_sensors, bulk=False)
+    yield tree
+    tree.cleanup()
+
+
+# Emulated BME280 and HTU21D on bus 0, instant conversions (drivers should run within no_sleep)
+@pytest.fixture
+def i2c_bus():
+    pytest.importorskip("smbus2")
+    from data_providers.i2c_bus import set_bus
+    from emulation.smbus import FakeSMBus, EmulatedBME280, EmulatedHTU21D
+    return set_bus(0, FakeSMBus({0x76: EmulatedBME280(delays=False),
+                                 0x40: EmulatedHTU21D(temperature=22.0, humidity=45.0, delays=False)}))
@@ -0,0 +1,29 @@
+import asyncio
+from data_providers.heartbeat import Heartbeat
+
+
+def test_async_poll_sends_message(direct_options, collector):
+    provider = Heartbeat("HB", "Heartbeat", None, **direct_options)
+    asyncio.run(provider._poll_current_reading_async())
+    assert len(collector.received) == 1
+    assert not provider._poll_lock.locked()
+
+
+def test_cancelled_async_poll_leaves_lock_free(direct_options, collector):
+    provider = Heartbeat("HB", "Heartbeat", None, **direct_options)
+
+    async def cancel_waiting_poll():
+        provider._poll_lock.acquire()
+        poll = asyncio.ensure_future(provider._poll_current_reading_async())
+        await asyncio.sleep(provider.POLL_LOCK_INTERVAL * 3)
+        poll.cancel()
+        try:
+            await poll
+        except asyncio.CancelledError:
+            pass
+        provider._poll_lock.release()
+        await provider._poll_current_reading_async()
+
+    asyncio.run(cancel_waiting_poll())
+    assert len(collector.received) == 1
+    assert not provider._poll_lock.locked()
@@ -0,0 +1,20 @@
+import pytest
+from emulation.clock import no_sleep
+
+
+def test_bme280_forced_mode(i2c_bus, direct_options):
+    from data_providers.bme280 import BME280
+    with no_sleep():
+        provider = BME280("BME", "Emulated", None, forced_mode=True, **direct_options)
+        reading = {r["name"]: r for r in provider.get_current_reading()}
+    # Raw values of datasheet example
+    assert reading["Temperature"]["reading"] == pytest.approx(25.08, abs=0.1)
+    assert all("error" not in r for r in reading.values())
+
+
+@pytest.mark.parametrize("settings", [{"p_os": 0}, {"h_os": 6}, {"iir_filter": 5}, {"standby": 8},
+                                      {"burst": 0}, {"burst_average": "max"}])
+def test_bme280_rejects_invalid_settings(i2c_bus, direct_options, settings):
+    from data_providers.bme280 import BME280
+    with pytest.raises(ValueError):
+        BME280("BME", "Emulated", None, forced_mode=True, **settings, **direct_options)
@@ -0,0 +1,130 @@
+import threading
+import time
+import pytest
+from data_providers.dispatcher import DirectDispatcher
+from data_providers.proto import QUEUE_FULL
+from data_providers.heartbeat import Heartbeat
+from data_providers.spool import Spool
+
+
+# Collector delivery that waits until released, so that the queue fills up
+class GatedDelivery:
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.delivered = []
+        self.reported = []
+        self.dropped = []
+
+    def deliver(self, item):
+        self.started.set()
+        self.gate.wait(5)
+        self.delivered.append(item)
+        return True
+
+    def report(self, item, result):
+        self.reported.append((item, result))
+
+
+def _dispatcher(delivery, **kwargs):
+    dispatcher = DirectDispatcher(delivery.deliver, delivery.report, drop=delivery.dropped.append, **kwargs)
+    # First item is taken by the worker and waits at the gate, queue is empty again
+    dispatcher.submit("busy")
+    assert delivery.started.wait(5)
+    return dispatcher
+
+
+def _finish(dispatcher, delivery, count):
+    delivery.gate.set()
+    for i in range(100):
+        if len(delivery.reported) >= count:
+            break
+        time.sleep(0.01)
+    dispatcher.stop()
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        DirectDispatcher(None, None, overflow="wait")
+
+
+def test_drop_oldest():
+    delivery = GatedDelivery()
+    dispatcher = _dispatcher(delivery, max_size=2, overflow="drop_oldest")
+    assert all(dispatcher.submit(i) for i in range(4))
+    assert delivery.dropped == [0, 1]
+    stats = dispatcher.get_stats()
+    assert (stats["dropped"], stats["depth"], stats["max_depth"]) == (2, 2, 2)
+    _finish(dispatcher, delivery, 3)
+    assert delivery.delivered == ["busy", 2, 3]
+
+
+def test_spool_policy_rejects_at_once():
+    delivery = GatedDelivery()
+    dispatcher = _dispatcher(delivery, max_size=1, overflow="spool")
+    assert dispatcher.submit(1)
+    assert not dispatcher.submit(2)
+    assert dispatcher.get_stats()["rejected"] == 1
+    assert delivery.dropped == []
+    _finish(dispatcher, delivery, 2)
+
+
+def test_block_policy_times_out():
+    delivery = GatedDelivery()
+    dispatcher = _dispatcher(delivery, max_size=1, overflow="block", block_timeout=0.05)
+    assert dispatcher.submit(1)
+    assert not dispatcher.submit(2)
+    assert dispatcher.get_stats()["rejected"] == 1
+    _finish(dispatcher, delivery, 2)
+
+
+def test_block_policy_waits_for_room():
+    delivery = GatedDelivery()
+    dispatcher = _dispatcher(delivery, max_size=1, overflow="block", block_timeout=5)
+    assert dispatcher.submit(1)
+    threading.Timer(0.05, delivery.gate.set).start()
+    assert dispatcher.submit(2)
+    _finish(dispatcher, delivery, 3)
+    assert delivery.delivered == ["busy", 1, 2]
+    assert [result for item, result in delivery.reported] == [True, True, True]
+
+
+def _overflowing_provider(tmp_path, direct_options, overflow):
+    gate = threading.Event()
+    collector = direct_options["pass_to"][0]
+    collector.upload_data = lambda data, content_type=None: gate.wait(5)
+    provider = Heartbeat("HB", "Test", None, **direct_options)
+    provider.set_spool(str(tmp_path), fsync=Spool.FSYNC_NEVER, retry_delay=3600)
+    provider.set_dispatcher(max_size=1, overflow=overflow)
+    return provider, gate
+
+
+def test_overflow_is_spooled_without_failure(tmp_path, direct_options):
+    provider, gate = _overflowing_provider(tmp_path, direct_options, "spool")
+    for i in range(4):
+        provider._poll_current_reading()
+    stats = provider.get_stats()
+    assert stats["publish_failures"] == 0
+    assert stats["queue_overflows"] >= 2
+    assert len(provider._spool.read_batch()) == stats["queue_overflows"]
+    gate.set()
+
+
+def test_drops_are_counted(tmp_path, direct_options):
+    provider, gate = _overflowing_provider(tmp_path, direct_options, "drop_oldest")
+    for i in range(4):
+        provider._poll_current_reading()
+    stats = provider.get_stats()
+    assert stats["queue_drops"] >= 2
+    assert stats["publish_failures"] == 0
+    assert provider._spool.read_batch() == []
+    gate.set()
+
+
+def test_send_reports_full_queue(tmp_path, direct_options):
+    provider, gate = _overflowing_provider(tmp_path, direct_options, "spool")
+    results = [provider._send(b"{}", "application/json", {"name": "HB"}) for i in range(4)]
+    assert results[0] is None
+    assert QUEUE_FULL in results
+    gate.set()
@@ -0,0 +1,62 @@
+import pytest
+from data_providers import ds18b20
+from data_providers.ds18b20 import Ds18b20
+from emulation.clock import no_sleep
+from emulation.w1 import FakeW1Tree
+from conftest import FakeClock
+
+
+def _temperatures(reading):
+    return {r["name"]: r.get("reading", r.get("error")) for r in reading}
+
+
+def test_ds18b20_bulk_conversion(w1_tree, w1_sensors, direct_options):
+    provider = Ds18b20("DS", "Emulated", None, base_dir=w1_tree.path, **direct_options)
+    assert len(provider._bulk_paths) == 1
+    with no_sleep(("data_providers.ds18b20",)):
+        assert _temperatures(provider.get_current_reading()) == w1_sensors
+
+
+def test_ds18b20_w1_slave_fallback(w1_tree_legacy, w1_sensors, direct_options):
+    provider = Ds18b20("DS", "Emulated", None, base_dir=w1_tree_legacy.path, **direct_options)
+    assert provider._bulk_paths == []
+    assert _temperatures(provider.get_current_reading()) == w1_sensors
+
+
+def test_ds18b20_crc_error_and_alias(w1_tree_legacy, direct_options):
+    w1_tree_legacy.set_temperature("28-0000041b3610", 5.0, crc_ok=False)
+    provider = Ds18b20("DS", "Emulated", None, base_dir=w1_tree_legacy.path,
+                       sensor_aliases={"28-0000043a174f": "Outside"}, **direct_options)
+    readings = _temperatures(provider.get_current_reading())
+    assert readings["Outside"] == 21.5
+    assert readings["28-0000041b3610"] == "CRC error"
+
+
+def test_ds18b20_poll_sends_message(w1_tree, collector, direct_options):
+    provider = Ds18b20("DS", "Emulated", None, base_dir=w1_tree.path, **direct_options)
+    with no_sleep(("data_providers.ds18b20",)):
+        message = provider._poll_current_reading()
+    assert message["name"] == "DS"
+    assert len(collector.received) == 1
+
+
+@pytest.mark.parametrize("bulk, conversions", [(True, 1), (False, 3)])
+def test_ds18b20_conversion_time(tmp_path, monkeypatch, w1_sensors, direct_options, bulk, conversions):
+    clock = FakeClock()
+    monkeypatch.setattr(ds18b20, "time", clock)
+    tree = FakeW1Tree(w1_sensors, path=str(tmp_path), bulk=bulk)
+    provider = Ds18b20("DS", "Emulated", None, base_dir=tree.path, **direct_options)
+    with tree.attached():
+        assert _temperatures(provider.get_current_reading()) == w1_sensors
+    assert clock.now == pytest.approx(1000.0 + conversions * FakeW1Tree.CONVERSION_TIME)
+    assert not hasattr(ds18b20, "open")
+
+
+def test_ds18b20_no_conversion_time(tmp_path, w1_sensors, direct_options):
+    tree = FakeW1Tree(w1_sensors, path=str(tmp_path), bulk=False)
+    provider = Ds18b20("DS", "Emulated", None, base_dir=tree.path, **direct_options)
+    with tree.attached(), no_sleep(("data_providers.ds18b20",)):
+        assert _temperatures(provider.get_current_reading()) == w1_sensors
+    tree.delays = False
+    with tree.attached():
+        assert _temperatures(provider.get_current_reading()) == w1_sensors
@@ -0,0 +1,81 @@
+import pytest
+from data_processors import edge_filter
+from data_processors.edge_filter import EdgeFilter
+from conftest import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(edge_filter, "time", clock)
+    return clock
+
+
+def _reading(value=None, error=None, name="Outside"):
+    r = {"name": name, "measured_parameter": "temperature", "type": "Numeric"}
+    if error is None:
+        r["reading"] = value
+    else:
+        r["error"] = error
+    return r
+
+
+def _sent(f, *readings):
+    return [r.get("reading", r.get("error")) for r in f.process("DS1", list(readings))]
+
+
+def test_duplicates_are_dropped(clock):
+    f = EdgeFilter()
+    assert _sent(f, _reading(1.0)) == [1.0]
+    clock.sleep(10)
+    assert _sent(f, _reading(1.0)) == []
+    assert _sent(f, _reading(1.5)) == [1.5]
+
+
+def test_duplicates_are_kept_if_ignore_duplicates_is_off(clock):
+    f = EdgeFilter({"Outside.temperature": {"ignore_duplicates": False}})
+    assert _sent(f, _reading(1.0)) == [1.0]
+    assert _sent(f, _reading(1.0)) == [1.0]
+
+
+def test_deadband(clock):
+    f = EdgeFilter(default={"deadband": 0.5})
+    assert _sent(f, _reading(20.0), _reading(7.0, name="Inside")) == [20.0, 7.0]
+    assert _sent(f, _reading(20.4), _reading(7.6, name="Inside")) == [7.6]
+    # Deadband is counted from the last sent value
+    assert _sent(f, _reading(20.6)) == [20.6]
+
+
+def test_minimum_delay(clock):
+    f = EdgeFilter({"Outside.temperature": {"minimum_delay": 60}})
+    _sent(f, _reading(1.0))
+    clock.sleep(30)
+    assert _sent(f, _reading(2.0)) == []
+    clock.sleep(31)
+    assert _sent(f, _reading(2.0)) == [2.0]
+
+
+def test_error_change_is_always_sent(clock):
+    f = EdgeFilter({"Outside.temperature": {"minimum_delay": 60}})
+    _sent(f, _reading(1.0))
+    assert _sent(f, _reading(error="CRC error")) == ["CRC error"]
+    assert _sent(f, _reading(error="CRC error")) == []
+    assert _sent(f, _reading(1.0)) == [1.0]
+
+
+def test_heartbeat_resends_unchanged_value(clock):
+    f = EdgeFilter(heartbeat=600)
+    _sent(f, _reading(1.0))
+    clock.sleep(599)
+    assert _sent(f, _reading(1.0)) == []
+    clock.sleep(1)
+    assert _sent(f, _reading(1.0)) == [1.0]
+
+
+def test_from_input_filtering_strips_provider_name(clock):
+    f = EdgeFilter.from_input_filtering({"DS1.Outside.temperature": {"deadband": 1.0, "ignore_duplicates": True},
+                                         "Other.x.y": {"deadband": 5.0}}, "DS1")
+    assert f._filters["Outside.temperature"]["deadband"] == 1.0
+    assert "Other.x.y" in f._filters
+    _sent(f, _reading(10.0))
+    assert _sent(f, _reading(10.9)) == []
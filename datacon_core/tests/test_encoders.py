@@ -0,0 +1,51 @@
+import json
+import pytest
+from datetime import datetime
+from data_providers.encoders import (JSONEncoder, CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK, detect_content_type,
+                                     expand_compact)
+
+MESSAGE = {"name": "DS1",
+           "start_time": datetime(2026, 1, 1, 12, 0, 0, 250000),
+           "end_time": datetime(2026, 1, 1, 12, 0, 1, 500000),
+           "reading": [{"name": "Outside", "measured_parameter": "temperature", "units": "°C", "type": "Numeric",
+                        "reading": -3.25},
+                       {"name": "Door", "measured_parameter": "state", "type": "Discrete", "reading": True},
+                       {"name": "Inside", "measured_parameter": "temperature", "type": "Numeric",
+                        "error": "CRC error"}]}
+
+
+def _as_json(message):
+    return json.loads(JSONEncoder().encode(message))
+
+
+def test_json_encoding():
+    data = JSONEncoder().encode(MESSAGE)
+    assert detect_content_type(data) == CONTENT_TYPE_JSON
+    decoded = json.loads(data)
+    assert decoded["start_time"] == "2026-01-01T12:00:00.250000"
+    assert decoded["reading"] == MESSAGE["reading"]
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    from data_providers.encoders import MsgPackEncoder, decode_msgpack
+    data = MsgPackEncoder().encode(MESSAGE)
+    assert detect_content_type(data) == CONTENT_TYPE_MSGPACK
+    assert len(data) < len(JSONEncoder().encode(MESSAGE))
+    assert decode_msgpack(data) == _as_json(MESSAGE)
+
+
+def test_msgpack_round_trip_of_envelope():
+    pytest.importorskip("msgpack")
+    from data_providers.encoders import MsgPackEncoder, decode_msgpack
+    envelope = {"name": "Local", "start_time": MESSAGE["start_time"], "end_time": MESSAGE["end_time"],
+                "messages": [MESSAGE, dict(MESSAGE, name="DS2")]}
+    assert decode_msgpack(MsgPackEncoder().encode(envelope)) == _as_json(envelope)
+
+
+def test_expand_compact():
+    compact = {"n": "DS1", "s": 1767268800.25, "f": 1767268801.5,
+               "r": [{"n": "Outside", "p": "temperature", "u": "°C", "t": 0, "v": -3.25},
+                     {"n": "Door", "p": "state", "t": 1, "v": True},
+                     {"n": "Inside", "p": "temperature", "t": 0, "e": "CRC error"}]}
+    assert expand_compact(compact) == _as_json(MESSAGE)
@@ -0,0 +1,101 @@
+import json
+import logging
+import pytest
+import types
+from data_providers.group import ProviderGroup
+from data_providers.heartbeat import Heartbeat
+from data_providers.ds18b20 import Ds18b20
+
+
+class FakeScheduler:
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, func, trigger, **kwargs):
+        job = types.SimpleNamespace(id="job-{}".format(len(self.jobs)), func=func, paused=False)
+        self.jobs[job.id] = job
+        return job
+
+    def pause_job(self, job_id):
+        self.jobs[job_id].paused = True
+
+    def resume_job(self, job_id):
+        self.jobs[job_id].paused = False
+
+
+class FailingProvider(Heartbeat):
+
+    def get_current_reading(self, src_id=None):
+        raise OSError("Bus error")
+
+
+@pytest.fixture
+def group(w1_tree_legacy, direct_options):
+    group = ProviderGroup("Local", "Sensors of the node", None, **direct_options)
+    member_options = {"broker": "direct", "loglevel": logging.CRITICAL}
+    group.add_member(Ds18b20("DS1", "Emulated", None, base_dir=w1_tree_legacy.path, **member_options))
+    group.add_member(Heartbeat("HB", "Heartbeat", None, **member_options))
+    return group
+
+
+def test_envelope_contains_member_messages(group, collector):
+    group._poll_current_reading()
+    assert len(collector.received) == 1
+    envelope = json.loads(collector.received[0][0])
+    assert envelope["name"] == "Local"
+    assert [m["name"] for m in envelope["messages"]] == ["DS1", "HB"]
+    assert len(envelope["messages"][0]["reading"]) == 3
+    assert envelope["start_time"] <= envelope["end_time"]
+
+
+def test_failed_member_gets_error_readings(group, collector):
+    group.add_member(FailingProvider("Broken", "Fails", None, broker="direct", loglevel=logging.CRITICAL))
+    group._poll_current_reading()
+    broken = json.loads(collector.received[0][0])["messages"][2]
+    assert all("error" in r for r in broken["reading"])
+
+
+def test_members_are_interned_separately(group, collector):
+    for m in group.get_members():
+        m.set_schema_interning()
+    group._poll_current_reading()
+    group._poll_current_reading()
+    first, second = [json.loads(data)["messages"] for data, content_type in collector.received]
+    assert all("tags" in m for m in first)
+    assert all("tags" not in m for m in second)
+    assert group._add_tags({"messages": second})
+
+
+def test_duplicate_member_is_rejected(group):
+    with pytest.raises(ValueError):
+        group.add_member(Heartbeat("HB", "Again", None, broker="direct", loglevel=logging.CRITICAL))
+
+
+@pytest.mark.parametrize("setting, args", [("add_processor", (None,)), ("set_sampling", (1,)),
+                                           ("set_schema_interning", ()), ("set_ring_buffer", ("/tmp/ring",)),
+                                           ("set_self_metrics", ()), ("set_isolation", ())])
+def test_member_settings_are_rejected(group, setting, args):
+    with pytest.raises(ValueError):
+        getattr(group, setting)(*args)
+
+
+def test_group_activates_member_sampling(w1_tree_legacy, direct_options, collector):
+    scheduler = FakeScheduler()
+    group = ProviderGroup("Local", "Sensors of the node", scheduler, **direct_options)
+    member = Ds18b20("DS1", "Emulated", scheduler, base_dir=w1_tree_legacy.path,
+                     broker="direct", loglevel=logging.CRITICAL)
+    member.set_sampling(1)
+    group.add_member(member)
+    sampling_job = scheduler.jobs[member._sampling_job_id]
+    assert sampling_job.paused
+    group.activate_polling()
+    assert not sampling_job.paused
+    sampling_job.func()
+    sampling_job.func()
+    group._poll_current_reading()
+    reading = json.loads(collector.received[0][0])["messages"][0]["reading"]
+    counts = [r["reading"] for r in reading if r["measured_parameter"].endswith("_count")]
+    assert counts == [2, 2, 2]
+    group.deactivate_polling()
+    assert sampling_job.paused
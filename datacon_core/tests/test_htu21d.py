@@ -0,0 +1,11 @@
+import pytest
+from emulation.clock import no_sleep
+
+
+def test_htu21d_no_hold_measurement(i2c_bus, direct_options):
+    from data_providers.htu21d import HTU21D
+    with no_sleep():
+        provider = HTU21D("HTU", "Emulated", None, **direct_options)
+        reading = {(r["name"], r["measured_parameter"]): r for r in provider.get_current_reading()}
+    assert reading[("Main", "temperature")]["reading"] == pytest.approx(22.0, abs=0.1)
+    assert reading[("Main", "humidity")]["reading"] == pytest.approx(45.0, abs=0.5)
@@ -0,0 +1,34 @@
+import time
+import logging
+from data_providers.heartbeat import Heartbeat
+
+
+# Built again in reader worker, so it has to be importable from there
+class StuckProvider(Heartbeat):
+
+    def get_current_reading(self, src_id=None):
+        time.sleep(60)
+
+
+def test_reading_is_taken_in_worker(direct_options):
+    provider = Heartbeat("HB", "Test", None, seed=1, **direct_options)
+    provider.set_isolation(timeout=30)
+    try:
+        first = provider._read_current()
+        second = provider._read_current()
+    finally:
+        provider._isolated_reader.stop()
+    # Counter state lives in the worker between polls
+    assert [r["reading"] for r in first + second if r["measured_parameter"] == "counter"] == [0, 1]
+
+
+def test_stuck_reading_times_out(direct_options):
+    provider = StuckProvider("Stuck", "Test", None, loglevel=logging.CRITICAL, broker="direct")
+    provider._last_reading = [{"name": "test", "measured_parameter": "counter", "type": "Numeric", "reading": 1}]
+    provider.set_isolation(timeout=0.5)
+    try:
+        reading = provider._read_current()
+    finally:
+        provider._isolated_reader.stop()
+    assert reading == [{"name": "test", "measured_parameter": "counter", "type": "Numeric", "error": "Timeout"}]
+    assert provider.get_stats()["timeouts"] == 1
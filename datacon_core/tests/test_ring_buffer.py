@@ -0,0 +1,116 @@
+import json
+import math
+import socket
+import pytest
+from datetime import datetime, timedelta
+from data_providers.ring_buffer import RingBuffer, RingQueryServer
+from data_providers.heartbeat import Heartbeat
+from data_processors.edge_filter import EdgeFilter
+
+START = datetime(2026, 1, 1)
+START_EPOCH = 1767225600
+
+
+def _message(i, error=False):
+    reading = {"name": "Outside", "measured_parameter": "temperature", "type": "Numeric"}
+    if error:
+        reading["error"] = "CRC error"
+    else:
+        reading["reading"] = float(i)
+    return {"name": "DS1", "end_time": START + timedelta(seconds=i),
+            "reading": [reading, {"name": "Chip", "measured_parameter": "id", "type": "Text", "reading": "x"}]}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "ring")
+
+
+def test_latest_and_range(path):
+    ring = RingBuffer(path, capacity=16, max_tags=4)
+    for i in range(5):
+        ring.add_message(_message(i))
+    assert ring.tags() == ["DS1.Outside.temperature"]
+    assert ring.latest("DS1.Outside.temperature")["value"] == 4.0
+    values = ring.range("DS1.Outside.temperature", start=START_EPOCH + 1, end=START_EPOCH + 3)
+    assert [v["value"] for v in values] == [1.0, 2.0, 3.0]
+    assert [v["value"] for v in ring.range("DS1.Outside.temperature", limit=2)] == [3.0, 4.0]
+
+
+def test_errors_are_kept(path):
+    ring = RingBuffer(path, capacity=16, max_tags=4)
+    ring.add_message(_message(0, error=True))
+    assert ring.latest("DS1.Outside.temperature") == {"seq": 1, "time": START_EPOCH, "error": True}
+
+
+def test_old_records_are_overwritten(path):
+    ring = RingBuffer(path, capacity=4, max_tags=4)
+    for i in range(10):
+        ring.append("a", START_EPOCH + i, i)
+    assert [v["value"] for v in ring.range("a")] == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_reattach_after_restart(path):
+    ring = RingBuffer(path, capacity=16, max_tags=4)
+    for i in range(3):
+        ring.add_message(_message(i))
+    ring.append("x" * 200, START_EPOCH, 1.0)
+    ring.close()
+    ring = RingBuffer(path, capacity=16, max_tags=4)
+    assert len(ring.tags()) == 2
+    assert [v["value"] for v in ring.range("DS1.Outside.temperature")] == [0.0, 1.0, 2.0]
+    # Long keys are truncated in tag table the same way before and after re-attach
+    assert ring.latest("x" * 200)["value"] == 1.0
+    ring.append("DS1.Outside.temperature", START_EPOCH + 3, 3.0)
+    assert ring.latest("DS1.Outside.temperature")["seq"] == 5
+
+
+def test_other_geometry_reformats(path):
+    ring = RingBuffer(path, capacity=16, max_tags=4)
+    ring.append("a", START_EPOCH, 1.0)
+    ring.close()
+    assert RingBuffer(path, capacity=32, max_tags=4).tags() == []
+
+
+def test_full_tag_table(path):
+    ring = RingBuffer(path, capacity=16, max_tags=2)
+    assert ring.append("a", START_EPOCH, 1.0)
+    assert ring.append("b", START_EPOCH, 1.0)
+    assert not ring.append("c", START_EPOCH, 1.0)
+
+
+def test_query_server(path, tmp_path):
+    ring = RingBuffer(path, capacity=16, max_tags=4)
+    ring.add_message(_message(0))
+    server = RingQueryServer(ring, str(tmp_path / "ring.sock"))
+    try:
+        with socket.socket(socket.AF_UNIX) as s:
+            s.connect(str(tmp_path / "ring.sock"))
+            f = s.makefile("rwb")
+            answers = []
+            for request in (b'{"query": "latest"}', b'{"query": "stats"}', b'{"query": "unknown"}', b"not json"):
+                f.write(request + b"\n")
+                f.flush()
+                answers.append(json.loads(f.readline()))
+        assert answers[0]["latest"]["DS1.Outside.temperature"]["value"] == 0.0
+        assert answers[1]["records"] == 1
+        assert "error" in answers[2] and "error" in answers[3]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _constant_provider(path, raw, direct_options):
+    provider = Heartbeat("HB", "Test", None, tags=[{"name": "c", "measured_parameter": "v", "distribution": "constant",
+                                                   "value": 1.0}], **direct_options)
+    provider.set_ring_buffer(path, capacity=16, max_tags=4, raw=raw)
+    provider.add_processor(EdgeFilter())
+    return provider
+
+
+@pytest.mark.parametrize("raw, kept", [(True, 3), (False, 1)])
+def test_raw_readings_are_kept_before_processors(path, direct_options, raw, kept):
+    provider = _constant_provider(path, raw, direct_options)
+    for i in range(3):
+        provider._poll_current_reading()
+    assert len(provider._ring_buffer.range("HB.c.v")) == kept
@@ -0,0 +1,128 @@
+import json
+import pytest
+from datetime import datetime
+from data_providers.schema import TagSchema, SCHEMA_UNKNOWN
+from data_providers.heartbeat import Heartbeat
+from data_providers.spool import Spool
+
+
+def _message(*readings):
+    return {"name": "DS1", "start_time": datetime(2026, 1, 1), "end_time": datetime(2026, 1, 1, 0, 0, 1),
+            "reading": list(readings)}
+
+
+def _reading(name, value=None, error=None):
+    r = {"name": name, "measured_parameter": "temperature", "type": "Numeric", "units": "°C"}
+    if error is None:
+        r["reading"] = value
+    else:
+        r["error"] = error
+    return r
+
+
+def test_first_message_announces_schema():
+    schema = TagSchema()
+    interned = schema.intern(_message(_reading("A", 1.0), _reading("B", error="CRC error")))
+    assert interned["tags"] == [["A", "temperature", "Numeric", "°C"], ["B", "temperature", "Numeric", "°C"]]
+    assert interned["values"] == [[0, 1.0, 0], [1, None, 1]]
+    assert interned["errors"] == ["CRC error"]
+    assert interned["start_time"] == 1767225600
+
+
+def test_tags_are_sent_again_only_when_needed():
+    schema = TagSchema(announce_every=3)
+    first = schema.intern(_message(_reading("A", 1.0)))
+    second = schema.intern(_message(_reading("A", 2.0)))
+    assert "tags" not in second
+    assert second["schema"] == first["schema"]
+    # New tag changes the schema
+    third = schema.intern(_message(_reading("A", 3.0), _reading("B", 4.0)))
+    assert third["schema"] != first["schema"] and len(third["tags"]) == 2
+    schema.request_announce()
+    assert "tags" in schema.intern(_message(_reading("A", 5.0)))
+    schema.intern(_message(_reading("A", 6.0)))
+    schema.intern(_message(_reading("A", 7.0)))
+    assert "tags" in schema.intern(_message(_reading("A", 8.0)))
+
+
+def test_added_tags_are_a_copy():
+    schema = TagSchema()
+    interned = schema.add_tags(schema.intern(_message(_reading("A", 1.0))))
+    schema.intern(_message(_reading("B", 1.0)))
+    assert len(interned["tags"]) == 1
+
+
+def test_unknown_schema_is_spooled_with_tags_and_announced(tmp_path, collector, direct_options):
+    provider = Heartbeat("HB", "Test", None, **direct_options)
+    provider.set_schema_interning()
+    provider.set_spool(str(tmp_path), fsync=Spool.FSYNC_NEVER, retry_delay=3600)
+    provider._poll_current_reading()
+    # Receiver has lost the schema, message without tags is rejected
+    collector.result = SCHEMA_UNKNOWN
+    provider._poll_current_reading()
+    assert "tags" not in json.loads(collector.received[1][0])
+    content_type, _, spooled = provider._spool.read_batch()[0][1].partition(b"\n")
+    assert "tags" in json.loads(spooled)
+    assert provider.get_stats()["publish_failures"] == 1
+    # Next message announces the schema
+    collector.result = True
+    provider._poll_current_reading()
+    assert "tags" in json.loads(collector.received[2][0])
+
+
+def test_sender_reports_unknown_schema_on_conflict(monkeypatch):
+    requests = pytest.importorskip("requests")
+    pytest.importorskip("pika")
+    pytest.importorskip("redis")
+    from data_collectors.sender import JSONSender
+
+    class Response:
+        status_code = requests.codes.conflict
+        text = "Unknown schema"
+
+    monkeypatch.setattr(requests, "post", lambda *args, **kwargs: Response())
+    sender = JSONSender("S", "Test", broker="direct")
+    assert sender.upload_data(b'{"name": "DS1", "schema": "0123"}') is SCHEMA_UNKNOWN
+
+
+class FakeChannel:
+
+    def __init__(self):
+        self.calls = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.calls.append(("publish", routing_key, properties))
+
+    def basic_ack(self, delivery_tag):
+        self.calls.append(("ack", delivery_tag))
+
+    def basic_reject(self, delivery_tag, requeue):
+        self.calls.append(("reject", delivery_tag, requeue))
+
+
+def test_collector_retries_message_of_unknown_schema():
+    pika = pytest.importorskip("pika")
+    pytest.importorskip("redis")
+    from types import SimpleNamespace
+    from data_collectors.proto import Collector
+
+    class UnknownSchemaCollector(Collector):
+        def upload_data(self, data, content_type=None):
+            return SCHEMA_UNKNOWN
+
+    collector = UnknownSchemaCollector("C", "Test", broker="direct")
+    collector._queue_name = "C.collectq"
+    collector._retry_queue_name = "C.collectq.retry"
+    channel = FakeChannel()
+    body = json.dumps({"name": "DS1", "schema": "0123", "values": []})
+    properties = pika.BasicProperties(content_type="application/json")
+    collector._receive_callback(channel, SimpleNamespace(delivery_tag=1), properties, body)
+    announce, retry, ack = channel.calls
+    assert announce[1] == "DS1.provide"
+    assert retry[1] == "C.collectq.retry" and retry[2].headers == {"x-schema-retries": 1}
+    assert ack == ("ack", 1)
+    # Message is rejected (dead-lettered) after the last retry
+    channel.calls = []
+    properties.headers = {"x-schema-retries": Collector.SCHEMA_RETRIES}
+    collector._receive_callback(channel, SimpleNamespace(delivery_tag=2), properties, body)
+    assert channel.calls[-1] == ("reject", 2, False)
@@ -1,20 +1,88 @@
 from datacon.models import DataSource, Error, TagNumeric, TagDiscrete, TagText
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db import transaction
 from django.http import Http404
-from datetime import datetime
+from datetime import datetime, timedelta
+import threading
 import json
 
+has_msgpack = False
+try:
+    import msgpack
+    has_msgpack = True
+except ImportError:
+    pass
 
-def process_message(datasource, message):
+# Same as in datacon_core/data_providers/encoders.py
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+
+SCHEMA_UNKNOWN = (409, "Schema announce required")
+# Number of schemas kept per provider
+SCHEMA_CACHE_DEPTH = 4
+SCHEMA_CACHE_TIMEOUT = 7 * 86400
+
+# Schema-interned messages: datasource uid -> provider name -> {schema hash: list of (tag, tag type) by slot}
+# Tag descriptions are also put into Django cache, so that other workers do not need a re-announce
+# Guarded by _schema_cache_lock, as requests are served by threads of the worker
+_schema_cache = {}
+_schema_cache_lock = threading.Lock()
+
+EPOCH = datetime(1970, 1, 1)
+
+# Short keys of compact (MessagePack) messages
+# Copy of datacon_core/data_providers/encoders.py (receiver is deployed separately), keep in sync
+MESSAGE_KEYS = {"n": "name", "s": "start_time", "f": "end_time", "r": "reading", "m": "messages"}
+READING_KEYS = {"n": "name", "p": "measured_parameter", "u": "units", "t": "type", "v": "reading", "e": "error"}
+READING_TYPES = {0: "Numeric", 1: "Discrete", 2: "Text"}
+
+
+def _expand_compact(message):
+    expanded = {}
+    for k, v in message.items():
+        k = MESSAGE_KEYS.get(k, k)
+        if k == "reading":
+            v = [{READING_KEYS.get(rk, rk): READING_TYPES.get(rv, rv) if rk == "t" else rv
+                  for rk, rv in r.items()} for r in v]
+        elif k == "messages":
+            v = [_expand_compact(m) for m in v]
+        expanded[k] = v
+    return expanded
+
+
+def _decode_message(message, content_type=None):
+    if content_type == CONTENT_TYPE_MSGPACK:
+        if not has_msgpack:
+            raise ValueError("msgpack is not installed")
+        return _expand_compact(msgpack.unpackb(message, raw=False))
+    return json.loads(message["message"])
+
+
+# Timestamps are ISO strings (JSON) or UTC epoch seconds (MessagePack)
+def _parse_time(value):
+    if isinstance(value, (int, float)):
+        return EPOCH + timedelta(seconds=value)
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+
+
+# message is either POST data with "message" field (JSON) or raw request body of given content type
+def process_message(datasource, message, content_type=None):
     try:
         ds = DataSource.objects.get(uid=datasource)
     except ObjectDoesNotExist:
         raise Http404
     try:
-        msg = json.loads(message["message"])
+        msg = _decode_message(message, content_type)
     except:
         return (400, "Incorrect message")
-    fails = write_reading(ds, msg)
+    if "messages" in msg:
+        fails = write_envelope(ds, msg)
+    elif "schema" in msg:
+        fails = write_interned_reading(ds, msg)
+    else:
+        fails = write_reading(ds, msg)
+    if fails is None:
+        return SCHEMA_UNKNOWN
     # TODO: report of failed write attempts
     return (200, "Message received")
 
@@ -51,14 +119,14 @@ def try_to_save_value(tag, tag_type, value, error=None, timestamp_obtain=datetim
 def write_reading(datasource, message_as_dict):
     provider_name = message_as_dict["name"]
     counter_fail = 0
+    t_packet_s = _parse_time(message_as_dict["start_time"])
+    t_packet_e = _parse_time(message_as_dict["end_time"])
+    time_to_obtain = (t_packet_e - t_packet_s).total_seconds()
     for r in message_as_dict["reading"]:
         tag_name = "{}.{}.{}".format(provider_name, r["name"], r["measured_parameter"])
         tag_type = r["type"]
         tag_units = None if "units" not in r else r["units"]
         tag = get_or_create_tag(datasource, tag_name, tag_type, tag_units)
-        t_packet_s = datetime.strptime(message_as_dict["start_time"], "%Y-%m-%dT%H:%M:%S.%f")
-        t_packet_e = datetime.strptime(message_as_dict["end_time"], "%Y-%m-%dT%H:%M:%S.%f")
-        time_to_obtain = (t_packet_e - t_packet_s).total_seconds()
         if "error" in r and len(r["error"]) > 0:
             error, was_new = Error.objects.get_or_create(error=r["error"])
         else:
@@ -77,3 +145,100 @@ def write_reading(datasource, message_as_dict):
         if not try_to_save_value(**kw):
             counter_fail += 1
     return counter_fail
+
+
+def _schema_cache_key(datasource, provider_name, schema):
+    return "datacon.schema.{}.{}.{}".format(datasource.uid, provider_name, schema)
+
+
+# Returns list of (tag, tag type) by slot or None if schema is unknown
+def _get_schema(datasource, message_as_dict):
+    provider_name = message_as_dict["name"]
+    schema = message_as_dict["schema"]
+    if "tags" not in message_as_dict:
+        with _schema_cache_lock:
+            tags = _schema_cache.get(datasource.uid, {}).get(provider_name, {}).get(schema)
+        if tags is not None:
+            return tags
+    tag_list = message_as_dict.get("tags")
+    if tag_list is None:
+        tag_list = cache.get(_schema_cache_key(datasource, provider_name, schema))
+        if tag_list is None:
+            return None
+    else:
+        cache.set(_schema_cache_key(datasource, provider_name, schema), tag_list, SCHEMA_CACHE_TIMEOUT)
+    tags = []
+    for name, measured_parameter, tag_type, units in tag_list:
+        tag_name = "{}.{}.{}".format(provider_name, name, measured_parameter)
+        tags.append((get_or_create_tag(datasource, tag_name, tag_type, units), tag_type))
+    # Tags are looked up without the lock, the oldest schema of the provider is evicted
+    with _schema_cache_lock:
+        schemas = _schema_cache.setdefault(datasource.uid, {}).setdefault(provider_name, {})
+        schemas.pop(schema, None)
+        while len(schemas) >= SCHEMA_CACHE_DEPTH:
+            del schemas[next(iter(schemas))]
+        schemas[schema] = tags
+    return tags
+
+
+# Returns number of failed writes or None if tag schema has to be announced
+def write_interned_reading(datasource, message_as_dict):
+    tags = _get_schema(datasource, message_as_dict)
+    if tags is None:
+        return None
+    counter_fail = 0
+    t_packet_s = _parse_time(message_as_dict["start_time"])
+    t_packet_e = _parse_time(message_as_dict["end_time"])
+    time_to_obtain = (t_packet_e - t_packet_s).total_seconds()
+    error_texts = message_as_dict.get("errors", [])
+    # Nothing is written if schema is outdated, so that the message can be retried after announce
+    if any(slot >= len(tags) for slot, value, error_code in message_as_dict["values"]):
+        return None
+    errors = {}
+    for slot, value, error_code in message_as_dict["values"]:
+        tag, tag_type = tags[slot]
+        error = None
+        if error_code:
+            if error_code not in errors:
+                errors[error_code], was_new = Error.objects.get_or_create(error=error_texts[error_code - 1])
+            error = errors[error_code]
+        if not try_to_save_value(tag, tag_type, value, error, t_packet_e, time_to_obtain):
+            counter_fail += 1
+    return counter_fail
+
+
+# Provider group envelope: messages of all members are written in one transaction
+# Schemas are resolved before writing, so that nothing is written if any of them has to be announced
+# (and tags of announced schemas are not rolled back)
+# Returns number of failed writes or None if tag schema has to be announced
+def write_envelope(datasource, message_as_dict):
+    for m in message_as_dict["messages"]:
+        if "schema" in m and _get_schema(datasource, m) is None:
+            return None
+    counter_fail = 0
+    with transaction.atomic():
+        for m in message_as_dict["messages"]:
+            fails = write_interned_reading(datasource, m) if "schema" in m else write_reading(datasource, m)
+            if fails is None:
+                transaction.set_rollback(True)
+                return None
+            counter_fail += fails
+    return counter_fail
+
+
+# Input filtering settings of numeric tags and duplicate handling of all tags, for edge-side filters of data providers
+def get_input_filters(datasource):
+    try:
+        ds = DataSource.objects.get(uid=datasource)
+    except ObjectDoesNotExist:
+        raise Http404
+    filters = {}
+    for t in TagNumeric.objects.filter(data_source=ds, input_filter__isnull=False).select_related("input_filter"):
+        filters[t.name] = {"deadband": t.input_filter.deadband,
+                           "minimum_delay": t.input_filter.minimum_delay,
+                           "ignore_duplicates": t.ignore_duplicates}
+    # Tags keeping duplicates, so that edge filters send unchanged values of them
+    for model in (TagNumeric, TagDiscrete, TagText):
+        for t in model.objects.filter(data_source=ds, ignore_duplicates=False):
+            filters.setdefault(t.name, {})["ignore_duplicates"] = False
+    return {"filters": filters}
@@ -1,4 +1,56 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from .models import DataSource, TagNumeric
+from .receiver import receiver
+from .receiver.receiver import process_message, SCHEMA_UNKNOWN
+import json
 
-# Create your tests here.
 
+# Provider group envelopes (see datacon_core/data_providers/group.py)
+class EnvelopeTestCase(TestCase):
+
+    def setUp(self):
+        receiver._schema_cache.clear()
+        cache.clear()
+        user = User.objects.create(username="node")
+        self.ds = DataSource.objects.create(name="Node", maintainer=user)
+
+    def _post(self, message):
+        return process_message(self.ds.uid, {"message": json.dumps(message)})
+
+    def _member(self, name, value):
+        return {"name": name, "start_time": "2026-01-01T00:00:00.000000", "end_time": "2026-01-01T00:00:01.000000",
+                "reading": [{"name": "Main", "measured_parameter": "temperature", "type": "Numeric",
+                             "units": "°C", "reading": value}]}
+
+    def _interned(self, name, value, tags=True):
+        message = {"name": name, "schema": "0123456789abcdef", "start_time": 1767225600, "end_time": 1767225601,
+                   "values": [[0, value, 0]]}
+        if tags:
+            message["tags"] = [["Main", "temperature", "Numeric", "°C"]]
+        return message
+
+    def _envelope(self, *messages):
+        return {"name": "Local", "start_time": "2026-01-01T00:00:00.000000",
+                "end_time": "2026-01-01T00:00:01.000000", "messages": list(messages)}
+
+    def _values(self, tag_name):
+        return TagNumeric.objects.get(data_source=self.ds, name=tag_name).values.count()
+
+    def test_members_are_written(self):
+        response = self._post(self._envelope(self._member("DS1", 21.5), self._interned("HTU", 22.0)))
+        self.assertEqual(response[0], 200)
+        self.assertEqual(self._values("DS1.Main.temperature"), 1)
+        self.assertEqual(self._values("HTU.Main.temperature"), 1)
+
+    def test_unknown_member_schema_writes_nothing(self):
+        response = self._post(self._envelope(self._member("DS1", 21.5), self._interned("HTU", 22.0, tags=False)))
+        self.assertEqual(response, SCHEMA_UNKNOWN)
+        self.assertFalse(TagNumeric.objects.filter(data_source=self.ds, name="DS1.Main.temperature").exists())
+
+    def test_announced_schema_is_reused(self):
+        self._post(self._envelope(self._interned("HTU", 22.0)))
+        response = self._post(self._envelope(self._interned("HTU", 23.0, tags=False)))
+        self.assertEqual(response[0], 200)
+        self.assertEqual(self._values("HTU.Main.temperature"), 2)
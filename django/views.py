@@ -2,7 +2,7 @@ from django.shortcuts import render
 from django.template import loader
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
-from .receiver.receiver import process_message
+from .receiver.receiver import process_message, get_input_filters, CONTENT_TYPE_MSGPACK, SCHEMA_UNKNOWN
 from .retriever.request_processor import process_request
 from datetime import datetime
 
@@ -11,9 +11,18 @@ import json
 @csrf_exempt
 def process_incoming(request, source_id):
     if request.method == "POST":
-       process_message(source_id, request.POST)
+       if request.content_type == CONTENT_TYPE_MSGPACK:
+           result = process_message(source_id, request.body, request.content_type)
+       else:
+           result = process_message(source_id, request.POST)
+       # Sender has to keep the message and announce tag schema again
+       if result == SCHEMA_UNKNOWN:
+           return HttpResponse(result[1], status=result[0])
     return HttpResponse()
 
+def input_filters(request, source_id):
+    return JsonResponse(get_input_filters(source_id))
+
 def web_data_view(request, dataset_id):
     template = loader.get_template('web_data_view.html')
     context = {"dataset_id": dataset_id, "page_name": "Data web view", "page_description": "View data online"}